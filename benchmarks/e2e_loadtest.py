@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Updates per second handled by the full bot Application from main.py.
+
+The application is built by main.build_application (all services, handlers
+and background jobs) on a fresh database and pointed at the fake Bot API
+(benchmarks.fake_bot_api), started in a subprocess unless --api-url names
+one that is already running. Before the clock starts, --polls polls are
+created through Web App data, every other one anonymous. Then --updates
+synthetic updates of the kinds below, drawn by the weights of --mix, go
+through the application's update queue, exactly as the Updater feeds it:
+
+    vote         poll answer of a public poll
+    poll_update  new counts of an anonymous poll
+    polls        /polls from a poll owner
+    webapp       Web App data creating a poll
+    inline       inline query searching the owner's polls
+
+At most --concurrency updates are in flight. The latency of an update runs
+from putting it on the queue until its last handler group is done, so it
+includes queueing behind other updates.
+
+    python -m benchmarks.e2e_loadtest --updates 5000 --latency-ms 30 --jitter-ms 20
+    python -m benchmarks.e2e_loadtest --mix vote=1 --error-rate 0.01 --output votes.json
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.fake_bot_api import serve
+
+KINDS = ("vote", "poll_update", "polls", "webapp", "inline")
+DEFAULT_MIX = "vote=60,poll_update=20,polls=2,webapp=3,inline=15"
+TOKEN = "123456:LOADTEST"
+OWNER_BASE = 1000
+VOTER_BASE = 1_000_000
+GROUP_CHAT_ID = -1001000000000
+TOPICS = ("lunch", "meeting", "release", "holiday", "movie", "standup", "budget", "offsite")
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for pair in value.replace(" ", "").split(","):
+        if pair:
+            kind, weight = pair.split("=", 1)
+            if kind not in KINDS:
+                raise argparse.ArgumentTypeError("unknown update kind %r, expected one of %s" % (kind, ", ".join(KINDS)))
+            mix[kind] = float(weight)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("the mix needs at least one positive weight")
+    return mix
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+def summarize(latencies: list[float]) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "updates": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+class UpdateFactory:
+    """Bot API update payloads for the traffic kinds, deterministic for a seed."""
+
+    def __init__(self, owners: int, seed: int):
+        self.owners = owners
+        self.random = random.Random(seed)
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._voters = itertools.count(VOTER_BASE)
+        self.public_polls = []
+        self.anonymous_polls = []
+        self._voter_counts = {}
+
+    def user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": "User %d" % user_id, "language_code": "en"}
+
+    def owner(self) -> int:
+        return OWNER_BASE + self.random.randrange(self.owners)
+
+    def message(self, user_id: int, **fields) -> dict:
+        return {
+            "update_id": next(self._update_ids),
+            "message": {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private", "first_name": "User %d" % user_id},
+                "from": self.user(user_id),
+                **fields,
+            },
+        }
+
+    def webapp(self, anonymous: bool = None, owner: int = None) -> dict:
+        n = self.random.randrange(1_000_000)
+        topic = self.random.choice(TOPICS)
+        form = {
+            "question": "Load test %s poll %d" % (topic, n),
+            "options": ["%s option %d" % (topic.title(), k) for k in range(self.random.randint(2, 6))],
+            "anonymous": self.random.random() < 0.5 if anonymous is None else anonymous,
+            "forwarding": True,
+            "chat_id": GROUP_CHAT_ID,
+        }
+        return self.message(owner or self.owner(), web_app_data={"data": json.dumps(form), "button_text": "Create"})
+
+    def vote(self) -> dict:
+        poll_id, options = self.random.choice(self.public_polls)
+        return {
+            "update_id": next(self._update_ids),
+            "poll_answer": {
+                "poll_id": poll_id,
+                "user": self.user(next(self._voters)),
+                "option_ids": [self.random.randrange(len(options))],
+            },
+        }
+
+    def poll_update(self) -> dict:
+        poll_id, options = self.random.choice(self.anonymous_polls)
+        counts = self._voter_counts.setdefault(poll_id, [0] * len(options))
+        counts[self.random.randrange(len(counts))] += 1
+        return {
+            "update_id": next(self._update_ids),
+            "poll": {
+                "id": poll_id,
+                "question": "Anonymous load test poll",
+                "options": [{"text": text, "voter_count": count} for text, count in zip(options, counts)],
+                "total_voter_count": sum(counts),
+                "is_closed": False,
+                "is_anonymous": True,
+                "type": "regular",
+                "allows_multiple_answers": True,
+            },
+        }
+
+    def polls(self) -> dict:
+        return self.message(self.owner(), text="/polls", entities=[{"type": "bot_command", "offset": 0, "length": 6}])
+
+    def inline(self) -> dict:
+        user_id = self.owner()
+        return {
+            "update_id": next(self._update_ids),
+            "inline_query": {
+                "id": str(next(self._update_ids)),
+                "from": self.user(user_id),
+                "query": self.random.choice(TOPICS + ("",)),
+                "offset": "",
+                "chat_type": "supergroup",
+            },
+        }
+
+    def make(self, kind: str) -> dict:
+        return getattr(self, kind)()
+
+
+class Driver:
+    """Feeds updates through the application's update queue and times them."""
+
+    def __init__(self, application, concurrency: int):
+        from telegram import Update
+        from telegram.ext import TypeHandler
+
+        self.application = application
+        self.slots = asyncio.Semaphore(concurrency)
+        self.pending = {}
+        self.latencies = defaultdict(list)
+        self.idle = asyncio.Event()
+        self.idle.set()
+        # After every other group, so it sees the update when the bot is done with it
+        application.add_handler(TypeHandler(Update, self._done), group=1000)
+
+    async def _done(self, update, context) -> None:
+        kind, started = self.pending.pop(update.update_id)
+        self.latencies[kind].append(time.perf_counter() - started)
+        self.slots.release()
+        if not self.pending:
+            self.idle.set()
+
+    async def feed(self, kind: str, data: dict) -> None:
+        from telegram import Update
+
+        await self.slots.acquire()
+        update = Update.de_json(data, self.application.bot)
+        self.idle.clear()
+        self.pending[update.update_id] = (kind, time.perf_counter())
+        await self.application.update_queue.put(update)
+
+    async def drain(self) -> None:
+        await self.idle.wait()
+
+
+def start_fake_api(port: int, options: dict) -> multiprocessing.Process:
+    # A process of its own, so the fake server does not compete with the bot for the GIL
+    process = multiprocessing.get_context("spawn").Process(
+        target=serve, args=(port,), kwargs=options, daemon=True)
+    process.start()
+    for _ in range(200):
+        try:
+            httpx.get("http://127.0.0.1:%d/_stats" % port, timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError("The fake Bot API did not start on port %d" % port)
+
+
+def configure_bot(api_url: str, db_path: str) -> None:
+    """Environment main reads when it is imported: fake token, scratch database, fake API."""
+    os.environ.update({
+        "TELEGRAM_TOKEN": TOKEN,
+        "POLLS_DB": db_path,
+        "BOT_API_BASE_URL": api_url + "/bot",
+    })
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # Replays must not end up in a capture of their own
+    os.environ.pop("UPDATE_CAPTURE_FILE", None)
+
+
+@contextlib.asynccontextmanager
+async def running_application():
+    """The application of main.py, started and stopped the way run_polling does it."""
+    import main
+
+    application = main.build_application(with_updater=False)
+    await application.initialize()
+    await main.post_init(application)
+    await application.start()
+    try:
+        yield application
+    finally:
+        await application.stop()
+        await main.post_shutdown(application)
+        await application.shutdown()
+
+
+async def run(args, api_url: str) -> dict:
+    async with running_application() as application:
+        driver = Driver(application, args.concurrency)
+        factory = UpdateFactory(args.owners, args.seed)
+
+        for n in range(args.polls):
+            await driver.feed("setup", factory.webapp(anonymous=n % 2 == 1, owner=OWNER_BASE + n % args.owners))
+        await driver.drain()
+        for poll_id, data in list(application.bot_data.items()):
+            if isinstance(data, dict) and "poll_object" in data:
+                polls = factory.anonymous_polls if data["anonimity"] else factory.public_polls
+                polls.append((poll_id, data["options"]))
+        if not factory.public_polls or not factory.anonymous_polls:
+            raise RuntimeError("Poll setup failed, created %d public and %d anonymous polls" % (
+                len(factory.public_polls), len(factory.anonymous_polls)))
+
+        async with httpx.AsyncClient() as client:
+            await client.post(api_url + "/_reset")
+            kinds = [kind for kind in KINDS if args.mix.get(kind)]
+            weights = [args.mix[kind] for kind in kinds]
+            schedule = factory.random.choices(kinds, weights, k=args.updates)
+
+            started = time.perf_counter()
+            for kind in schedule:
+                await driver.feed(kind, factory.make(kind))
+            await driver.drain()
+            elapsed = time.perf_counter() - started
+            api_stats = (await client.get(api_url + "/_stats")).json()
+
+    from utils.metrics import handler_latency
+
+    every = [latency for kind in KINDS for latency in driver.latencies[kind]]
+    return {
+        "config": {
+            "updates": args.updates,
+            "concurrency": args.concurrency,
+            "polls": args.polls,
+            "owners": args.owners,
+            "mix": args.mix,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate,
+            "flood_rate": args.flood_rate,
+            "seed": args.seed,
+        },
+        "seconds": round(elapsed, 3),
+        "updates_per_second": round(len(every) / elapsed, 1),
+        "latency": {"all": summarize(every),
+                    **{kind: summarize(driver.latencies[kind]) for kind in KINDS if driver.latencies[kind]}},
+        "api_calls": api_stats["calls"],
+        "api_calls_per_update": round(api_stats["total_calls"] / max(len(every), 1), 2),
+        "api_errors_injected": api_stats["errors"],
+        "handler_errors": dict(handler_latency.errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50, help="updates in flight at most")
+    parser.add_argument("--polls", type=int, default=200, help="polls created before the measurement")
+    parser.add_argument("--owners", type=int, default=50, help="users owning the polls")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="kind=weight pairs (%(default)s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--api-url", help="an already running fake Bot API, e.g. http://127.0.0.1:8081")
+    parser.add_argument("--port", type=int, default=8081, help="port of the fake Bot API started otherwise")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of API calls answered with 500")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="share of API calls answered with 429")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    fake_api = None
+    api_url = args.api_url
+    if not api_url:
+        api_url = "http://127.0.0.1:%d" % args.port
+        fake_api = start_fake_api(args.port, {
+            "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate, "flood_rate": args.flood_rate, "seed": args.seed})
+
+    with tempfile.TemporaryDirectory() as directory:
+        configure_bot(api_url, os.path.join(directory, "polls.db"))
+        try:
+            result = asyncio.run(run(args, api_url))
+        finally:
+            if fake_api:
+                fake_api.terminate()
+        logging.shutdown()
+
+    for kind, row in result["latency"].items():
+        print("%-12s %7d updates  p50 %8.2fms  p95 %8.2fms  p99 %8.2fms" % (
+            kind, row["updates"], row["p50_ms"], row["p95_ms"], row["p99_ms"]), file=sys.stderr)
+    print("%.1f updates/s, %.2f API calls per update" % (
+        result["updates_per_second"], result["api_calls_per_update"]), file=sys.stderr)
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Telegram Bot API, for load tests of the whole bot.
+
+Answers every method the bot uses (getMe, sendPoll, stopPoll, sendMessage,
+editMessageText, sendPhoto, answerInlineQuery, ...) with a minimal valid
+result; methods it does not know return True. Each call can be delayed
+(--latency-ms plus up to --jitter-ms) and failed on purpose: --error-rate
+answers 500 and --flood-rate answers 429 with retry_after, as Telegram does
+under load. Call and error counts per method are served at /_stats and
+cleared, with the queued updates, by POST /_reset. Updates POSTed to
+/_updates (one or a JSON list) are served to getUpdates, which long-polls
+like the real one.
+
+    python -m benchmarks.fake_bot_api --port 8081 --latency-ms 30 --jitter-ms 20
+    BOT_API_BASE_URL=http://127.0.0.1:8081/bot python main.py
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import time
+from collections import Counter
+
+import tornado.web
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {
+    "id": 123456,
+    "is_bot": True,
+    "first_name": "Load Test Bot",
+    "username": "loadtest_bot",
+    "can_join_groups": True,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": True,
+}
+
+
+class FakeBotApi:
+    """Results, delays and injected failures of the fake server, plus its counters."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 flood_rate: float = 0.0, seed: int = None):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.flood_rate = flood_rate
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.errors = Counter()
+        self._message_ids = itertools.count(1)
+        self._poll_ids = itertools.count(5000000000000000000)
+        self._file_ids = itertools.count(1)
+        self.updates = []
+        self._updates_pushed = asyncio.Event()
+
+    def delay(self) -> float:
+        return self.latency + self.random.random() * self.jitter
+
+    def failure(self, method: str) -> tuple[int, dict] | None:
+        """(status, body) of an injected failure, or None to answer normally."""
+        roll = self.random.random()
+        if roll < self.flood_rate:
+            self.errors[method] += 1
+            return 429, {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                         "parameters": {"retry_after": 1}}
+        if roll < self.flood_rate + self.error_rate:
+            self.errors[method] += 1
+            return 500, {"ok": False, "error_code": 500, "description": "Internal Server Error"}
+        return None
+
+    def message(self, params: dict, **fields) -> dict:
+        chat_id = _int(params.get("chat_id"), 1)
+        message = {
+            "message_id": _int(params.get("message_id")) or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            "from": BOT_USER,
+        }
+        if "text" in params:
+            message["text"] = params["text"]
+        message.update(fields)
+        return message
+
+    def poll(self, params: dict, poll_id: str, closed: bool = False) -> dict:
+        options = [option["text"] if isinstance(option, dict) else str(option)
+                   for option in _json(params.get("options"), [])]
+        return {
+            "id": poll_id,
+            "question": params.get("question", ""),
+            "options": [{"text": text, "voter_count": 0} for text in options],
+            "total_voter_count": 0,
+            "is_closed": closed,
+            "is_anonymous": _json(params.get("is_anonymous"), True),
+            "type": "regular",
+            "allows_multiple_answers": _json(params.get("allows_multiple_answers"), False),
+        }
+
+    def photo(self) -> list[dict]:
+        file_id = "fake-photo-%d" % next(self._file_ids)
+        return [{"file_id": file_id, "file_unique_id": file_id, "width": 640, "height": 480}]
+
+    def result(self, method: str, params: dict):
+        self.calls[method] += 1
+        name = method.lower()
+        if name == "getme":
+            return BOT_USER
+        if name == "sendpoll":
+            return self.message(params, poll=self.poll(params, str(next(self._poll_ids))))
+        if name == "stoppoll":
+            return self.poll(params, "0", closed=True)
+        if name == "sendphoto":
+            return self.message(params, photo=self.photo())
+        if name == "senddocument":
+            file_id = "fake-document-%d" % next(self._file_ids)
+            return self.message(params, document={"file_id": file_id, "file_unique_id": file_id})
+        if name in ("sendmessage", "editmessagetext", "editmessagereplymarkup", "editmessagecaption"):
+            if "inline_message_id" in params:
+                return True
+            return self.message(params)
+        if name == "getchatmember":
+            return {"status": "member", "user": {"id": _int(params.get("user_id"), 1), "is_bot": False,
+                                                 "first_name": "Member"}}
+        return True
+
+    def push_updates(self, updates: list[dict]) -> None:
+        self.updates.extend(updates)
+        self._updates_pushed.set()
+
+    async def get_updates(self, params: dict) -> list[dict]:
+        self.calls["getUpdates"] += 1
+        offset = _int(params.get("offset"), 0)
+        self.updates = [update for update in self.updates if update["update_id"] >= offset]
+        if not self.updates:
+            self._updates_pushed.clear()
+            try:
+                await asyncio.wait_for(self._updates_pushed.wait(), min(_int(params.get("timeout"), 0), 10))
+            except asyncio.TimeoutError:
+                pass
+        return self.updates[:_int(params.get("limit"), 100)]
+
+    def stats(self) -> dict:
+        return {"calls": dict(self.calls), "errors": dict(self.errors), "total_calls": sum(self.calls.values())}
+
+    def reset(self) -> None:
+        self.calls.clear()
+        self.errors.clear()
+        self.updates.clear()
+
+
+def _int(value, default: int = None) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _json(value, default):
+    """Bot API parameters arrive form-encoded, with non-string values as JSON."""
+    if value is None:
+        return default
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+class MethodHandler(tornado.web.RequestHandler):
+    def initialize(self, api: FakeBotApi):
+        self.api = api
+
+    async def post(self, token: str, method: str):
+        params = {name: self.get_body_argument(name) for name in self.request.body_arguments}
+        params.update((name, self.get_query_argument(name)) for name in self.request.query_arguments)
+        if self.request.headers.get("Content-Type", "").startswith("application/json") and self.request.body:
+            params.update(json.loads(self.request.body))
+
+        if method == "getUpdates":
+            self.finish({"ok": True, "result": await self.api.get_updates(params)})
+            return
+        delay = self.api.delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        failure = self.api.failure(method)
+        if failure:
+            status, body = failure
+        else:
+            status, body = 200, {"ok": True, "result": self.api.result(method, params)}
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json")
+        self.finish(json.dumps(body))
+
+    get = post
+
+
+class StatsHandler(tornado.web.RequestHandler):
+    def initialize(self, api: FakeBotApi):
+        self.api = api
+
+    def get(self):
+        self.finish(self.api.stats())
+
+    def post(self):
+        self.api.reset()
+        self.finish(self.api.stats())
+
+
+class UpdatesHandler(tornado.web.RequestHandler):
+    def initialize(self, api: FakeBotApi):
+        self.api = api
+
+    def post(self):
+        updates = json.loads(self.request.body)
+        self.api.push_updates(updates if isinstance(updates, list) else [updates])
+        self.finish({"queued": len(self.api.updates)})
+
+
+def make_app(api: FakeBotApi) -> tornado.web.Application:
+    return tornado.web.Application([
+        (r"/_stats", StatsHandler, {"api": api}),
+        (r"/_reset", StatsHandler, {"api": api}),
+        (r"/_updates", UpdatesHandler, {"api": api}),
+        (r"/bot([^/]+)/([A-Za-z]+)", MethodHandler, {"api": api}),
+    ])
+
+
+def serve(port: int, address: str = "127.0.0.1", **options) -> None:
+    """Run the fake server until interrupted; the target of benchmark subprocesses too."""
+    async def run():
+        make_app(FakeBotApi(**options)).listen(port, address)
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay of every call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="random extra delay, up to this much")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with 500")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="share of calls answered with 429")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    logger.info("Fake Bot API on http://%s:%s/bot<token>/", args.address, args.port)
+    serve(args.port, args.address, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+          error_rate=args.error_rate, flood_rate=args.flood_rate, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Logging cost of one recorded vote, on the thread that handles the update.
+
+A vote logs the same lines as the real path (the poll answer handler,
+PollService.record_poll_answer and PollRepository.record_poll_answer) through
+the loggers of those modules. Setups compared:
+
+    sync       the old per-module basicConfig: a StreamHandler formatting and
+               writing on the calling thread
+    queue      utils.logging_setup without sampling: queue + listener thread
+    sampled    utils.logging_setup with the default vote sampling
+    json       as sampled, with LOG_FORMAT=json
+
+Output goes to a temporary file, so the numbers include real write calls.
+
+    python -m benchmarks.logging_benchmark --votes 20000
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+from utils import logging_setup
+from utils.logging_setup import VOTE
+
+SETUPS = ("sync", "queue", "sampled", "json")
+
+
+def log_vote(loggers: tuple, poll_id: str, user_id: int, option: str) -> None:
+    handler, service, repository = loggers
+    handler.info("Poll answer received for poll %s from user %s", poll_id, user_id, extra=VOTE)
+    service.info("Recording vote for poll %s from user %s", poll_id, user_id, extra=VOTE)
+    service.info("Retrieved stored poll object from bot_data", extra=VOTE)
+    repository.info("poll_id: %s, selected_option: %s, user.id: %s", poll_id, option, user_id, extra=VOTE)
+    repository.info("option_id: %s", 1, extra=VOTE)
+    repository.info("Updated the database row for poll %s", poll_id, extra=VOTE)
+
+
+def configure(setup: str, path: str) -> None:
+    logging_setup.shutdown_logging()
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+
+    if setup == "sync":
+        # The record attributes the old setup collected on every call
+        logging.logThreads = logging.logProcesses = logging.logMultiprocessing = True
+        logging.basicConfig(
+            format=logging_setup.TEXT_FORMAT, level=logging.INFO,
+            handlers=[logging.StreamHandler(open(path, "a", encoding="utf-8"))])
+        return
+    os.environ["LOG_FILE"] = path
+    os.environ["LOG_FORMAT"] = "json" if setup == "json" else "text"
+    os.environ["LOG_SAMPLE_RATES"] = "vote=1" if setup == "queue" else logging_setup.DEFAULT_SAMPLE_RATES
+    logging_setup.setup_logging()
+
+
+def run(setup: str, votes: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bot.log")
+        configure(setup, path)
+        loggers = tuple(logging.getLogger(name) for name in (
+            "handlers.non_anonymous_poll_answer_handler", "services.poll_service", "database.poll_repository"))
+
+        started = time.perf_counter()
+        for i in range(votes):
+            log_vote(loggers, "5000000000000000%03d" % (i % 1000), 100000 + i, "Option %d" % (i % 4))
+        caller = time.perf_counter() - started
+        logging_setup.shutdown_logging()  # drains the queue
+        total = time.perf_counter() - started
+        for existing in logging.getLogger().handlers[:]:
+            existing.close()
+            logging.getLogger().removeHandler(existing)
+        size = os.path.getsize(path)
+    return {
+        "setup": setup,
+        "us_per_vote": caller / votes * 1e6,
+        "us_per_vote_incl_writer": total / votes * 1e6,
+        "bytes_per_vote": size / votes,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--votes", type=int, default=20000)
+    parser.add_argument("--setups", nargs="+", choices=SETUPS, default=list(SETUPS))
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = [run(setup, args.votes) for setup in args.setups]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print("%-8s %14s %22s %14s" % ("setup", "us/vote", "us/vote incl. writer", "bytes/vote"))
+    for row in results:
+        print("%-8s %14.1f %22.1f %14.0f" % (
+            row["setup"], row["us_per_vote"], row["us_per_vote_incl_writer"], row["bytes_per_vote"]))
+
+
+if __name__ == "__main__":
+    main()
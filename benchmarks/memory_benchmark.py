@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Memory per open poll and per vote, and how many polls fit in a container.
+
+Polls are created with PollService.send_poll and voted on through the poll
+answer handler, the code paths of the running bot: the Poll objects, the
+bot_data entries kept next to them, and the user_data dict the Application
+creates for every voter (as CallbackContext does, never dropped). The Bot
+API is a stub returning what send_poll and the live results need. Database
+writes go to a no-op repository, since SQLite keeps its data on disk and
+not in the process; --db uses the real PollRepository on a scratch file
+(much slower).
+
+Each measurement runs in a fresh process. Resident memory (RSS) and
+tracemalloc are measured in separate processes, because tracing inflates
+RSS; the traced run also lists the lines that allocated the most.
+
+    python -m benchmarks.memory_benchmark --polls 1000 5000 --voters 50
+    python -m benchmarks.memory_benchmark --polls 2000 --voters 10 200 --live-results --json
+
+The capacity table uses the RSS numbers of the largest run: polls with a
+given number of voters that fit in each container size, after the baseline
+of the process and keeping --headroom of the memory free.
+"""
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import tempfile
+import tracemalloc
+from collections import defaultdict
+from types import SimpleNamespace
+
+CONTAINER_MB = (256, 512, 1024, 2048)
+CAPACITY_VOTERS = (10, 100, 1000)
+OWNER_BASE = 1000
+VOTER_BASE = 1_000_000
+CHAT_ID = -1001000000000
+
+
+class StubBot:
+    """What PollService and LiveResultsScheduler read from Bot API results."""
+
+    def __init__(self):
+        self._poll_ids = itertools.count(5000000000000000000)
+        self._message_ids = itertools.count(1)
+
+    async def send_poll(self, **kwargs):
+        return SimpleNamespace(poll=SimpleNamespace(id=str(next(self._poll_ids))), message_id=next(self._message_ids))
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return SimpleNamespace(message_id=next(self._message_ids))
+
+    async def edit_message_text(self, text, **kwargs):
+        return True
+
+
+class NullRepository:
+    """PollRepository without storage; the service paths measured never read back."""
+
+    def create_poll(self, poll, user_id, chat_id, message_id):
+        pass
+
+    def record_poll_answer(self, poll, user_id, selected_options, closed):
+        pass
+
+    def set_results_message_id(self, poll_id, message_id):
+        pass
+
+    def get_poll_by_id(self, poll_id):
+        return None
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Peak rather than current outside Linux, still fine for a growing heap
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def poll_update(update_id: int, owner: int, question: str, options: list[str]) -> dict:
+    user = {"id": owner, "is_bot": False, "first_name": "Owner %d" % owner, "language_code": "en"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": owner, "type": "private", "first_name": user["first_name"]},
+            "from": user,
+            "web_app_data": {"data": json.dumps({"question": question, "options": options}), "button_text": "Create"},
+        },
+    }
+
+
+def vote_update(update_id: int, poll_id: str, voter: int, option: int) -> dict:
+    return {
+        "update_id": update_id,
+        "poll_answer": {
+            "poll_id": poll_id,
+            "user": {"id": voter, "is_bot": False, "first_name": "Voter %d" % voter, "language_code": "en"},
+            "option_ids": [option],
+        },
+    }
+
+
+async def build_state(num_polls: int, voters: int, options: int, db: str, live_results: bool, measure) -> list:
+    from telegram import Update
+    from database.poll_repository import PollRepository
+    from handlers.non_anonymous_poll_answer_handler import handle_non_anonymous_poll_answer
+    from models.poll import Poll
+    from services.inline_results_cache import InlineResultsCache
+    from services.live_results import LiveResultsScheduler
+    from services.poll_service import PollService
+    from services.vote_pubsub import VotePubSub
+
+    if db:
+        from database.poll_db import setup_database
+        setup_database(db)
+    service = PollService(PollRepository(db) if db else NullRepository(),
+                          live_results=LiveResultsScheduler(interval=3600) if live_results else None,
+                          pubsub=VotePubSub(), inline_cache=InlineResultsCache())
+    bot = StubBot()
+    bot_data = {"poll_service": service}
+    user_data = defaultdict(dict)
+    update_ids = itertools.count(1)
+
+    def context(user_id: int):
+        return SimpleNamespace(bot=bot, bot_data=bot_data, user_data=user_data[user_id])
+
+    samples = [measure("start")]
+    poll_ids = []
+    option_texts = ["Option %d" % k for k in range(options)]
+    for n in range(num_polls):
+        owner = OWNER_BASE + n % 100
+        question = "Memory benchmark poll number %d" % n
+        update = Update.de_json(poll_update(next(update_ids), owner, question, option_texts), None)
+        poll = Poll.from_form({"question": question, "options": option_texts})
+        poll_ids.append(await service.send_poll(poll, update, context(owner), target_chat_id=CHAT_ID))
+    samples.append(measure("polls"))
+
+    voter_ids = itertools.count(VOTER_BASE)
+    for k in range(voters):
+        for n, poll_id in enumerate(poll_ids):
+            voter = next(voter_ids)
+            update = Update.de_json(vote_update(next(update_ids), poll_id, voter, (n + k) % options), None)
+            await handle_non_anonymous_poll_answer(update, context(voter))
+    samples.append(measure("votes"))
+    return samples
+
+
+def measure_worker(num_polls: int, voters: int, options: int, traced: bool, db: bool, live_results: bool,
+                   top: int, results) -> None:
+    logging.disable(logging.INFO)
+    snapshots = {}
+
+    def sample(phase: str) -> int:
+        gc.collect()
+        if traced:
+            snapshots[phase] = tracemalloc.take_snapshot()
+            return tracemalloc.get_traced_memory()[0]
+        return rss_bytes()
+
+    if traced:
+        tracemalloc.start(1)
+    with tempfile.TemporaryDirectory() as directory:
+        samples = asyncio.run(build_state(
+            num_polls, voters, options, os.path.join(directory, "polls.db") if db else None, live_results,
+            sample))
+    start, after_polls, after_votes = samples
+    result = {
+        "method": "tracemalloc" if traced else "rss",
+        "polls": num_polls,
+        "voters_per_poll": voters,
+        "baseline_bytes": start,
+        "bytes_per_poll": (after_polls - start) / num_polls,
+        "bytes_per_vote": (after_votes - after_polls) / (num_polls * voters) if voters else 0.0,
+        "total_bytes": after_votes - start,
+    }
+    if traced:
+        stats = snapshots["votes"].compare_to(snapshots["start"], "lineno")
+        result["top_allocations"] = [
+            {"where": "%s:%d" % (stat.traceback[0].filename.replace(os.getcwd() + os.sep, ""),
+                                 stat.traceback[0].lineno),
+             "bytes": stat.size_diff, "blocks": stat.count_diff}
+            for stat in stats[:top]]
+    results.put(result)
+
+
+def measure(num_polls: int, voters: int, options: int, traced: bool, db: bool, live_results: bool,
+            top: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=measure_worker,
+                              args=(num_polls, voters, options, traced, db, live_results, top, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def capacity_table(rss: dict, headroom: float) -> list[dict]:
+    rows = []
+    for container_mb in CONTAINER_MB:
+        usable = container_mb * 1024 * 1024 * (1 - headroom) - rss["baseline_bytes"]
+        row = {"container_mb": container_mb}
+        for voters in CAPACITY_VOTERS:
+            per_poll = rss["bytes_per_poll"] + voters * rss["bytes_per_vote"]
+            row["polls_with_%d_voters" % voters] = max(0, int(usable / per_poll)) if per_poll > 0 else None
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--polls", type=int, nargs="+", default=[1000, 2000])
+    parser.add_argument("--voters", type=int, nargs="+", default=[50], help="voters per poll")
+    parser.add_argument("--options", type=int, default=4, help="options per poll")
+    parser.add_argument("--db", action="store_true", help="write to a real PollRepository")
+    parser.add_argument("--live-results", action="store_true", help="keep live results messages, as LIVE_RESULTS does")
+    parser.add_argument("--headroom", type=float, default=0.2, help="share of the container kept free")
+    parser.add_argument("--top", type=int, default=10, help="allocation sites listed per traced run")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    runs = []
+    for num_polls in args.polls:
+        for voters in args.voters:
+            rss = measure(num_polls, voters, args.options, False, args.db, args.live_results, args.top)
+            traced = measure(num_polls, voters, args.options, True, args.db, args.live_results, args.top)
+            runs.append({"rss": rss, "tracemalloc": traced})
+
+    largest = max(runs, key=lambda run: run["rss"]["total_bytes"])["rss"]
+    result = {
+        "config": {"options": args.options, "db": args.db, "live_results": args.live_results,
+                   "headroom": args.headroom},
+        "runs": runs,
+        "capacity": capacity_table(largest, args.headroom),
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print("%8s %8s  %14s %14s  %14s %14s" % (
+        "polls", "voters", "RSS B/poll", "RSS B/vote", "traced B/poll", "traced B/vote"))
+    for run in runs:
+        rss, traced = run["rss"], run["tracemalloc"]
+        print("%8d %8d  %14.0f %14.0f  %14.0f %14.0f" % (
+            rss["polls"], rss["voters_per_poll"], rss["bytes_per_poll"], rss["bytes_per_vote"],
+            traced["bytes_per_poll"], traced["bytes_per_vote"]))
+
+    print("\nOpen polls that fit (baseline RSS %.0f MB, %.0f%% headroom):" % (
+        largest["baseline_bytes"] / 1024 / 1024, args.headroom * 100))
+    print("%12s" % "container" + "".join("%18s" % ("%d voters/poll" % voters) for voters in CAPACITY_VOTERS))
+    for row in result["capacity"]:
+        print("%9d MB" % row["container_mb"] + "".join(
+            "%18s" % row["polls_with_%d_voters" % voters] for voters in CAPACITY_VOTERS))
+
+    traced = max(runs, key=lambda run: run["tracemalloc"]["total_bytes"])["tracemalloc"]
+    print("\nLargest allocations (%d polls, %d voters each):" % (traced["polls"], traced["voters_per_poll"]))
+    for row in traced["top_allocations"]:
+        print("%12.1f KB %9d blocks  %s" % (row["bytes"] / 1024, row["blocks"], row["where"]))
+
+
+if __name__ == "__main__":
+    main()
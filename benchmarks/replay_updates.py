@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Replay captured updates (utils.update_capture) into the bot.
+
+The application of main.py runs against the fake Bot API
+(benchmarks.fake_bot_api) and a scratch database: an empty one, or a copy
+of --db, e.g. a snapshot taken when the capture started, so that votes find
+their polls. Updates go through the update queue at the pace they were
+captured, --speed times faster, or as fast as the bot takes them with
+--speed 0. Several captures (one per sharded worker) are merged by time.
+
+    UPDATE_CAPTURE_FILE=updates.ndjson.gz python main.py
+    python -m benchmarks.replay_updates updates.ndjson.gz --speed 0 --output before.json
+    python -m benchmarks.replay_updates updates.ndjson.gz --speed 0 --compare before.json
+
+--compare prints the change of throughput and of the latency percentiles of
+each update type against an earlier run, which should use the same capture
+and speed. An update type whose p50 or p95 grew, or a throughput that fell,
+by more than --threshold makes the exit code 1. Throughput only says
+something about the build at --speed 0; at a finite speed it follows the
+capture.
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.e2e_loadtest import Driver, configure_bot, running_application, start_fake_api, summarize
+from utils.update_capture import read_capture
+
+
+def update_kind(data: dict) -> str:
+    """The update's payload field: message, poll_answer, poll, inline_query, ..."""
+    return next((key for key in data if key != "update_id"), "unknown")
+
+
+def load_updates(paths: list[str], limit: int = None) -> list[tuple[float, dict]]:
+    merged = heapq.merge(*(read_capture(path) for path in paths), key=lambda entry: entry[0])
+    updates = []
+    for entry in merged:
+        if limit is not None and len(updates) >= limit:
+            break
+        updates.append(entry)
+    return updates
+
+
+async def replay(updates: list[tuple[float, dict]], speed: float, concurrency: int, api_url: str) -> dict:
+    async with running_application() as application:
+        driver = Driver(application, concurrency)
+        async with httpx.AsyncClient() as client:
+            await client.post(api_url + "/_reset")
+            first = updates[0][0]
+            started = time.perf_counter()
+            for captured_at, data in updates:
+                if speed > 0:
+                    delay = (captured_at - first) / speed - (time.perf_counter() - started)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                await driver.feed(update_kind(data), data)
+            await driver.drain()
+            elapsed = time.perf_counter() - started
+            api_stats = (await client.get(api_url + "/_stats")).json()
+
+    from utils.metrics import handler_latency
+
+    every = [latency for latencies in driver.latencies.values() for latency in latencies]
+    return {
+        "seconds": round(elapsed, 3),
+        "captured_seconds": round(updates[-1][0] - first, 3),
+        "updates_per_second": round(len(every) / elapsed, 1),
+        "latency": {"all": summarize(every),
+                    **{kind: summarize(latencies) for kind, latencies in sorted(driver.latencies.items())}},
+        "api_calls": api_stats["calls"],
+        "api_calls_per_update": round(api_stats["total_calls"] / max(len(every), 1), 2),
+        "api_errors_injected": api_stats["errors"],
+        "handler_errors": dict(handler_latency.errors),
+    }
+
+
+def _change(before: float, after: float) -> str:
+    if not before:
+        return "n/a"
+    return "%+.1f%%" % ((after - before) / before * 100)
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> tuple[list[str], list[str]]:
+    """(lines describing every change, the subset that are regressions)."""
+    lines = []
+    regressions = []
+    before, after = baseline["updates_per_second"], result["updates_per_second"]
+    line = "throughput: %.1f -> %.1f updates/s (%s)" % (before, after, _change(before, after))
+    lines.append(line)
+    if after < before / (1 + threshold):
+        regressions.append(line)
+    before, after = baseline["api_calls_per_update"], result["api_calls_per_update"]
+    lines.append("API calls per update: %.2f -> %.2f (%s)" % (before, after, _change(before, after)))
+
+    for kind, row in result["latency"].items():
+        previous = baseline["latency"].get(kind)
+        if not previous:
+            continue
+        for percentile in ("p50_ms", "p95_ms", "p99_ms"):
+            line = "%s %s: %.2f -> %.2fms (%s)" % (
+                kind, percentile[:3], previous[percentile], row[percentile],
+                _change(previous[percentile], row[percentile]))
+            lines.append(line)
+            if percentile != "p99_ms" and row[percentile] > previous[percentile] * (1 + threshold):
+                regressions.append(line)
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("captures", nargs="+", help="capture files written with UPDATE_CAPTURE_FILE")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = as captured, 10 = ten times faster, 0 = no pauses")
+    parser.add_argument("--limit", type=int, help="replay only the first N updates")
+    parser.add_argument("--concurrency", type=int, default=1000, help="updates in flight at most")
+    parser.add_argument("--db", help="database to copy as the starting state (default: empty)")
+    parser.add_argument("--api-url", help="an already running fake Bot API, e.g. http://127.0.0.1:8081")
+    parser.add_argument("--port", type=int, default=8081, help="port of the fake Bot API started otherwise")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON results of an earlier replay")
+    parser.add_argument("--threshold", type=float, default=0.2, help="tolerated slowdown for --compare (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    updates = load_updates(args.captures, args.limit)
+    if not updates:
+        parser.error("the captures hold no updates")
+
+    fake_api = None
+    api_url = args.api_url
+    if not api_url:
+        api_url = "http://127.0.0.1:%d" % args.port
+        fake_api = start_fake_api(args.port, {
+            "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "seed": args.seed})
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "polls.db")
+        if args.db:
+            shutil.copyfile(args.db, db_path)
+        configure_bot(api_url, db_path)
+        try:
+            result = asyncio.run(replay(updates, args.speed, args.concurrency, api_url))
+        finally:
+            if fake_api:
+                fake_api.terminate()
+        logging.shutdown()
+
+    result["config"] = {
+        "captures": args.captures,
+        "updates": len(updates),
+        "speed": args.speed,
+        "concurrency": args.concurrency,
+        "db": args.db,
+        "latency_ms": args.latency_ms,
+        "jitter_ms": args.jitter_ms,
+    }
+    for kind, row in result["latency"].items():
+        print("%-16s %7d updates  p50 %8.2fms  p95 %8.2fms  p99 %8.2fms" % (
+            kind, row["updates"], row["p50_ms"], row["p95_ms"], row["p99_ms"]), file=sys.stderr)
+    print("%.1f updates/s over %.1fs (captured over %.1fs)" % (
+        result["updates_per_second"], result["seconds"], result["captured_seconds"]), file=sys.stderr)
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            lines, regressions = compare(result, json.load(f), args.threshold)
+        for line in lines:
+            print(("REGRESSION " if line in regressions else "           ") + line, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
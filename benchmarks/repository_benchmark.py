@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+PollRepository latency and throughput on synthetic datasets.
+
+Each scale is a database of polls (4 options each, a fifth of them
+anonymous) and votes spread over the non-anonymous polls. Datasets are
+generated once per scale and seed into --data-dir and copied for every run,
+so runs start from identical files. Read operations run first, on the
+untouched dataset, then the writes.
+
+    python -m benchmarks.repository_benchmark --scales small large --output run.json
+    python -m benchmarks.repository_benchmark --scales small --compare run.json
+
+With --compare, any operation whose p50 or throughput is worse than the
+baseline by more than --threshold is reported and the exit code is 1.
+INFO logging is silenced so that the vote logs do not end up in the timings.
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from database.poll_db import setup_database
+from database.poll_repository import PollRepository
+from models.poll import Poll
+
+SCALES = {
+    "small": (1000, 10000),
+    "medium": (10000, 100000),
+    "large": (100000, 1000000),
+}
+OPTIONS_PER_POLL = 4
+POLLS_PER_USER = 10
+VOTER_BASE = 10_000_000
+
+READS = ("get_poll_by_id", "get_polls_by_user", "get_poll_results", "get_poll_statistics")
+WRITES = ("create_poll", "record_poll_answer", "remove_vote")
+OPERATIONS = READS + WRITES
+
+
+def poll_id(i: int) -> str:
+    return "bench-%07d" % i
+
+
+def generate_dataset(path: str, polls: int, votes: int, seed: int = 1) -> None:
+    """Bulk-load a dataset with the repository's schema (and triggers)."""
+    rng = random.Random(seed)
+    setup_database(path)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous = OFF")
+    created = time.time() - 30 * 24 * 3600
+
+    conn.executemany("""
+        INSERT INTO polls (poll_id, user_id, chat_id, message_id, anonimity, forwarding, "limit",
+                           question, expiration_date, voters_num, closed)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?)
+    """, ((poll_id(i), 1 + i // POLLS_PER_USER, -1000 - i % 500, i, i % 5 == 0, True, None,
+           "Benchmark question %d" % i, created + i, i % 7 == 0) for i in range(polls)))
+    conn.executemany(
+        "INSERT INTO poll_options (id, poll_id, option_text) VALUES (?, ?, ?)",
+        ((i * OPTIONS_PER_POLL + k + 1, poll_id(i), "Option %d" % k)
+         for i in range(polls) for k in range(OPTIONS_PER_POLL)))
+
+    votable = [i for i in range(polls) if i % 5]
+    voters = {}
+    rows = []
+    for n in range(votes):
+        i = rng.choice(votable)
+        voters[i] = voters.get(i, 0) + 1
+        rows.append((poll_id(i), VOTER_BASE + n, i * OPTIONS_PER_POLL + rng.randrange(OPTIONS_PER_POLL) + 1,
+                     created + i + n / votes))
+    conn.executemany("INSERT INTO votes (poll_id, user_id, option_id, voted_at) VALUES (?, ?, ?, ?)", rows)
+    conn.executemany("UPDATE polls SET voters_num = ? WHERE poll_id = ?",
+                     ((count, poll_id(i)) for i, count in voters.items()))
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def dataset_path(data_dir: str, scale: str, seed: int) -> str:
+    polls, votes = SCALES[scale]
+    path = os.path.join(data_dir, "polls-%s-%d-%d-seed%d.db" % (scale, polls, votes, seed))
+    if not os.path.exists(path):
+        print("Generating %s dataset (%d polls, %d votes)..." % (scale, polls, votes), file=sys.stderr)
+        started = time.perf_counter()
+        partial = path + ".partial"
+        if os.path.exists(partial):
+            os.remove(partial)
+        generate_dataset(partial, polls, votes, seed)
+        os.replace(partial, path)
+        print("  done in %.1fs" % (time.perf_counter() - started), file=sys.stderr)
+    return path
+
+
+def summarize(operation: str, timings: list[float]) -> dict:
+    timings = sorted(timings)
+    total = sum(timings)
+
+    def percentile(q: float) -> float:
+        return timings[min(len(timings) - 1, int(q / 100 * len(timings)))] * 1000
+
+    return {
+        "operation": operation,
+        "iterations": len(timings),
+        "ops_per_sec": len(timings) / total if total else 0.0,
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": timings[-1] * 1000,
+    }
+
+
+def timed(calls) -> list[float]:
+    timings = []
+    for call in calls:
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def run_scale(scale: str, data_dir: str, iterations: int, operations: tuple, seed: int) -> list[dict]:
+    polls, _ = SCALES[scale]
+    rng = random.Random(seed + 1)
+    with tempfile.TemporaryDirectory() as directory:
+        db = os.path.join(directory, "polls.db")
+        shutil.copyfile(dataset_path(data_dir, scale, seed), db)
+        repository = PollRepository(db)
+
+        sample = [rng.randrange(polls) for _ in range(iterations)]
+        votable = [i for i in sample if i % 5] or [1]
+        options = ["Option %d" % k for k in range(OPTIONS_PER_POLL)]
+        voted = [(poll_id(rng.choice(votable)), 2 * VOTER_BASE + n) for n in range(iterations)]
+
+        ids = [poll_id(i) for i in sample]
+        calls = {
+            "get_poll_by_id": [functools.partial(repository.get_poll_by_id, pid) for pid in ids],
+            "get_polls_by_user": [functools.partial(repository.get_polls_by_user, 1 + i // POLLS_PER_USER)
+                                  for i in sample],
+            "get_poll_results": [functools.partial(repository.get_poll_results, pid) for pid in ids],
+            "get_poll_statistics": [functools.partial(repository.get_poll_statistics, pid) for pid in ids],
+            "create_poll": [functools.partial(
+                repository.create_poll,
+                Poll(id="bench-new-%d" % n, question="New question %d" % n, options=options), 1 + n % 100, -1000, n)
+                for n in range(iterations)],
+            "record_poll_answer": [functools.partial(
+                repository.record_poll_answer, Poll(id=pid, options=options), user, [user % OPTIONS_PER_POLL], False)
+                for pid, user in voted],
+            "remove_vote": [functools.partial(repository.remove_vote, pid, user) for pid, user in voted],
+        }
+
+        results = []
+        for operation in OPERATIONS:
+            if operation not in operations:
+                continue
+            result = summarize(operation, timed(calls[operation]))
+            result["scale"] = scale
+            results.append(result)
+            print("%-7s %-20s %9.0f ops/s  p50 %8.3fms  p95 %8.3fms  p99 %8.3fms" % (
+                scale, operation, result["ops_per_sec"], result["p50_ms"], result["p95_ms"], result["p99_ms"]),
+                file=sys.stderr)
+        return results
+
+
+def compare(results: list[dict], baseline: dict, threshold: float) -> list[str]:
+    previous = {(row["scale"], row["operation"]): row for row in baseline["results"]}
+    regressions = []
+    for row in results:
+        before = previous.get((row["scale"], row["operation"]))
+        if not before:
+            continue
+        if row["p50_ms"] > before["p50_ms"] * (1 + threshold):
+            regressions.append("%s %s: p50 %.3fms -> %.3fms" % (
+                row["scale"], row["operation"], before["p50_ms"], row["p50_ms"]))
+        if row["ops_per_sec"] < before["ops_per_sec"] / (1 + threshold):
+            regressions.append("%s %s: %.0f -> %.0f ops/s" % (
+                row["scale"], row["operation"], before["ops_per_sec"], row["ops_per_sec"]))
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", nargs="+", choices=SCALES, default=["small", "large"])
+    parser.add_argument("--operations", nargs="+", choices=OPERATIONS, default=list(OPERATIONS))
+    parser.add_argument("--iterations", type=int, default=500, help="calls per operation")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "poll-bot-benchmarks"))
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON results of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="tolerated slowdown for --compare (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = []
+    for scale in args.scales:
+        results.extend(run_scale(scale, args.data_dir, args.iterations, tuple(args.operations), args.seed))
+
+    report = {
+        "meta": {
+            "started_at": time.time(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "seed": args.seed,
+            "scales": {scale: dict(zip(("polls", "votes"), SCALES[scale])) for scale in args.scales},
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print("REGRESSION " + line, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Update throughput of the sharded worker mode as the worker count grows.
+
+Every worker does the CPU-bound part of handling a poll answer: decoding the
+update into telegram objects and rendering a results summary. The Bot API and
+the database are left out so the numbers show how the work scales across cores.
+
+    python -m benchmarks.sharding_benchmark --updates 20000 --workers 1 2 4
+"""
+import argparse
+import json
+import multiprocessing
+import queue
+import time
+
+from services.sharding import HEARTBEAT_INTERVAL, ShardSupervisor
+
+
+def make_update(update_id: int, num_polls: int) -> dict:
+    return {
+        "update_id": update_id,
+        "poll_answer": {
+            "poll_id": str(5000000000000000000 + update_id % num_polls),
+            "user": {"id": 100000 + update_id, "is_bot": False, "first_name": "Voter"},
+            "option_ids": [update_id % 4],
+        },
+    }
+
+
+def bench_worker(index, updates, heartbeat, processed) -> None:
+    from telegram import Update
+    from models.poll import Poll
+
+    polls = {}
+    while True:
+        heartbeat.value = time.time()
+        try:
+            data = updates.get(True, HEARTBEAT_INTERVAL)
+        except queue.Empty:
+            continue
+        if data is None:
+            return
+        update = Update.de_json(json.loads(json.dumps(data)), None)
+        answer = update.poll_answer
+        poll = polls.setdefault(answer.poll_id, Poll(
+            id=answer.poll_id, question="Benchmark poll", options=["A", "B", "C", "D"]))
+        poll.votes[answer.user.id] = list(answer.option_ids)
+        poll.get_results_summary()
+        with processed.get_lock():
+            processed.value += 1
+
+
+def run(num_workers: int, num_updates: int, num_polls: int) -> dict:
+    processed = multiprocessing.get_context("spawn").Value("i", 0)
+    supervisor = ShardSupervisor(num_workers, bench_worker, worker_args=(processed,))
+    supervisor.start()
+
+    # Let the workers finish importing before the clock starts
+    for worker in supervisor.workers:
+        worker.updates.put(make_update(0, num_polls))
+    while processed.value < num_workers:
+        time.sleep(0.01)
+
+    started = time.perf_counter()
+    for update_id in range(1, num_updates + 1):
+        supervisor.dispatch(make_update(update_id, num_polls))
+    while processed.value < num_updates + num_workers:
+        time.sleep(0.005)
+    elapsed = time.perf_counter() - started
+
+    supervisor.stop()
+    return {
+        "workers": num_workers,
+        "updates": num_updates,
+        "seconds": round(elapsed, 3),
+        "updates_per_second": round(num_updates / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--polls", type=int, default=500)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    results = [run(n, args.updates, args.polls) for n in args.workers]
+    baseline = results[0]["updates_per_second"]
+    for result in results:
+        result["speedup"] = round(result["updates_per_second"] / baseline, 2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Cold start of the bot: from process launch until the first update is handled.
+
+Each run starts `python main.py` in polling mode against the fake Bot API
+(benchmarks.fake_bot_api) with a /help update waiting, as after a container
+restart, and stops the clock when the reply reaches the fake API. The
+database is kept between runs, like a volume. With --cold-bytecode every
+run gets an empty bytecode cache (PYTHONPYCACHEPREFIX), like an image built
+without compiled .pyc files; compare the two to see what precompiling the
+image (python -m compileall) is worth. The phases the bot logged itself
+(utils.startup) are shown for the last run.
+
+    python -m benchmarks.startup_benchmark --runs 5
+    python -m benchmarks.startup_benchmark --runs 5 --cold-bytecode
+    python -m benchmarks.startup_benchmark --imports 25
+
+--imports N profiles the imports of main.build_application() with python
+-X importtime instead (main.py imports the handlers and services there, not
+at module level), and prints the N modules with the most self time and the
+time per top-level package.
+"""
+import argparse
+import json
+import os
+import re
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.e2e_loadtest import TOKEN, start_fake_api
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+# Optional servers with fixed ports, which would collide between runs
+UNSET = ("BOT_WORKERS", "WEBAPP_SERVER_PORT", "METRICS_PORT", "UPDATE_CAPTURE_FILE", "TRACE_FILE")
+
+
+def bot_environment(api_url: str, directory: str, log_file: str, cold_bytecode: bool) -> dict:
+    env = dict(os.environ, TELEGRAM_TOKEN=TOKEN, POLLS_DB=os.path.join(directory, "polls.db"),
+               BOT_API_BASE_URL=api_url + "/bot", LOG_LEVEL="INFO", LOG_FORMAT="text", LOG_FILE=log_file)
+    for name in UNSET:
+        env.pop(name, None)
+    if cold_bytecode:
+        env["PYTHONPYCACHEPREFIX"] = tempfile.mkdtemp(dir=directory, prefix="pycache-")
+    return env
+
+
+def help_update(update_id: int) -> dict:
+    user = {"id": 1000, "is_bot": False, "first_name": "Startup", "language_code": "en"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user["id"], "type": "private", "first_name": user["first_name"]},
+            "from": user,
+            "text": "/help",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 5}],
+        },
+    }
+
+
+def cold_start(api_url: str, env: dict, update_id: int, timeout: float) -> float:
+    """Seconds from launching the bot until its reply to the waiting update arrives."""
+    httpx.post(api_url + "/_reset")
+    httpx.post(api_url + "/_updates", json=help_update(update_id))
+    started = time.perf_counter()
+    bot = subprocess.Popen([sys.executable, "main.py"], cwd=ROOT, env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            if httpx.get(api_url + "/_stats").json()["calls"].get("sendMessage"):
+                return time.perf_counter() - started
+            if bot.poll() is not None:
+                raise RuntimeError("The bot exited with code %s before handling the update" % bot.returncode)
+            time.sleep(0.002)
+        raise RuntimeError("The bot did not handle the update within %.0fs" % timeout)
+    finally:
+        bot.send_signal(signal.SIGINT)
+        try:
+            bot.wait(15)
+        except subprocess.TimeoutExpired:
+            bot.kill()
+            bot.wait()
+
+
+def startup_lines(log_file: str) -> list[str]:
+    with open(log_file, encoding="utf-8") as f:
+        return [line.rstrip() for line in f if "utils.startup" in line]
+
+
+def run_cold_starts(runs: int, cold_bytecode: bool, port: int) -> dict:
+    api_url = "http://127.0.0.1:%d" % port
+    fake_api = start_fake_api(port, {})
+    timings = []
+    lines = []
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for run in range(runs):
+                log_file = os.path.join(directory, "bot-%d.log" % run)
+                env = bot_environment(api_url, directory, log_file, cold_bytecode)
+                timings.append(cold_start(api_url, env, run + 1, timeout=60))
+                lines = startup_lines(log_file)
+    finally:
+        fake_api.terminate()
+    return {
+        "runs": runs,
+        "cold_bytecode": cold_bytecode,
+        "min_ms": round(min(timings) * 1000, 1),
+        "median_ms": round(statistics.median(timings) * 1000, 1),
+        "max_ms": round(max(timings) * 1000, 1),
+        "timings_ms": [round(t * 1000, 1) for t in timings],
+        "bot_log": lines,
+    }
+
+
+def import_profile(top: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, TELEGRAM_TOKEN=TOKEN, POLLS_DB=os.path.join(directory, "polls.db"),
+                   LOG_LEVEL="WARNING")
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main; main.build_application()"],
+                                cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    modules = []
+    packages = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, module = int(match.group(1)), int(match.group(2)), match.group(4)
+        modules.append((module, self_us, cumulative_us))
+        package = module.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    return {
+        "imports_ms": round(sum(self_us for _, self_us, _ in modules) / 1000, 1),
+        "slowest_modules": [
+            {"module": module, "self_ms": round(self_us / 1000, 2), "cumulative_ms": round(cumulative / 1000, 2)}
+            for module, self_us, cumulative in sorted(modules, key=lambda m: -m[1])[:top]],
+        "packages": [
+            {"package": package, "self_ms": round(self_us / 1000, 2)}
+            for package, self_us in sorted(packages.items(), key=lambda p: -p[1])[:top]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--cold-bytecode", action="store_true", help="start every run without cached .pyc files")
+    parser.add_argument("--port", type=int, default=8081, help="port of the fake Bot API")
+    parser.add_argument("--imports", type=int, metavar="N", help="profile the imports of the bot instead")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    if args.imports:
+        result = import_profile(args.imports)
+        if args.json:
+            print(json.dumps(result, indent=2))
+            return
+        print("imports: %.1fms\n" % result["imports_ms"])
+        print("%-50s %10s %14s" % ("module", "self ms", "cumulative ms"))
+        for row in result["slowest_modules"]:
+            print("%-50s %10.2f %14.2f" % (row["module"], row["self_ms"], row["cumulative_ms"]))
+        print("\n%-50s %10s" % ("package", "self ms"))
+        for row in result["packages"]:
+            print("%-50s %10.2f" % (row["package"], row["self_ms"]))
+        return
+
+    result = run_cold_starts(args.runs, args.cold_bytecode, args.port)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print("cold start to first update (%d runs%s): min %.0fms  median %.0fms  max %.0fms" % (
+        result["runs"], ", cold bytecode" if result["cold_bytecode"] else "",
+        result["min_ms"], result["median_ms"], result["max_ms"]))
+    for line in result["bot_log"]:
+        print("  " + line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Load test for the Web App server.
+
+Opens `--concurrency` keep-alive clients that fetch the URL in a loop and
+reports requests/sec and latency percentiles. `--revalidate` sends the
+ETag from the first response, like a returning Web App user.
+
+    python -m benchmarks.webapp_loadtest http://localhost:8000/ --concurrency 50 --requests 5000
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+
+import httpx
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run(url: str, concurrency: int, total_requests: int, revalidate: bool, encoding: str) -> dict:
+    headers = {"Accept-Encoding": encoding}
+    latencies = []
+    statuses = Counter()
+    remaining = total_requests
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        if revalidate:
+            first = await client.get(url, headers=headers)
+            headers["If-None-Match"] = first.headers.get("ETag", "")
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url, headers=headers)
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "url": url,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "statuses": {str(k): v for k, v in statuses.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Web App server")
+    parser.add_argument("url", nargs="?", default="http://localhost:8000/")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--revalidate", action="store_true", help="send If-None-Match (expect 304s)")
+    parser.add_argument("--encoding", default="gzip, br", help="Accept-Encoding header to send")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url, args.concurrency, args.requests, args.revalidate, args.encoding))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
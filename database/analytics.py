@@ -0,0 +1,137 @@
+"""
+Participation rollups per chat and per user.
+
+The record_* functions run on the caller's cursor, inside the transaction
+that creates the poll, stores the vote or closes the poll, so the rollups
+never drift from the data. AnalyticsRepository reads them with primary key
+or index range lookups only.
+"""
+import sqlite3
+import time
+from dataclasses import dataclass
+
+WEEK = 7 * 24 * 3600
+# The unix epoch was a Thursday; shift so weeks start on Monday
+WEEK_OFFSET = 3 * 24 * 3600
+
+
+def week_start(at: float) -> int:
+    return int((at + WEEK_OFFSET) // WEEK) * WEEK - WEEK_OFFSET
+
+
+@dataclass
+class ChatStats:
+    chat_id: int
+    polls_created: int = 0
+    polls_closed: int = 0
+    votes: int = 0
+    first_poll_at: float = None
+    last_poll_at: float = None
+
+    @property
+    def average_turnout(self) -> float:
+        """Votes per poll."""
+        return self.votes / self.polls_created if self.polls_created else 0.0
+
+
+@dataclass
+class UserStats:
+    user_id: int
+    polls_created: int = 0
+    votes_cast: int = 0
+
+
+def record_poll_created(cursor, chat_id: int, user_id: int, at: float = None) -> None:
+    at = time.time() if at is None else at
+    cursor.execute("""
+        INSERT INTO chat_stats (chat_id, polls_created, first_poll_at, last_poll_at)
+        VALUES (?, 1, ?, ?)
+        ON CONFLICT (chat_id) DO UPDATE SET
+            polls_created = polls_created + 1,
+            last_poll_at = excluded.last_poll_at
+    """, (chat_id, at, at))
+    cursor.execute("""
+        INSERT INTO chat_weekly_stats (chat_id, week, polls_created) VALUES (?, ?, 1)
+        ON CONFLICT (chat_id, week) DO UPDATE SET polls_created = polls_created + 1
+    """, (chat_id, week_start(at)))
+    cursor.execute("""
+        INSERT INTO user_stats (user_id, polls_created) VALUES (?, 1)
+        ON CONFLICT (user_id) DO UPDATE SET polls_created = polls_created + 1
+    """, (user_id,))
+
+
+def record_votes(cursor, poll_id: str, votes: int, user_id: int = None, at: float = None) -> None:
+    """
+    Add `votes` (negative for retractions) to the rollups of the poll's chat.
+    `user_id` is None for anonymous polls, which have no per-voter data.
+    """
+    if not votes:
+        return
+    at = time.time() if at is None else at
+    cursor.execute("SELECT chat_id FROM polls WHERE poll_id = ?", (poll_id,))
+    row = cursor.fetchone()
+    if not row or row[0] is None:
+        return
+    chat_id = row[0]
+
+    cursor.execute("""
+        INSERT INTO chat_stats (chat_id, votes) VALUES (?, ?)
+        ON CONFLICT (chat_id) DO UPDATE SET votes = votes + excluded.votes
+    """, (chat_id, votes))
+    cursor.execute("""
+        INSERT INTO chat_weekly_stats (chat_id, week, votes) VALUES (?, ?, ?)
+        ON CONFLICT (chat_id, week) DO UPDATE SET votes = votes + excluded.votes
+    """, (chat_id, week_start(at), votes))
+    if user_id is not None:
+        cursor.execute("""
+            INSERT INTO chat_voter_stats (chat_id, user_id, votes) VALUES (?, ?, ?)
+            ON CONFLICT (chat_id, user_id) DO UPDATE SET votes = votes + excluded.votes
+        """, (chat_id, user_id, votes))
+        cursor.execute("""
+            INSERT INTO user_stats (user_id, votes_cast) VALUES (?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET votes_cast = votes_cast + excluded.votes_cast
+        """, (user_id, votes))
+
+
+def record_poll_closed(cursor, poll_id: str) -> None:
+    cursor.execute("""
+        UPDATE chat_stats SET polls_closed = polls_closed + 1
+        WHERE chat_id = (SELECT chat_id FROM polls WHERE poll_id = ?)
+    """, (poll_id,))
+
+
+class AnalyticsRepository:
+    def __init__(self, db):
+        self.db = db
+
+    def chat_stats(self, chat_id: int) -> ChatStats:
+        with sqlite3.connect(self.db) as conn:
+            row = conn.execute("""
+                SELECT chat_id, polls_created, polls_closed, votes, first_poll_at, last_poll_at
+                FROM chat_stats WHERE chat_id = ?
+            """, (chat_id,)).fetchone()
+        return ChatStats(*row) if row else ChatStats(chat_id)
+
+    def weekly_stats(self, chat_id: int, weeks: int = 8) -> list[tuple[int, int, int]]:
+        """(week start, polls created, votes) for the last `weeks` weeks, oldest first."""
+        since = week_start(time.time()) - (weeks - 1) * WEEK
+        with sqlite3.connect(self.db) as conn:
+            return conn.execute("""
+                SELECT week, polls_created, votes FROM chat_weekly_stats
+                WHERE chat_id = ? AND week >= ? ORDER BY week
+            """, (chat_id, since)).fetchall()
+
+    def top_voters(self, chat_id: int, limit: int = 5) -> list[tuple[int, int]]:
+        """(user_id, votes) of the most active voters in a chat."""
+        with sqlite3.connect(self.db) as conn:
+            return conn.execute("""
+                SELECT user_id, votes FROM chat_voter_stats
+                WHERE chat_id = ? AND votes > 0
+                ORDER BY votes DESC LIMIT ?
+            """, (chat_id, limit)).fetchall()
+
+    def user_stats(self, user_id: int) -> UserStats:
+        with sqlite3.connect(self.db) as conn:
+            row = conn.execute(
+                "SELECT user_id, polls_created, votes_cast FROM user_stats WHERE user_id = ?", (user_id,)).fetchone()
+        return UserStats(*row) if row else UserStats(user_id)
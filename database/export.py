@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Streaming export of a poll's options and votes as CSV or NDJSON.
+
+Rows are read from an open SQLite cursor and encoded and compressed as they
+arrive, so memory use does not depend on the number of voters.
+
+    python -m database.export <poll_id> [--format csv|ndjson] [--output FILE] [--gzip]
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sqlite3
+import sys
+from typing import IO, Iterator
+
+from dotenv import load_dotenv
+
+from utils.logging_setup import setup_logging
+
+FORMATS = ("csv", "ndjson")
+CSV_COLUMNS = ("record", "poll_id", "option_index", "option_text", "votes", "user_id")
+FETCH_SIZE = 1000
+# Encoded rows are handed to the compressor in chunks of about this size
+WRITE_SIZE = 64 * 1024
+
+
+def poll_exists(db: str, poll_id: str) -> bool:
+    with sqlite3.connect(db) as conn:
+        return conn.execute("SELECT 1 FROM polls WHERE poll_id = ?", (poll_id,)).fetchone() is not None
+
+
+def iter_poll_records(db: str, poll_id: str) -> Iterator[dict]:
+    """
+    One "poll" record, one "option" record per option and one "vote" record
+    per (voter, option). Anonymous polls only have counts, so they yield no
+    vote records.
+    """
+    with sqlite3.connect(db) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT question, anonimity, closed, voters_num, chat_id FROM polls WHERE poll_id = ?
+        """, (poll_id,))
+        row = cursor.fetchone()
+        if not row:
+            return
+        question, anonymous, closed, voters_num, chat_id = row
+        yield {"record": "poll", "poll_id": poll_id, "question": question, "anonymous": bool(anonymous),
+               "closed": bool(closed), "voters": voters_num, "chat_id": chat_id}
+
+        # A poll has at most a dozen options, so these are held in memory
+        cursor.execute("SELECT option_id, COUNT(*) FROM votes WHERE poll_id = ? GROUP BY option_id", (poll_id,))
+        vote_counts = dict(cursor.fetchall())
+        cursor.execute("SELECT id, option_text, vote_count FROM poll_options WHERE poll_id = ? ORDER BY id", (poll_id,))
+        option_index = {}
+        for index, (option_id, option_text, stored_count) in enumerate(cursor.fetchall()):
+            option_index[option_id] = (index, option_text)
+            yield {"record": "option", "poll_id": poll_id, "option_index": index, "option_text": option_text,
+                   "votes": (stored_count or 0) if anonymous else vote_counts.get(option_id, 0)}
+
+        cursor.execute("SELECT user_id, option_id FROM votes WHERE poll_id = ? ORDER BY id", (poll_id,))
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            for user_id, option_id in rows:
+                index, option_text = option_index.get(option_id, (None, None))
+                yield {"record": "vote", "poll_id": poll_id, "option_index": index,
+                       "option_text": option_text, "user_id": user_id}
+
+
+def iter_csv(records: Iterator[dict]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    for record in records:
+        if record["record"] == "poll":
+            # The poll's own fields do not fit the row layout; keep the question in option_text
+            record = {"record": "poll", "poll_id": record["poll_id"], "option_text": record["question"],
+                      "votes": record["voters"]}
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def iter_ndjson(records: Iterator[dict]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def export_poll(db: str, poll_id: str, output: IO[bytes], fmt: str = "csv", compress: bool = True) -> int:
+    """Write the export of `poll_id` to a binary file object; returns the number of records."""
+    if fmt not in FORMATS:
+        raise ValueError("Unknown export format: %s" % fmt)
+    encode = iter_csv if fmt == "csv" else iter_ndjson
+
+    count = 0
+
+    def counted(records):
+        nonlocal count
+        for record in records:
+            count += 1
+            yield record
+
+    stream = gzip.GzipFile(fileobj=output, mode="wb", compresslevel=6, mtime=0) if compress else output
+    try:
+        pending, pending_size = [], 0
+        for chunk in encode(counted(iter_poll_records(db, poll_id))):
+            pending.append(chunk)
+            pending_size += len(chunk)
+            if pending_size >= WRITE_SIZE:
+                stream.write("".join(pending).encode("utf-8"))
+                pending, pending_size = [], 0
+        stream.write("".join(pending).encode("utf-8"))
+    finally:
+        if compress:
+            stream.close()
+    return count
+
+
+def export_filename(poll_id: str, fmt: str, compress: bool = True) -> str:
+    return "poll-%s.%s%s" % (poll_id, fmt, ".gz" if compress else "")
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Export a poll's options and votes")
+    parser.add_argument("poll_id")
+    parser.add_argument("--db", default=os.getenv("POLLS_DB"), help="SQLite database (default: $POLLS_DB)")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--output", help="file to write (default: stdout)")
+    parser.add_argument("--gzip", action="store_true", help="compress the output")
+    args = parser.parse_args()
+    if not args.db:
+        parser.error("no database: pass --db or set POLLS_DB")
+
+    setup_logging()
+    # Before opening --output, so an unknown poll leaves an existing file alone
+    if not poll_exists(args.db, args.poll_id):
+        sys.exit("Poll %s not found" % args.poll_id)
+    if args.output:
+        with open(args.output, "wb") as output:
+            export_poll(args.db, args.poll_id, output, args.format, args.gzip)
+    else:
+        export_poll(args.db, args.poll_id, sys.stdout.buffer, args.format, args.gzip)
+
+
+if __name__ == "__main__":
+    main()
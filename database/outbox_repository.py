@@ -0,0 +1,129 @@
+import json
+import sqlite3
+import time
+import logging
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+# Outbox row lifecycle: pending -> in_flight -> done | failed.
+# A claimed row is in_flight until next_attempt_at (its lease); a dispatcher
+# that crashed mid-call leaves it to be claimed again once the lease expires.
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+
+@dataclass
+class OutboxAction:
+    """A Telegram side effect to perform once the surrounding transaction commits."""
+    idempotency_key: str
+    aggregate_id: str
+    action: str
+    payload: dict = field(default_factory=dict)
+
+
+@dataclass
+class OutboxEntry:
+    id: int
+    idempotency_key: str
+    aggregate_id: str
+    action: str
+    payload: dict
+    attempts: int
+
+
+def insert_actions(cursor: sqlite3.Cursor, actions: list[OutboxAction]) -> None:
+    """
+    Queue actions using the caller's cursor, so they commit or roll back
+    together with the caller's state change. A key that was already queued
+    is ignored.
+    """
+    now = time.time()
+    cursor.executemany("""
+        INSERT OR IGNORE INTO outbox (idempotency_key, aggregate_id, action, payload, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, [(a.idempotency_key, a.aggregate_id, a.action, json.dumps(a.payload), now) for a in actions])
+
+
+class OutboxRepository:
+    def __init__(self, db):
+        self.db = db
+
+    def claim_batch(self, limit: int, lease: float) -> list[OutboxEntry]:
+        """
+        Claim up to `limit` ready entries. Only the oldest unfinished entry of
+        each aggregate is ready, so actions for one poll run in order.
+        """
+        now = time.time()
+        with sqlite3.connect(self.db) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE outbox
+                SET status = ?, next_attempt_at = ?, attempts = attempts + 1
+                WHERE id IN (
+                    SELECT o.id FROM outbox o
+                    WHERE o.status IN (?, ?) AND o.next_attempt_at <= ?
+                    AND NOT EXISTS (
+                        SELECT 1 FROM outbox earlier
+                        WHERE earlier.aggregate_id = o.aggregate_id
+                        AND earlier.id < o.id
+                        AND earlier.status IN (?, ?)
+                    )
+                    ORDER BY o.id
+                    LIMIT ?
+                )
+                AND status IN (?, ?)
+                RETURNING id, idempotency_key, aggregate_id, action, payload, attempts
+            """, (IN_FLIGHT, now + lease, PENDING, IN_FLIGHT, now, PENDING, IN_FLIGHT, limit,
+                  PENDING, IN_FLIGHT))
+            rows = cursor.fetchall()
+            conn.commit()
+        return sorted(
+            (OutboxEntry(row[0], row[1], row[2], row[3], json.loads(row[4]), row[5]) for row in rows),
+            key=lambda entry: entry.id)
+
+    def mark_done(self, entry_id: int) -> None:
+        with sqlite3.connect(self.db) as conn:
+            conn.execute("UPDATE outbox SET status = ?, last_error = NULL WHERE id = ?", (DONE, entry_id))
+            conn.commit()
+
+    def mark_retry(self, entry_id: int, error: str, next_attempt_at: float, count_attempt: bool = True) -> None:
+        """
+        Make the entry ready again at `next_attempt_at`. Without `count_attempt`
+        the claim that led here is not counted, as for flood control waits.
+        """
+        with sqlite3.connect(self.db) as conn:
+            conn.execute("UPDATE outbox SET status = ?, last_error = ?, next_attempt_at = ?, "
+                         "attempts = attempts - ? WHERE id = ?",
+                         (PENDING, error, next_attempt_at, 0 if count_attempt else 1, entry_id))
+            conn.commit()
+
+    def update_payload(self, entry_id: int, payload: dict) -> None:
+        """Keep results of a partly done action for its next attempt."""
+        with sqlite3.connect(self.db) as conn:
+            conn.execute("UPDATE outbox SET payload = ? WHERE id = ?", (json.dumps(payload), entry_id))
+            conn.commit()
+
+    def mark_failed(self, entry_id: int, error: str) -> None:
+        with sqlite3.connect(self.db) as conn:
+            conn.execute("UPDATE outbox SET status = ?, last_error = ? WHERE id = ?",
+                         (FAILED, error, entry_id))
+            conn.commit()
+
+    def count_unfinished(self) -> int:
+        with sqlite3.connect(self.db) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM outbox WHERE status IN (?, ?)", (PENDING, IN_FLIGHT))
+            return cursor.fetchone()[0]
+
+    def purge_done(self, older_than: float) -> int:
+        """Delete finished entries created before `older_than` (a unix timestamp)."""
+        with sqlite3.connect(self.db) as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM outbox WHERE status = ? AND created_at < ?", (DONE, older_than))
+            conn.commit()
+            if cursor.rowcount:
+                logger.info("Purged %s finished outbox entries", cursor.rowcount)
+            return cursor.rowcount
@@ -1,22 +1,19 @@
 import sqlite3
 import logging
-import os
-from dotenv import load_dotenv
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 
-load_dotenv()
+def _add_column_if_missing(cursor, table: str, column: str, definition: str):
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        logger.info("Added column %s.%s", table, column)
 
-polls_db = os.getenv("POLLS_DB")
 
-
-def setup_database():
-    with sqlite3.connect(polls_db) as conn:
+def setup_database(db: str):
+    """Create or migrate the schema; idempotent. Called by main while the bot starts, never on import."""
+    with sqlite3.connect(db) as conn:
         cursor = conn.cursor()
 
         try:
@@ -33,9 +30,12 @@ def setup_database():
                 question TEXT NOT NULL,
                 expiration_date DATETIME,
                 voters_num INTEGER, 
-                closed BOOLEAN DEFAULT FALSE
+                closed BOOLEAN DEFAULT FALSE,
+                results_message_id INTEGER
             )
             """)
+            # Columns added after the first release
+            _add_column_if_missing(cursor, "polls", "results_message_id", "INTEGER")
 
             # Table for poll options
             cursor.execute("""
@@ -47,6 +47,10 @@ def setup_database():
                 FOREIGN KEY (poll_id) REFERENCES polls (poll_id) ON DELETE CASCADE
             )
             """)
+            # Options are always read per poll (and by the search index triggers)
+            cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_poll_options_poll ON poll_options (poll_id, id)
+            """)
 
             # Table for votes
             cursor.execute("""
@@ -55,15 +59,166 @@ def setup_database():
                 poll_id TEXT NOT NULL,
                 user_id INTEGER NOT NULL,
                 option_id INTEGER NOT NULL,
+                voted_at REAL,
                 FOREIGN KEY (poll_id) REFERENCES polls (poll_id) ON DELETE CASCADE,
                 FOREIGN KEY (option_id) REFERENCES poll_options (id) ON DELETE CASCADE
             )
             """)
+            _add_column_if_missing(cursor, "votes", "voted_at", "REAL")
+            # Votes are always looked up per poll (and per voter within a poll)
+            cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_votes_poll ON votes (poll_id, user_id)
+            """)
+
+            # Counts Telegram reported for anonymous polls, one row per update
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS poll_count_snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                poll_id TEXT NOT NULL,
+                taken_at REAL NOT NULL,
+                total_voters INTEGER NOT NULL,
+                counts TEXT NOT NULL
+            )
+            """)
+            cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_poll_count_snapshots_poll ON poll_count_snapshots (poll_id, taken_at)
+            """)
+
+            # Voting activity per poll and time bucket (bucket = unix time of its start),
+            # maintained by timeline_repository.record_vote_activity with every vote
+            for resolution in ("minute", "hour"):
+                cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS vote_rollup_{resolution} (
+                    poll_id TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    chat_id INTEGER,
+                    votes INTEGER NOT NULL DEFAULT 0,
+                    retracted INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (poll_id, bucket)
+                )
+                """)
+                cursor.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_vote_rollup_{resolution}_chat ON vote_rollup_{resolution} (chat_id, bucket)
+                """)
+
+            # Participation rollups (database.analytics), written with the poll or vote
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS chat_stats (
+                chat_id INTEGER PRIMARY KEY,
+                polls_created INTEGER NOT NULL DEFAULT 0,
+                polls_closed INTEGER NOT NULL DEFAULT 0,
+                votes INTEGER NOT NULL DEFAULT 0,
+                first_poll_at REAL,
+                last_poll_at REAL
+            )
+            """)
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS chat_weekly_stats (
+                chat_id INTEGER NOT NULL,
+                week INTEGER NOT NULL,
+                polls_created INTEGER NOT NULL DEFAULT 0,
+                votes INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (chat_id, week)
+            )
+            """)
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS chat_voter_stats (
+                chat_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                votes INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (chat_id, user_id)
+            )
+            """)
+            cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_chat_voter_stats_top ON chat_voter_stats (chat_id, votes DESC)
+            """)
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_stats (
+                user_id INTEGER PRIMARY KEY,
+                polls_created INTEGER NOT NULL DEFAULT 0,
+                votes_cast INTEGER NOT NULL DEFAULT 0
+            )
+            """)
+
+            # Outbox of Telegram side effects, written in the same transaction
+            # as the state change they belong to and drained by OutboxDispatcher
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                aggregate_id TEXT NOT NULL,
+                action TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL
+            )
+            """)
+            cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_outbox_ready ON outbox (status, next_attempt_at)
+            """)
+            cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_outbox_aggregate ON outbox (aggregate_id, id)
+            """)
 
             conn.commit()
         except sqlite3.DatabaseError as e:
             logger.error("Database initialization error: %s", e)
 
+        _setup_search_index(cursor)
+        conn.commit()
+
+
+def _setup_search_index(cursor):
+    """
+    FTS5 index of poll questions and options, kept in sync by triggers.
+    Rows share the rowid of their poll; `owner` holds the token u<user_id>
+    so a search is restricted to one user's polls inside the index itself.
+    Polls created before the index existed are added by database.search_index.
+    """
+    try:
+        cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS polls_fts USING fts5(
+            poll_id UNINDEXED,
+            owner,
+            question,
+            options,
+            tokenize = 'unicode61 remove_diacritics 2',
+            -- Short prefixes are what inline queries send while the user types
+            prefix = '2 3'
+        )
+        """)
+    except sqlite3.OperationalError as e:
+        logger.warning("Poll search is disabled, SQLite has no FTS5: %s", e)
+        return
+
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS polls_fts_insert AFTER INSERT ON polls BEGIN
+        INSERT INTO polls_fts (rowid, poll_id, owner, question, options)
+        VALUES (new.rowid, new.poll_id, 'u' || new.user_id, new.question, '');
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS polls_fts_update AFTER UPDATE OF user_id, question ON polls BEGIN
+        UPDATE polls_fts SET owner = 'u' || new.user_id, question = new.question
+        WHERE rowid = new.rowid;
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS polls_fts_delete AFTER DELETE ON polls BEGIN
+        DELETE FROM polls_fts WHERE rowid = old.rowid;
+    END
+    """)
+    # Options arrive one row at a time after their poll; the whole list is re-read
+    for event, row in (("INSERT", "new"), ("DELETE", "old")):
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS poll_options_fts_{event.lower()} AFTER {event} ON poll_options BEGIN
+            UPDATE polls_fts SET options = (
+                SELECT coalesce(group_concat(option_text, ' '), '') FROM poll_options WHERE poll_id = {row}.poll_id
+            )
+            WHERE rowid = (SELECT rowid FROM polls WHERE poll_id = {row}.poll_id);
+        END
+        """)
 
-# Run this once when setting up
-setup_database()
@@ -1,21 +1,38 @@
 import sqlite3
+import time
 from models.poll import Poll
+from database.analytics import record_poll_closed, record_poll_created, record_votes
+from database.outbox_repository import OutboxAction, insert_actions
+from database.profiler import ProfilingConnection, SqlProfiler
+from database.search_index import match_expression
+from database.timeline_repository import insert_count_snapshot, record_vote_activity
+from utils.logging_setup import POLL_UPDATE, VOTE
+from utils.metrics import registry
+from utils.tracing import traced
 import logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
-# set higher logging level for httpx to avoid all GET and POST requests being logged
-logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
+query_latency = registry.latency(
+    "poll_repository_query", "PollRepository call latency by method", "query",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+
 
 class PollRepository:
-    def __init__(self, db):
+    def __init__(self, db, profiler: SqlProfiler = None):
         self.db = db
+        self.profiler = profiler
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.profiler is None:
+            return sqlite3.connect(self.db)
+        conn = sqlite3.connect(self.db, factory=ProfilingConnection)
+        conn.profiler = self.profiler
+        return conn
 
+    @query_latency.timed
+    @traced("db")
     def create_poll(self, poll: Poll, user_id: int, chat_id: int, message_id: int = None):
-        with sqlite3.connect(self.db) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
 
             try:
@@ -29,6 +46,7 @@ class PollRepository:
                 for option in poll.options:
                     cursor.execute(
                         "INSERT INTO poll_options (poll_id, option_text) VALUES (?, ?)", (poll.id, option))
+                record_poll_created(cursor, chat_id, user_id)
                 conn.commit()
                 logger.info(
                     "Inserted the poll %s and its options into the db", poll.id)
@@ -43,22 +61,25 @@ class PollRepository:
                 logger.error("Unexpected error while inserting poll: %s", e)
                 conn.rollback()
 
+    @query_latency.timed
+    @traced("db")
     def record_poll_answer(self, poll: Poll, user_id: int, selected_options: list[int], is_closed: False):
-        with sqlite3.connect(self.db) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             try:
+                voted_at = time.time()
                 for selected_option in selected_options:
                     selected_option = poll.options[selected_option]
                     logger.info("poll_id: %s, selected_option: %s, user.id: %s",
-                                poll.id, selected_option, user_id)
+                                poll.id, selected_option, user_id, extra=VOTE)
                     # Find the option ID
                     cursor.execute(
                         "SELECT id FROM poll_options WHERE poll_id = ? AND option_text = ?", (poll.id, selected_option))
                     option_id = cursor.fetchone()
-                    logger.info("option_id: %s", option_id[0])
+                    logger.info("option_id: %s", option_id[0], extra=VOTE)
                     # Update votes
-                    cursor.execute("""INSERT INTO votes (poll_id, user_id, option_id)
-                    VALUES (?, ?, ?);""", (poll.id, user_id, option_id[0]))
+                    cursor.execute("""INSERT INTO votes (poll_id, user_id, option_id, voted_at)
+                    VALUES (?, ?, ?, ?);""", (poll.id, user_id, option_id[0], voted_at))
                 # Update poll
                 cursor.execute("""
                     UPDATE polls
@@ -66,8 +87,10 @@ class PollRepository:
                         closed = ?
                     WHERE poll_id = ?;
                 """, (is_closed, poll.id))
+                record_vote_activity(cursor, poll.id, voted_at, votes=1)
+                record_votes(cursor, poll.id, 1, user_id, voted_at)
                 conn.commit()
-                logger.info("Updated the database row for poll %s", poll.id)
+                logger.info("Updated the database row for poll %s", poll.id, extra=VOTE)
             except sqlite3.IntegrityError as e:
                 logger.error(
                     "Database integrity error while updating poll: %s", e)
@@ -79,13 +102,16 @@ class PollRepository:
                 logger.error("Unexpected error while updating poll: %s", e)
                 conn.rollback()
 
-    def update_anonymous_poll_counts(self, poll_id: str, vote_counts: dict[int, int], total_voter_count: int = None):
+    @query_latency.timed
+    @traced("db")
+    def update_anonymous_poll_counts(self, poll_id: str, vote_counts: dict[int, int], total_voter_count: int = None) -> bool:
         """
         Update vote counts for anonymous polls.
         vote_counts: {option_index: vote_count}
         total_voter_count: unique voters (from Telegram's poll.total_voter_count)
+        Returns False when the update was rolled back.
         """
-        with sqlite3.connect(self.db) as conn:
+        with self._connect() as conn:
             try:
                 cursor = conn.cursor()
 
@@ -98,6 +124,10 @@ class PollRepository:
                 """, (poll_id,))
                 options = cursor.fetchall()
 
+                cursor.execute("SELECT voters_num FROM polls WHERE poll_id = ?", (poll_id,))
+                row = cursor.fetchone()
+                previous_voters = (row[0] or 0) if row else 0
+
                 # Update vote_count for each option
                 for i, (option_id, option_text) in enumerate(options):
                     if i in vote_counts:
@@ -115,15 +145,26 @@ class PollRepository:
                         WHERE poll_id = ?
                     """, (total_voter_count, poll_id))
 
+                    # Telegram only reports totals; the change since the last update is the activity
+                    change = total_voter_count - previous_voters
+                    record_vote_activity(cursor, poll_id, votes=max(change, 0), retracted=max(-change, 0))
+                    record_votes(cursor, poll_id, change)
+                insert_count_snapshot(cursor, poll_id, vote_counts, total_voter_count or 0)
+
                 conn.commit()
                 logger.info(
-                    "Updated vote counts for anonymous poll %s (voters: %s)", poll_id, total_voter_count)
+                    "Updated vote counts for anonymous poll %s (voters: %s)", poll_id, total_voter_count,
+                    extra=POLL_UPDATE)
+                return True
             except Exception as e:
                 logger.error("Error updating anonymous poll counts: %s", e)
                 conn.rollback()
+                return False
 
+    @query_latency.timed
+    @traced("db")
     def remove_vote(self, poll_id: str, user_id: int):
-        with sqlite3.connect(self.db) as conn:
+        with self._connect() as conn:
             try:
                 cursor = conn.cursor()
                 # Count how many votes the user had
@@ -136,6 +177,9 @@ class PollRepository:
                 # Decrement the voters_num by the number of votes removed
                 cursor.execute(
                     "UPDATE polls SET voters_num = voters_num - ? WHERE poll_id = ?", (num_votes, poll_id))
+                if num_votes:
+                    record_vote_activity(cursor, poll_id, retracted=1)
+                    record_votes(cursor, poll_id, -1, user_id)
                 conn.commit()
             except sqlite3.IntegrityError as e:
                 logger.error(
@@ -148,9 +192,11 @@ class PollRepository:
                 logger.error("Unexpected error while updating poll: %s", e)
                 conn.rollback()
 
+    @query_latency.timed
+    @traced("db")
     def get_poll_by_id(self, poll_id: str) -> Poll:
         """Fetch a single poll from the database by its ID."""
-        with sqlite3.connect(self.db) as conn:
+        with self._connect() as conn:
             try:
                 cursor = conn.cursor()
                 cursor.execute(
@@ -172,14 +218,17 @@ class PollRepository:
                     voters_num=row[9],
                     closed=bool(row[10]),
                     message_id=row[3],
-                    chat_id=row[2]
+                    chat_id=row[2],
+                    results_message_id=row[11]
                 )
 
                 # Fetch options
                 cursor.execute(
-                    "SELECT option_text FROM poll_options WHERE poll_id = ?", (poll.id,))
-                options = [opt_row[0] for opt_row in cursor.fetchall()]
-                poll.options = options
+                    "SELECT id, option_text FROM poll_options WHERE poll_id = ? ORDER BY id", (poll.id,))
+                option_rows = cursor.fetchall()
+                poll.options = [opt_row[1] for opt_row in option_rows]
+                # Votes store option row ids; the Poll model counts by option index
+                option_index = {opt_row[0]: i for i, opt_row in enumerate(option_rows)}
 
                 # Fetch votes
                 cursor.execute(
@@ -189,7 +238,7 @@ class PollRepository:
                     voter_id, option_id = vote_row
                     if voter_id not in votes:
                         votes[voter_id] = []
-                    votes[voter_id].append(option_id)
+                    votes[voter_id].append(option_index.get(option_id, option_id))
                 poll.votes = votes
 
                 return poll
@@ -198,8 +247,10 @@ class PollRepository:
                     "Couldn't retrieve poll %s from database: %s", poll_id, e)
                 return None
 
+    @query_latency.timed
+    @traced("db")
     def get_polls_by_user(self, user_id: str) -> list[Poll]:
-        with sqlite3.connect(self.db) as conn:
+        with self._connect() as conn:
             try:
                 cursor = conn.cursor()
                 cursor.execute(
@@ -217,13 +268,15 @@ class PollRepository:
                     voters_num=row[9],
                     closed=bool(row[10]),
                     message_id=row[3],
-                    chat_id=row[2]
+                    chat_id=row[2],
+                    results_message_id=row[11]
                     )
                     # Fetch options
                     cursor.execute(
-                        "SELECT option_text FROM poll_options WHERE poll_id = ?", (poll.id,))
-                    options = [opt_row[0] for opt_row in cursor.fetchall()]
-                    poll.options = options
+                        "SELECT id, option_text FROM poll_options WHERE poll_id = ? ORDER BY id", (poll.id,))
+                    option_rows = cursor.fetchall()
+                    poll.options = [opt_row[1] for opt_row in option_rows]
+                    option_index = {opt_row[0]: i for i, opt_row in enumerate(option_rows)}
 
                     # Fetch votes
                     cursor.execute(
@@ -233,7 +286,7 @@ class PollRepository:
                         voter_id, option_id = vote_row
                         if voter_id not in votes:
                             votes[voter_id] = []
-                        votes[voter_id].append(option_id)
+                        votes[voter_id].append(option_index.get(option_id, option_id))
                     poll.votes = votes
 
                     polls.append(poll)
@@ -242,21 +295,95 @@ class PollRepository:
                 logger.error("Couldn't retrieve polls data: %s", e)
                 return []
 
+    @query_latency.timed
+    @traced("db")
+    def search_polls(self, user_id: int, text: str, limit: int = 20, offset: int = 0) -> list[Poll]:
+        """
+        Polls of `user_id` whose question or options match `text`, newest
+        first. Returned polls carry options but no votes.
+        """
+        expression = match_expression(user_id, text)
+        if expression is None:
+            return []
+        with self._connect() as conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT p.poll_id, p.anonimity, p.forwarding, p."limit", p.question,
+                           p.voters_num, p.closed, p.chat_id
+                    FROM polls_fts
+                    JOIN polls p ON p.rowid = polls_fts.rowid
+                    WHERE polls_fts MATCH ?
+                    ORDER BY polls_fts.rowid DESC
+                    LIMIT ? OFFSET ?
+                """, (expression, limit, offset))
+                polls = [
+                    Poll(id=row[0], anonimity=bool(row[1]), forwarding=bool(row[2]), limit=row[3],
+                         question=row[4], voters_num=row[5], closed=bool(row[6]), chat_id=row[7])
+                    for row in cursor.fetchall()
+                ]
+                if not polls:
+                    return []
+
+                by_id = {poll.id: poll for poll in polls}
+                cursor.execute(
+                    "SELECT poll_id, option_text FROM poll_options WHERE poll_id IN (%s) ORDER BY id"
+                    % ",".join("?" * len(by_id)), list(by_id))
+                for poll_id, option_text in cursor.fetchall():
+                    by_id[poll_id].options.append(option_text)
+                return polls
+            except sqlite3.DatabaseError as e:
+                logger.error("Poll search failed for user %s: %s", user_id, e)
+                return []
+
+    @query_latency.timed
+    @traced("db")
+    def count_open_polls(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM polls WHERE NOT closed").fetchone()[0]
+
+    @query_latency.timed
+    @traced("db")
+    def get_poll_owner(self, poll_id: str) -> int:
+        """The user who created the poll, or None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT user_id FROM polls WHERE poll_id = ?", (poll_id,)).fetchone()
+            return row[0] if row else None
+
+    @query_latency.timed
+    @traced("db")
+    def set_results_message_id(self, poll_id: str, results_message_id: int) -> None:
+        """Remember the live results message posted for a poll."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE polls SET results_message_id = ? WHERE poll_id = ?", (results_message_id, poll_id))
+            conn.commit()
+
     def get_active_polls(self) -> list[Poll]:
         pass
 
-    def close_poll(self, poll_id: str) -> None:
-        with sqlite3.connect(self.db) as conn:
+    @query_latency.timed
+    @traced("db")
+    def close_poll(self, poll_id: str, outbox_actions: list[OutboxAction] = ()) -> None:
+        """Marks a poll closed and queues its Telegram side effects in the same transaction."""
+        with self._connect() as conn:
             cursor = conn.cursor()
             # Try with explicit tuple creation
             cursor.execute(
-                "UPDATE polls SET closed = 1 WHERE poll_id = ?", (poll_id,))
+                "UPDATE polls SET closed = 1 WHERE poll_id = ? AND NOT closed", (poll_id,))
+            # Closing twice must not count twice
+            if cursor.rowcount:
+                record_poll_closed(cursor, poll_id)
+            insert_actions(cursor, outbox_actions)
             conn.commit()
 
+    @query_latency.timed
+    @traced("db")
     def delete_poll(self, poll_id: str) -> None:
         """Deletes a poll and all related data (cascade delete)"""
         # TODO: add cascade delete for poll_options and votes
-        with sqlite3.connect(self.db) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
 
             try:
@@ -270,9 +397,11 @@ class PollRepository:
                 conn.rollback()
                 raise
 
+    @query_latency.timed
+    @traced("db")
     def get_poll_results(self, poll_id: str) -> dict:
         """Get vote counts per option for a poll."""
-        with sqlite3.connect(self.db) as conn:
+        with self._connect() as conn:
             try:
                 cursor = conn.cursor()
 
@@ -316,9 +445,37 @@ class PollRepository:
                     "Error getting poll results for %s: %s", poll_id, e)
                 return {}
 
+    @query_latency.timed
+    @traced("db")
+    def get_poll_with_counts(self, poll_id: str) -> tuple[Poll, list[int]]:
+        """
+        A poll without its votes, and the vote count of each option in order,
+        read with one grouped query. Returns (None, []) for unknown polls.
+        """
+        with self._connect() as conn:
+            row = conn.execute("""
+                SELECT poll_id, chat_id, anonimity, question, voters_num, closed
+                FROM polls WHERE poll_id = ?
+            """, (poll_id,)).fetchone()
+            if not row:
+                return None, []
+            poll = Poll(id=row[0], chat_id=row[1], anonimity=bool(row[2]), question=row[3],
+                        voters_num=row[4] or 0, closed=bool(row[5]))
+            options = conn.execute(
+                "SELECT id, option_text, vote_count FROM poll_options WHERE poll_id = ? ORDER BY id",
+                (poll_id,)).fetchall()
+            poll.options = [option_text for _, option_text, _ in options]
+            if poll.anonimity:
+                return poll, [vote_count or 0 for _, _, vote_count in options]
+            votes = dict(conn.execute(
+                "SELECT option_id, COUNT(*) FROM votes WHERE poll_id = ? GROUP BY option_id", (poll_id,)))
+            return poll, [votes.get(option_id, 0) for option_id, _, _ in options]
+
+    @query_latency.timed
+    @traced("db")
     def get_poll_statistics(self, poll_id: str) -> dict:
         """Get detailed statistics for a poll."""
-        with sqlite3.connect(self.db) as conn:
+        with self._connect() as conn:
             try:
                 cursor = conn.cursor()
 
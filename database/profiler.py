@@ -0,0 +1,156 @@
+"""
+SQL statement profiler for PollRepository connections.
+
+PollRepository._connect() opens a ProfilingConnection when a profiler is
+configured. Every statement executed through it (including those run by
+the record_* helpers on its cursors) is timed under its normalized text.
+The first time a statement runs slower than `slow_ms`, its EXPLAIN QUERY
+PLAN is captured with the same parameters, and plan steps that scan a
+whole table or index are flagged.
+
+Timings cover execute(), i.e. SQLite's work up to the first row. Aggregates
+and writes do all their work there; for long result sets the fetch is not
+included.
+
+    SQL_PROFILE           enable the profiler (off)
+    SQL_PROFILE_SLOW_MS   slow statement threshold (20)
+    SQL_PROFILE_FILE      JSON report written at shutdown
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from dataclasses import dataclass, field
+
+from utils.metrics import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+STATEMENT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class SlowStatement:
+    statement: str
+    seconds: float
+    plan: list[str] = field(default_factory=list)
+
+    @property
+    def scans(self) -> list[str]:
+        """
+        Plan steps reading a whole table or index. SCAN CONSTANT ROW reads
+        nothing, and a virtual table (FTS) scan is a lookup in its own index.
+        """
+        return [step for step in self.plan
+                if step.startswith("SCAN") and step != "SCAN CONSTANT ROW" and "VIRTUAL TABLE" not in step]
+
+
+class SqlProfiler:
+    def __init__(self, slow_ms: float = 20):
+        self.slow = slow_ms / 1000
+        self.latency = LatencyTracker(STATEMENT_BUCKETS)
+        self.slow_statements: dict[str, SlowStatement] = {}
+        self._normalized: dict[str, str] = {}
+
+    def normalize(self, sql: str) -> str:
+        statement = self._normalized.get(sql)
+        if statement is None:
+            statement = self._normalized[sql] = _WHITESPACE.sub(" ", sql).strip().rstrip(";")
+        return statement
+
+    def observe(self, cursor: sqlite3.Cursor, sql: str, parameters, seconds: float, error: bool) -> None:
+        statement = self.normalize(sql)
+        self.latency.observe(statement, seconds, error)
+        if seconds < self.slow:
+            return
+        slow = self.slow_statements.get(statement)
+        if slow is None:
+            slow = self.slow_statements[statement] = SlowStatement(statement, seconds, self._explain(cursor, sql, parameters))
+            logger.warning("Slow SQL (%.1fms)%s: %s", seconds * 1000,
+                           " with full scan [%s]" % "; ".join(slow.scans) if slow.scans else "", statement)
+        slow.seconds = max(slow.seconds, seconds)
+
+    @staticmethod
+    def _explain(cursor: sqlite3.Cursor, sql: str, parameters) -> list[str]:
+        try:
+            # A plain cursor, so the EXPLAIN itself is not profiled
+            rows = sqlite3.Cursor(cursor.connection).execute("EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+        except sqlite3.Error as e:
+            return ["(no plan: %s)" % e]
+        return [row[3] for row in rows]
+
+    def report(self) -> list[dict]:
+        """Per-statement stats, most total time first."""
+        rows = []
+        for statement, histogram in self.latency.histograms.items():
+            summary = histogram.summary()
+            slow = self.slow_statements.get(statement)
+            rows.append({
+                "statement": statement,
+                "calls": summary["count"],
+                "errors": self.latency.errors.get(statement, 0),
+                "total_ms": histogram.sum * 1000,
+                "avg_ms": summary["avg"] * 1000,
+                "p50_ms": summary["p50"] * 1000,
+                "p95_ms": summary["p95"] * 1000,
+                "p99_ms": summary["p99"] * 1000,
+                "max_ms": summary["max"] * 1000,
+                "plan": slow.plan if slow else None,
+                "full_scans": slow.scans if slow else [],
+            })
+        rows.sort(key=lambda row: -row["total_ms"])
+        return rows
+
+    def dump(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as output:
+            json.dump({"slow_ms": self.slow * 1000, "statements": self.report()}, output, indent=2, ensure_ascii=False)
+        logger.info("SQL profile written to %s", path)
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        error = True
+        try:
+            result = super().execute(sql, parameters)
+            error = False
+            return result
+        finally:
+            self.connection.profiler.observe(self, sql, parameters, time.perf_counter() - started, error)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        error = True
+        try:
+            result = super().executemany(sql, seq_of_parameters)
+            error = False
+            return result
+        finally:
+            # A plan needs one set of parameters; executemany is never explained
+            self.connection.profiler.latency.observe(
+                self.connection.profiler.normalize(sql), time.perf_counter() - started, error)
+
+
+class ProfilingConnection(sqlite3.Connection):
+    """Connection whose cursors report to `profiler`; pass as sqlite3.connect(factory=...)."""
+    profiler: SqlProfiler = None
+
+    def cursor(self, factory=ProfilingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def profiler_from_env():
+    """Return a SqlProfiler if SQL_PROFILE is enabled, else None."""
+    if os.getenv("SQL_PROFILE", "").strip().lower() not in ("1", "true", "yes", "on"):
+        return None
+    return SqlProfiler(slow_ms=float(os.getenv("SQL_PROFILE_SLOW_MS", "20")))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Maintenance of the polls_fts full-text index.
+
+The index is kept current by triggers (see poll_db.setup_database); this
+command adds polls created before the index existed and drops entries whose
+poll is gone, in batches, without touching rows that are already indexed.
+
+    python -m database.search_index            # incremental
+    python -m database.search_index --full     # drop and rebuild everything
+"""
+import argparse
+import logging
+import os
+import re
+import sqlite3
+import time
+
+from dotenv import load_dotenv
+
+from database.poll_db import setup_database
+from utils.logging_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+WORD = re.compile(r"\w+", re.UNICODE)
+MAX_TERMS = 8
+
+
+def match_expression(user_id: int, text: str) -> str:
+    """
+    FTS5 query for `text` among the polls of `user_id`: every word must match
+    the question or an option, the last one as a prefix (the user is still
+    typing). Returns None when `text` has no searchable words.
+    """
+    words = WORD.findall(text.lower())[:MAX_TERMS]
+    if not words:
+        return None
+    # Only \w characters reach the query, so quoting cannot be broken out of
+    terms = ['"%s"' % word for word in words[:-1]] + ['"%s"*' % words[-1]]
+    return 'owner : "u%d" AND {question options} : (%s)' % (user_id, " AND ".join(terms))
+
+
+def sync(db: str, full: bool = False, batch_size: int = 5000) -> dict:
+    """Bring polls_fts in line with polls; returns counts of the work done."""
+    setup_database(db)
+    with sqlite3.connect(db) as conn:
+        cursor = conn.cursor()
+        if full:
+            cursor.execute("DELETE FROM polls_fts")
+
+        cursor.execute("""
+            DELETE FROM polls_fts WHERE rowid NOT IN (SELECT rowid FROM polls)
+        """)
+        removed = cursor.rowcount
+
+        added = 0
+        last_rowid = 0
+        while True:
+            cursor.execute("""
+                SELECT p.rowid, p.poll_id, p.user_id, p.question,
+                       coalesce((SELECT group_concat(option_text, ' ') FROM poll_options o
+                                 WHERE o.poll_id = p.poll_id), '')
+                FROM polls p
+                WHERE p.rowid > ? AND p.rowid NOT IN (SELECT rowid FROM polls_fts)
+                ORDER BY p.rowid
+                LIMIT ?
+            """, (last_rowid, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            cursor.executemany("""
+                INSERT INTO polls_fts (rowid, poll_id, owner, question, options)
+                VALUES (?, ?, 'u' || ?, ?, ?)
+            """, rows)
+            conn.commit()
+            added += len(rows)
+            last_rowid = rows[-1][0]
+
+        # Merge the b-tree segments written by the batches
+        cursor.execute("INSERT INTO polls_fts (polls_fts) VALUES ('optimize')")
+        conn.commit()
+    return {"added": added, "removed": removed}
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Update the poll search index")
+    parser.add_argument("--db", default=os.getenv("POLLS_DB"), help="SQLite database (default: $POLLS_DB)")
+    parser.add_argument("--full", action="store_true", help="rebuild the index from scratch")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    if not args.db:
+        parser.error("no database: pass --db or set POLLS_DB")
+
+    setup_logging()
+    started = time.perf_counter()
+    result = sync(args.db, full=args.full, batch_size=args.batch_size)
+    logger.info("Search index updated in %.2fs: %s polls added, %s removed",
+                time.perf_counter() - started, result["added"], result["removed"])
+
+
+if __name__ == "__main__":
+    main()
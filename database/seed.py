@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Fill a polls database with realistic synthetic data, for benchmarks and staging.
+
+Polls are created over the last --days in group and private chats. Their
+popularity follows a Zipf law (--skew): a few polls get most of the
+answers, most get a handful, and a few active users cast most of them.
+Every poll allows several answers, as the bot sends them, though most
+voters pick one option. A share of the polls is anonymous (--anonymous),
+with only the option counts and count snapshots Telegram reports; polls
+past their expiration date are mostly closed, some close early or on their
+voter limit. The rollup and stats tables get what the bot would have
+written for the same votes, and the search index is updated at the end.
+
+    python -m database.seed --db staging.db --polls 100000 --answers 2000000
+    python -m database.seed --polls 10000 --answers 100000 --seed 7 --until 1760000000
+
+Rows are inserted with executemany, in one transaction per --batch-size
+polls, with the secondary indexes and search index triggers dropped;
+setup_database recreates them once the data is in, which is much faster
+than maintaining them row by row. Synchronous writes are off during the
+load, so seed a scratch or staging file, never a live database. The same
+--seed and --until give the same rows. Data is added to what the database
+holds; poll ids are "seed<seed>-<n>", so each seed loads once per file.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+from database.analytics import week_start
+from database.poll_db import setup_database
+from database.search_index import sync
+from database.timeline_repository import RESOLUTIONS
+from utils.logging_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 3600
+USER_BASE = 100_000_000
+CHAT_BASE = -1001000000000
+# Tables whose secondary indexes are dropped during the load; setup_database creates them all
+LOADED_TABLES = ("polls", "poll_options", "votes", "poll_count_snapshots",
+                 "vote_rollup_minute", "vote_rollup_hour", "chat_voter_stats")
+# The higher, the more the answers concentrate on a few active users
+ACTIVITY = 3.0
+PRIVATE_CHAT_SHARE = 0.2
+FORWARDING_SHARE = 0.85
+LIMITED_SHARE = 0.05
+LIMITS = (10, 25, 50, 100)
+CLOSED_EARLY_SHARE = 0.1
+CLOSED_WHEN_EXPIRED_SHARE = 0.9
+OPTION_COUNTS = (2, 3, 4, 5, 6, 8, 10)
+OPTION_COUNT_WEIGHTS = (30, 25, 20, 10, 7, 5, 3)
+# Options picked by one voter
+PICKS = (1, 2, 3)
+PICK_CUM_WEIGHTS = (75, 93, 100)
+DURATION_HOURS = (1, 24, 72, 168, 336)
+DURATION_WEIGHTS = (10, 25, 20, 35, 10)
+# Telegram batches poll updates of busy anonymous polls; at most this many snapshots per poll
+MAX_SNAPSHOTS = 20
+
+QUESTIONS = (
+    "Where should we go for {}?", "What time works best for {}?", "Which day for {}?",
+    "Should we move {} to next week?", "How do you rate {}?", "Who is in for {}?",
+    "What do we order for {}?", "How often do you want {}?",
+)
+TOPICS = (
+    "lunch", "the team offsite", "the retro", "movie night", "the board game evening", "the demo",
+    "coffee", "the release party", "football", "the book club", "the hiking trip", "the new office",
+    "the hackathon", "karaoke", "the weekly sync", "the summer holidays",
+)
+OPTIONS = (
+    "Yes", "No", "Maybe", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday",
+    "Sunday", "Pizza", "Sushi", "Burgers", "Salad", "Morning", "Afternoon", "Evening", "Online",
+    "In person", "Skip it", "Not sure", "Great", "Okay", "Bad",
+)
+
+
+def answer_counts(rng: random.Random, polls: int, answers: int, skew: float, cap: int) -> list[int]:
+    """Answers per poll, exactly `answers` in total and at most `cap` per poll.
+
+    Each poll gets its share of the total by Zipf weights over a random
+    popularity ranking, rounded by largest remainder; what the cap trims from
+    the most popular polls goes to the others by the same weights.
+    """
+    if answers > polls * cap:
+        raise ValueError("%d polls of at most %d voters cannot hold %d answers" % (polls, cap, answers))
+    ranks = list(range(1, polls + 1))
+    rng.shuffle(ranks)
+    weights = [rank ** -skew for rank in ranks]
+    counts = [0] * polls
+    remaining = answers
+    open_polls = range(polls)
+    while remaining:
+        scale = remaining / sum(weights[i] for i in open_polls)
+        remainders = []
+        for i in open_polls:
+            share = min(weights[i] * scale, cap - counts[i])
+            counts[i] += int(share)
+            remaining -= int(share)
+            remainders.append((share % 1, i))
+        remainders.sort(reverse=True)
+        for fraction, i in remainders[:remaining]:
+            if not fraction:
+                break
+            counts[i] += 1
+            remaining -= 1
+        open_polls = [i for i in open_polls if counts[i] < cap]
+    return counts
+
+
+class Seeder:
+    """Generates polls one at a time into row buffers, written by flush() in one transaction."""
+
+    def __init__(self, conn: sqlite3.Connection, seed: int, until: float, days: float, users: int,
+                 chats: int, anonymous: float):
+        self.conn = conn
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.until = until
+        self.days = days
+        self.users = users
+        self.chats = chats
+        self.anonymous = anonymous
+        self.next_option_id = conn.execute("SELECT coalesce(max(id), 0) + 1 FROM poll_options").fetchone()[0]
+        self.message_ids = Counter()
+        self.rows = {table: [] for table in LOADED_TABLES}
+        self.counts = Counter()
+        # chat_id: [polls_created, polls_closed, votes, first_poll_at, last_poll_at]
+        self.chat_stats = {}
+        self.weekly_stats = {}
+        self.polls_created = Counter()
+
+    def user(self) -> int:
+        return USER_BASE + int(self.users * self.rng.random() ** ACTIVITY)
+
+    def voters(self, n: int) -> list[int]:
+        """`n` distinct voters, active users first; n is at most half the users."""
+        chosen = set()
+        while len(chosen) < n:
+            chosen.add(self.user())
+        return sorted(chosen)
+
+    def chat(self, owner: int) -> int:
+        if self.rng.random() < PRIVATE_CHAT_SHARE:
+            return owner
+        return CHAT_BASE - int(self.chats * self.rng.random() ** 2)
+
+    def add_poll(self, n: int, answers: int) -> None:
+        rng = self.rng
+        poll_id = "seed%d-%d" % (self.seed, n)
+        owner = self.user()
+        chat_id = self.chat(owner)
+        anonymous = rng.random() < self.anonymous
+        created = self.until - self.days * DAY * rng.random()
+        expires = created + rng.choices(DURATION_HOURS, DURATION_WEIGHTS)[0] * 3600
+        expired = expires <= self.until
+        closed = rng.random() < (CLOSED_WHEN_EXPIRED_SHARE if expired else CLOSED_EARLY_SHARE)
+        ends = min(expires, self.until) if closed else self.until
+        if closed and not expired:
+            ends = created + (self.until - created) * rng.random()
+        limit = sys.maxsize
+        if rng.random() < LIMITED_SHARE:
+            limit = rng.choice(LIMITS)
+            if answers >= limit:
+                # The poll closed on its limit, at the voter that reached it
+                limit = answers
+                closed = True
+
+        self.message_ids[chat_id] += 1
+        # Naive, as the sqlite3 adapter writes the bot's datetimes, so the column keeps one text format
+        expiration_date = datetime.fromtimestamp(expires, tz=timezone.utc).replace(tzinfo=None)
+        self.rows["polls"].append((
+            poll_id, owner, chat_id, self.message_ids[chat_id], anonymous, rng.random() < FORWARDING_SHARE,
+            limit, rng.choice(QUESTIONS).format(rng.choice(TOPICS)),
+            expiration_date.isoformat(" "), answers, closed))
+
+        option_count = rng.choices(OPTION_COUNTS, OPTION_COUNT_WEIGHTS)[0]
+        option_ids = list(range(self.next_option_id, self.next_option_id + option_count))
+        self.next_option_id += option_count
+        texts = rng.sample(OPTIONS, option_count)
+        # Some options are much more popular than others (flat Dirichlet weights)
+        popularity = list(itertools.accumulate(rng.expovariate(1.0) for _ in range(option_count)))
+        option_indexes = range(option_count)
+        vote_counts = [0] * option_count
+
+        # Votes come in soon after the poll is sent and thin out until it ends
+        times = sorted(created + (ends - created) * rng.random() ** 2 for _ in range(answers))
+        snapshot_every = max(1, answers // MAX_SNAPSHOTS)
+        buckets = {resolution: Counter() for resolution in RESOLUTIONS}
+        for k, (voter, voted_at) in enumerate(zip(self.voters(answers), times)):
+            first = rng.choices(option_indexes, cum_weights=popularity)[0]
+            picks = min(rng.choices(PICKS, cum_weights=PICK_CUM_WEIGHTS)[0], option_count)
+            picked = [first]
+            if picks > 1:
+                picked += rng.sample([o for o in option_indexes if o != first], picks - 1)
+            if anonymous:
+                for option in picked:
+                    vote_counts[option] += 1
+                if (k + 1) % snapshot_every == 0 or k + 1 == answers:
+                    self.rows["poll_count_snapshots"].append(
+                        (poll_id, voted_at, k + 1, json.dumps(vote_counts)))
+            else:
+                self.rows["votes"].extend((poll_id, voter, option_ids[option], voted_at) for option in picked)
+            for resolution, width in RESOLUTIONS.items():
+                buckets[resolution][int(voted_at // width) * width] += 1
+
+        self.rows["poll_options"].extend(
+            (option_id, poll_id, text, vote_count if anonymous else 0)
+            for option_id, text, vote_count in zip(option_ids, texts, vote_counts))
+        for resolution, counts in buckets.items():
+            self.rows["vote_rollup_" + resolution].extend(
+                (poll_id, bucket, chat_id, votes) for bucket, votes in sorted(counts.items()))
+        # Weeks start on an hour boundary
+        for bucket, votes in buckets["hour"].items():
+            self.weekly(chat_id, bucket)[1] += votes
+
+        stats = self.chat_stats.setdefault(chat_id, [0, 0, 0, created, created])
+        stats[0] += 1
+        stats[1] += closed
+        stats[2] += answers
+        stats[3] = min(stats[3], created)
+        stats[4] = max(stats[4], created)
+        self.weekly(chat_id, created)[0] += 1
+        self.polls_created[owner] += 1
+        self.counts["polls"] += 1
+        self.counts["anonymous"] += anonymous
+        self.counts["closed"] += closed
+        self.counts["answers"] += answers
+
+    def weekly(self, chat_id: int, at: float) -> list[int]:
+        """[polls_created, votes] of the chat's week containing `at`."""
+        return self.weekly_stats.setdefault((chat_id, week_start(at)), [0, 0])
+
+    def flush(self) -> None:
+        rows = self.rows
+        cursor = self.conn.cursor()
+        cursor.executemany("""
+            INSERT INTO polls (poll_id, user_id, chat_id, message_id, anonimity, forwarding, "limit",
+                               question, expiration_date, voters_num, closed)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows["polls"])
+        cursor.executemany(
+            "INSERT INTO poll_options (id, poll_id, option_text, vote_count) VALUES (?, ?, ?, ?)",
+            rows["poll_options"])
+        cursor.executemany(
+            "INSERT INTO votes (poll_id, user_id, option_id, voted_at) VALUES (?, ?, ?, ?)", rows["votes"])
+        cursor.executemany("""
+            INSERT INTO poll_count_snapshots (poll_id, taken_at, total_voters, counts) VALUES (?, ?, ?, ?)
+        """, rows["poll_count_snapshots"])
+        for resolution in RESOLUTIONS:
+            cursor.executemany(f"""
+                INSERT INTO vote_rollup_{resolution} (poll_id, bucket, chat_id, votes) VALUES (?, ?, ?, ?)
+            """, rows["vote_rollup_" + resolution])
+        self.conn.commit()
+        self.counts["votes"] += len(rows["votes"])
+        for table_rows in rows.values():
+            table_rows.clear()
+
+    def finish(self) -> None:
+        """Add the participation rollups (database.analytics) of everything generated."""
+        cursor = self.conn.cursor()
+        cursor.executemany("""
+            INSERT INTO chat_stats (chat_id, polls_created, polls_closed, votes, first_poll_at, last_poll_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (chat_id) DO UPDATE SET
+                polls_created = polls_created + excluded.polls_created,
+                polls_closed = polls_closed + excluded.polls_closed,
+                votes = votes + excluded.votes,
+                first_poll_at = min(coalesce(first_poll_at, excluded.first_poll_at), excluded.first_poll_at),
+                last_poll_at = max(coalesce(last_poll_at, excluded.last_poll_at), excluded.last_poll_at)
+        """, ((chat_id, *stats) for chat_id, stats in self.chat_stats.items()))
+        cursor.executemany("""
+            INSERT INTO chat_weekly_stats (chat_id, week, polls_created, votes) VALUES (?, ?, ?, ?)
+            ON CONFLICT (chat_id, week) DO UPDATE SET
+                polls_created = polls_created + excluded.polls_created,
+                votes = votes + excluded.votes
+        """, ((chat_id, week, *stats) for (chat_id, week), stats in self.weekly_stats.items()))
+        cursor.executemany("""
+            INSERT INTO user_stats (user_id, polls_created) VALUES (?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET polls_created = polls_created + excluded.polls_created
+        """, self.polls_created.items())
+
+        # Per-voter rollups count answers, not vote rows; anonymous polls have none
+        pattern = "seed%d-*" % self.seed
+        cursor.execute("""
+            INSERT INTO chat_voter_stats (chat_id, user_id, votes)
+            SELECT p.chat_id, v.user_id, COUNT(DISTINCT v.poll_id)
+            FROM votes v JOIN polls p ON p.poll_id = v.poll_id
+            WHERE v.poll_id GLOB ?
+            GROUP BY p.chat_id, v.user_id
+            ON CONFLICT (chat_id, user_id) DO UPDATE SET votes = votes + excluded.votes
+        """, (pattern,))
+        cursor.execute("""
+            INSERT INTO user_stats (user_id, votes_cast)
+            SELECT user_id, COUNT(DISTINCT poll_id) FROM votes WHERE poll_id GLOB ? GROUP BY user_id
+            ON CONFLICT (user_id) DO UPDATE SET votes_cast = votes_cast + excluded.votes_cast
+        """, (pattern,))
+        self.conn.commit()
+
+
+def _drop_indexes_and_triggers(conn: sqlite3.Connection) -> list[str]:
+    """Drop what slows a bulk load down; setup_database puts it all back."""
+    dropped = []
+    rows = conn.execute("""
+        SELECT type, name FROM sqlite_master
+        WHERE (type = 'index' AND sql IS NOT NULL AND tbl_name IN (%s))
+           OR (type = 'trigger' AND sql LIKE '%%polls_fts%%')
+    """ % ", ".join("?" * len(LOADED_TABLES)), LOADED_TABLES).fetchall()
+    for kind, name in rows:
+        conn.execute('DROP %s "%s"' % (kind.upper(), name))
+        dropped.append(name)
+    conn.commit()
+    return dropped
+
+
+def seed(db: str, polls: int, answers: int, seed: int = 1, until: float = None, days: float = 90,
+         users: int = None, chats: int = None, anonymous: float = 0.3, skew: float = 1.1,
+         batch_size: int = 10000) -> dict:
+    """Generate the polls into `db`; returns counts of what was added and the time of each step."""
+    until = time.time() if until is None else until
+    users = users or max(1000, answers // 2)
+    chats = chats or max(1, polls // 25)
+    timings = {}
+    started = time.perf_counter()
+
+    setup_database(db)
+    conn = sqlite3.connect(db)
+    try:
+        if conn.execute("SELECT 1 FROM polls WHERE poll_id GLOB ? LIMIT 1", ("seed%d-*" % seed,)).fetchone():
+            raise ValueError("the database already holds the polls of seed %d" % seed)
+        # Nothing here needs to survive a crash: the load is redone from the seed
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA cache_size = -262144")
+        dropped = _drop_indexes_and_triggers(conn)
+        logger.info("Dropped %d indexes and triggers for the load", len(dropped))
+
+        seeder = Seeder(conn, seed, until, days, users, chats, anonymous)
+        counts = answer_counts(seeder.rng, polls, answers, skew, users // 2)
+        for n, poll_answers in enumerate(counts):
+            seeder.add_poll(n, poll_answers)
+            if (n + 1) % batch_size == 0:
+                seeder.flush()
+                logger.info("%d/%d polls, %d votes", n + 1, polls, seeder.counts["votes"])
+        seeder.flush()
+        seeder.finish()
+        timings["load"] = time.perf_counter() - started
+    finally:
+        conn.close()
+
+    setup_database(db)
+    timings["indexes"] = time.perf_counter() - started - sum(timings.values())
+    sync(db)
+    timings["search_index"] = time.perf_counter() - started - sum(timings.values())
+    with sqlite3.connect(db) as conn:
+        conn.execute("ANALYZE")
+    timings["analyze"] = time.perf_counter() - started - sum(timings.values())
+    return {**seeder.counts, "timings": {step: round(seconds, 2) for step, seconds in timings.items()}}
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.getenv("POLLS_DB"), help="SQLite database (default: $POLLS_DB)")
+    parser.add_argument("--polls", type=int, default=10000)
+    parser.add_argument("--answers", type=int, default=200000,
+                        help="voters over all polls, each picking one or more options; "
+                             "a poll has at most half the users as voters")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--until", type=float, help="unix time of the newest data (default: now)")
+    parser.add_argument("--days", type=float, default=90, help="polls are created over this many days")
+    parser.add_argument("--users", type=int, help="distinct users (default: answers / 2)")
+    parser.add_argument("--chats", type=int, help="group chats (default: polls / 25)")
+    parser.add_argument("--anonymous", type=float, default=0.3, help="share of anonymous polls")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of poll popularity")
+    parser.add_argument("--batch-size", type=int, default=10000, help="polls per transaction")
+    args = parser.parse_args()
+    if not args.db:
+        parser.error("no database: pass --db or set POLLS_DB")
+
+    setup_logging()
+    started = time.perf_counter()
+    try:
+        result = seed(args.db, args.polls, args.answers, seed=args.seed, until=args.until, days=args.days,
+                      users=args.users, chats=args.chats, anonymous=args.anonymous, skew=args.skew,
+                      batch_size=args.batch_size)
+    except ValueError as e:
+        sys.exit(str(e))
+    logger.info("Seeded %s in %.2fs: %s polls (%s anonymous, %s closed), %s answers, %s votes; %s",
+                args.db, time.perf_counter() - started, result["polls"], result["anonymous"],
+                result["closed"], result["answers"], result["votes"],
+                ", ".join("%s %.2fs" % step for step in result["timings"].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import json
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = {"minute": 60, "hour": 3600}
+
+
+@dataclass
+class TimelinePoint:
+    bucket: int  # unix time of the bucket start
+    votes: int
+    retracted: int
+
+
+def record_vote_activity(cursor, poll_id: str, at: float = None, votes: int = 0, retracted: int = 0) -> None:
+    """
+    Add voting activity to the minute and hour rollups of a poll, on the
+    caller's cursor so it commits with the votes themselves.
+    """
+    if not votes and not retracted:
+        return
+    at = time.time() if at is None else at
+    for resolution, width in RESOLUTIONS.items():
+        cursor.execute(f"""
+            INSERT INTO vote_rollup_{resolution} (poll_id, bucket, chat_id, votes, retracted)
+            SELECT ?, ?, (SELECT chat_id FROM polls WHERE poll_id = ?), ?, ?
+            WHERE true
+            ON CONFLICT (poll_id, bucket) DO UPDATE SET
+                votes = votes + excluded.votes,
+                retracted = retracted + excluded.retracted
+        """, (poll_id, int(at // width) * width, poll_id, votes, retracted))
+
+
+def insert_count_snapshot(cursor, poll_id: str, vote_counts: dict[int, int], total_voters: int, at: float = None) -> None:
+    cursor.execute("""
+        INSERT INTO poll_count_snapshots (poll_id, taken_at, total_voters, counts)
+        VALUES (?, ?, ?, ?)
+    """, (poll_id, time.time() if at is None else at, total_voters,
+          json.dumps([vote_counts[i] for i in sorted(vote_counts)])))
+
+
+class TimelineRepository:
+    """Vote-rate time series read from the rollup tables, never from raw votes."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def poll_series(self, poll_id: str, resolution: str = "minute", start: float = None, end: float = None) -> list[TimelinePoint]:
+        return self._series("poll_id", poll_id, resolution, start, end)
+
+    def chat_series(self, chat_id: int, resolution: str = "hour", start: float = None, end: float = None) -> list[TimelinePoint]:
+        """Activity of all polls in a chat, summed per bucket."""
+        return self._series("chat_id", chat_id, resolution, start, end)
+
+    def peak_buckets(self, chat_id: int = None, resolution: str = "minute", limit: int = 10) -> list[TimelinePoint]:
+        """Busiest buckets, in one chat or overall."""
+        table = self._table(resolution)
+        where, params = ("WHERE chat_id = ?", [chat_id]) if chat_id is not None else ("", [])
+        with sqlite3.connect(self.db) as conn:
+            rows = conn.execute(f"""
+                SELECT bucket, SUM(votes) AS total, SUM(retracted)
+                FROM {table} {where}
+                GROUP BY bucket
+                ORDER BY total DESC
+                LIMIT ?
+            """, params + [limit]).fetchall()
+        return [TimelinePoint(*row) for row in rows]
+
+    def count_snapshots(self, poll_id: str) -> list[tuple[float, int, list[int]]]:
+        """(taken_at, total_voters, per-option counts) for an anonymous poll."""
+        with sqlite3.connect(self.db) as conn:
+            rows = conn.execute("""
+                SELECT taken_at, total_voters, counts FROM poll_count_snapshots
+                WHERE poll_id = ? ORDER BY taken_at
+            """, (poll_id,)).fetchall()
+        return [(taken_at, total, json.loads(counts)) for taken_at, total, counts in rows]
+
+    def purge(self, resolution: str, older_than: float) -> int:
+        """Drop buckets that started more than `older_than` seconds ago."""
+        table = self._table(resolution)
+        with sqlite3.connect(self.db) as conn:
+            cursor = conn.execute(f"DELETE FROM {table} WHERE bucket < ?", (time.time() - older_than,))
+            conn.commit()
+            return cursor.rowcount
+
+    def _series(self, column: str, value, resolution: str, start: float, end: float) -> list[TimelinePoint]:
+        table = self._table(resolution)
+        with sqlite3.connect(self.db) as conn:
+            rows = conn.execute(f"""
+                SELECT bucket, SUM(votes), SUM(retracted)
+                FROM {table}
+                WHERE {column} = ? AND bucket >= ? AND bucket <= ?
+                GROUP BY bucket
+                ORDER BY bucket
+            """, (value, start or 0, end if end is not None else time.time())).fetchall()
+        return [TimelinePoint(*row) for row in rows]
+
+    @staticmethod
+    def _table(resolution: str) -> str:
+        if resolution not in RESOLUTIONS:
+            raise ValueError("Unknown resolution: %s" % resolution)
+        return f"vote_rollup_{resolution}"
@@ -0,0 +1,72 @@
+import functools
+import html
+import io
+import json
+import logging
+import os
+
+from telegram import Update
+from telegram.constants import MessageLimit, ParseMode
+from telegram.ext import CommandHandler, ContextTypes
+
+from utils.translations import translator
+
+logger = logging.getLogger(__name__)
+
+REPORT_STATEMENTS = 10
+STATEMENT_PREVIEW = 120
+
+
+@functools.cache
+def admin_user_ids() -> frozenset[int]:
+    """Users listed in ADMIN_USER_IDS (comma separated), read once; invalid entries are skipped."""
+    user_ids = set()
+    for value in os.getenv("ADMIN_USER_IDS", "").replace(" ", "").split(","):
+        if not value:
+            continue
+        try:
+            user_ids.add(int(value))
+        except ValueError:
+            logger.warning("Ignoring invalid ADMIN_USER_IDS entry %r", value)
+    return frozenset(user_ids)
+
+
+def format_sql_report(rows: list[dict], limit: int = REPORT_STATEMENTS) -> str:
+    lines = []
+    for row in rows[:limit]:
+        statement = row["statement"]
+        if len(statement) > STATEMENT_PREVIEW:
+            statement = statement[:STATEMENT_PREVIEW - 1] + "…"
+        lines.append("%d× total %.0fms p50≤%.2fms p95≤%.2fms max %.1fms%s\n%s" % (
+            row["calls"], row["total_ms"], row["p50_ms"], row["p95_ms"], row["max_ms"],
+            " ⚠️ SCAN" if row["full_scans"] else "", statement))
+        for scan in row["full_scans"]:
+            lines.append("  ⚠️ " + scan)
+    return "\n\n".join(lines)
+
+
+async def sqlprofile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/sqlprofile [dump]: the SQL profiler report, for admins only"""
+    user = update.effective_user
+    if user.id not in admin_user_ids():
+        # Silently ignored for everyone else
+        return
+    profiler = context.bot_data.get("sql_profiler")
+    if profiler is None:
+        await update.message.reply_text(translator.translate("sqlprofile_off", user))
+        return
+
+    rows = profiler.report()
+    if context.args and context.args[0].lower() == "dump":
+        report = json.dumps({"slow_ms": profiler.slow * 1000, "statements": rows}, indent=2, ensure_ascii=False)
+        await update.message.reply_document(io.BytesIO(report.encode()), filename="sql_profile.json")
+        return
+    if not rows:
+        await update.message.reply_text(translator.translate("sqlprofile_empty", user))
+        return
+    # Leave room for the tags and the escaping of < > &
+    report = format_sql_report(rows)[:MessageLimit.MAX_TEXT_LENGTH // 2]
+    await update.message.reply_text("<pre>%s</pre>" % html.escape(report), parse_mode=ParseMode.HTML)
+
+
+sqlprofile_handler = CommandHandler("sqlprofile", sqlprofile_command)
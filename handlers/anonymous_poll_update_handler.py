@@ -1,12 +1,8 @@
 import logging
 from telegram.ext import ContextTypes
 from telegram import Update
+from utils.logging_setup import POLL_UPDATE
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
-logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 
@@ -17,7 +13,7 @@ async def handle_anonymous_poll_update(update: Update, context: ContextTypes.DEF
     """
     poll = update.poll
     logger.info("Poll update received for poll %s (voters: %s)",
-                poll.id, poll.total_voter_count)
+                poll.id, poll.total_voter_count, extra=POLL_UPDATE)
 
     poll_service = context.bot_data.get('poll_service')
     if not poll_service:
@@ -3,12 +3,6 @@ from telegram.ext import CommandHandler, ContextTypes, ConversationHandler
 from utils.translations import translator
 import logging
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
-# set higher logging level for httpx to avoid all GET and POST requests being logged
-logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -0,0 +1,74 @@
+import asyncio
+import html
+import logging
+from datetime import datetime, timezone
+
+from telegram import Update
+from telegram.constants import ParseMode
+from telegram.error import TelegramError
+from telegram.ext import CommandHandler, ContextTypes
+
+from utils.translations import translator
+
+logger = logging.getLogger(__name__)
+
+WEEKS_SHOWN = 8
+TOP_VOTERS = 5
+
+
+async def _voter_name(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int) -> str:
+    try:
+        member = await context.bot.get_chat_member(chat_id, user_id)
+        return html.escape(member.user.full_name)
+    except TelegramError:
+        return str(user_id)
+
+
+async def chatstats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Participation stats of the current group, or the user's own in a private chat."""
+    user = update.effective_user
+    chat = update.effective_chat
+    poll_service = context.bot_data.get("poll_service")
+    if not poll_service or not poll_service.analytics:
+        await update.message.reply_text(translator.translate("error_service_unavailable", user))
+        return
+    analytics = poll_service.analytics
+
+    if chat.type == "private":
+        stats = analytics.user_stats(user.id)
+        await update.message.reply_text(translator.translate(
+            "user_stats", user, polls=stats.polls_created, votes=stats.votes_cast))
+        return
+
+    stats = analytics.chat_stats(chat.id)
+    if not stats.polls_created:
+        await update.message.reply_text(translator.translate("chatstats_empty", user))
+        return
+
+    weekly = analytics.weekly_stats(chat.id, WEEKS_SHOWN)
+    top = analytics.top_voters(chat.id, TOP_VOTERS)
+    names = await asyncio.gather(*(_voter_name(context, chat.id, user_id) for user_id, _ in top))
+
+    lines = [translator.translate(
+        "chatstats_summary", user,
+        polls=stats.polls_created,
+        closed=stats.polls_closed,
+        votes=stats.votes,
+        turnout=f"{stats.average_turnout:.1f}",
+    )]
+    if weekly:
+        lines.append("")
+        lines.append(translator.translate("chatstats_weekly", user))
+        for week, polls, votes in weekly:
+            day = datetime.fromtimestamp(week, timezone.utc).strftime("%d.%m")
+            lines.append(translator.translate("chatstats_week_line", user, week=day, polls=polls, votes=votes))
+    if top:
+        lines.append("")
+        lines.append(translator.translate("chatstats_top_voters", user))
+        for place, (name, (_, votes)) in enumerate(zip(names, top), start=1):
+            lines.append(f"{place}. {name} — {votes}")
+
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.HTML)
+
+
+chatstats_handler = CommandHandler("chatstats", chatstats_command)
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+import tempfile
+
+from telegram import Update
+from telegram.ext import CallbackQueryHandler, CommandHandler, ContextTypes
+
+from database.export import FORMATS, export_filename, export_poll
+from utils.translations import translator
+
+logger = logging.getLogger(__name__)
+
+# Exports larger than this spill from memory to a temporary file
+SPOOL_SIZE = 1024 * 1024
+
+
+async def send_poll_export(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user, poll_id: str, fmt: str = "csv") -> None:
+    """Export a poll the user owns and send it to `chat_id` as a gzipped document."""
+    poll_service = context.bot_data.get("poll_service")
+    if not poll_service:
+        await context.bot.send_message(chat_id, translator.translate("error_service_unavailable", user))
+        return
+
+    repository = poll_service.poll_repository
+    if repository.get_poll_owner(poll_id) != user.id:
+        # Same answer for missing and foreign polls, so ids cannot be probed
+        await context.bot.send_message(chat_id, translator.translate("poll_not_found", user))
+        return
+
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as output:
+        try:
+            # The export reads SQLite and compresses; keep it off the event loop
+            records = await asyncio.to_thread(export_poll, repository.db, poll_id, output, fmt)
+        except Exception as e:
+            logger.error("Export of poll %s failed: %s", poll_id, e, exc_info=True)
+            await context.bot.send_message(chat_id, translator.translate("export_failed", user))
+            return
+        output.seek(0)
+        await context.bot.send_document(
+            chat_id,
+            document=output,
+            filename=export_filename(poll_id, fmt),
+            caption=translator.translate("export_caption", user, records=records),
+        )
+    logger.info("Exported poll %s (%s records) for user %s", poll_id, records, user.id)
+
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/export <poll_id> [csv|ndjson]"""
+    user = update.effective_user
+    args = context.args or []
+    fmt = args[1].lower() if len(args) > 1 else "csv"
+    if fmt == "json":
+        fmt = "ndjson"
+    if not args or fmt not in FORMATS:
+        await update.message.reply_text(translator.translate("export_usage", user))
+        return
+    await send_poll_export(context, update.effective_chat.id, user, args[0], fmt)
+
+
+async def handle_export_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Export button under a poll in /polls"""
+    query = update.callback_query
+    await query.answer()
+    _, poll_id = query.data.split(":", 1)
+    await send_poll_export(context, query.message.chat.id, update.effective_user, poll_id)
+
+
+export_handler = CommandHandler("export", export_command)
+export_button_handler = CallbackQueryHandler(handle_export_button, pattern=r'^export_poll:')
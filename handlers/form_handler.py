@@ -48,7 +48,7 @@ async def form_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 text=translator.translate("webapp_click_button_instructions", update.effective_user),
                 reply_markup=keyboard
             )
-            logger.info(f"Sent Web App button to private chat for group {chat_id} via /form")
+            logger.info("Sent Web App button to private chat for group %s via /form", chat_id)
             
             # Confirm in the group
             await update.message.reply_text(
@@ -57,13 +57,13 @@ async def form_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
         except BadRequest as e:
             # User hasn't started the bot yet
-            logger.warning(f"Could not send to private chat: {e}")
+            logger.warning("Could not send to private chat: %s", e)
             await update.message.reply_text(
                 "⚠️ Please start a private chat with me first!\n\n"
                 "Then use /form again."
             )
         except Exception as e:
-            logger.error(f"Could not send to private chat: {e}", exc_info=True)
+            logger.error("Could not send to private chat: %s", e, exc_info=True)
             await update.message.reply_text(
                 "❌ Failed to send form. Please try the inline method."
             )
@@ -80,9 +80,9 @@ async def form_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "👇 **CLICK THE BUTTON BELOW** 👇\n\n📝 Open the form to create your poll.\n\n⚠️ Don't type anything - just tap the button!",
                 reply_markup=keyboard
             )
-            logger.info(f"Sent Web App button in private chat via /form")
+            logger.info("Sent Web App button in private chat via /form")
         except Exception as e:
-            logger.error(f"Could not send Web App button: {e}", exc_info=True)
+            logger.error("Could not send Web App button: %s", e, exc_info=True)
             await update.message.reply_text(
                 "❌ Failed to send form. Please try again."
             )
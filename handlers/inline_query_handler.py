@@ -4,27 +4,54 @@ from telegram import Update, InlineQueryResultArticle, InputTextMessageContent,
 from telegram.ext import ContextTypes
 from telegram.error import BadRequest
 import os
+import re
+from models.poll import Poll
 from utils.translations import translator
 
 logger = logging.getLogger(__name__)
 
+# Last line of the message a repost result sends; carries the source poll id
+REPOST_MARKER = re.compile(r"\n🆔 (\S+)$")
+MAX_SEARCH_RESULTS = 50
+INLINE_PAGE_SIZE = 20
+# Telegram-side caching; results are also cached in-process (InlineResultsCache),
+# where they can be invalidated, so this stays short
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "10"))
+
 
 async def handle_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle inline queries - triggered when user types @botname in any chat"""
     query = update.inline_query.query.strip()
     user = update.inline_query.from_user
     
-    logger.info(f"Inline query received: '{query}' from user {user.id}")
+    logger.info("Inline query received: '%s' from user %s", query, user.id)
     
-    # Show poll creation form
+    # Show poll creation form, followed by the user's polls matching the query
     await show_poll_form(update, context, query)
 
 
-async def show_poll_form(update: Update, context: ContextTypes.DEFAULT_TYPE, query: str):
-    """Show inline results with web app form option"""
-    user = update.inline_query.from_user
-    logger.info(f"Showing poll form for query: '{query}'")
-    
+def build_repost_results(polls: list[Poll], user) -> list[InlineQueryResultArticle]:
+    """One article per poll; choosing it posts a trigger that handle_repost_message turns into the poll."""
+    results = []
+    seen = set()
+    for poll in polls:
+        # Reposts are polls too; offer each question/options combination once
+        key = (poll.question, tuple(poll.options))
+        if key in seen:
+            continue
+        seen.add(key)
+        results.append(InlineQueryResultArticle(
+            id=f"repost:{poll.id}",
+            title=poll.question,
+            description=translator.translate("inline_repost_description", user, options=", ".join(poll.options)),
+            input_message_content=InputTextMessageContent(
+                translator.translate("repost_trigger", user, question=poll.question) + f"\n🆔 {poll.id}"),
+        ))
+    return results
+
+
+def build_inline_results(poll_service, user, query: str) -> list[InlineQueryResultArticle]:
+    """The full result set for a query: the form article, then the user's matching polls."""
     results = [
         InlineQueryResultArticle(
             id="webapp_create_poll",
@@ -34,9 +61,37 @@ async def show_poll_form(update: Update, context: ContextTypes.DEFAULT_TYPE, que
             thumbnail_url="https://img.icons8.com/fluency/48/000000/create-new.png"
         )
     ]
-    
-    logger.info(f"Sending {len(results)} results to inline query")
-    await update.inline_query.answer(results, cache_time=1)
+    if query and poll_service:
+        polls = poll_service.poll_repository.search_polls(user.id, query, limit=MAX_SEARCH_RESULTS)
+        results.extend(build_repost_results(polls, user))
+    return results
+
+
+async def show_poll_form(update: Update, context: ContextTypes.DEFAULT_TYPE, query: str):
+    """Show inline results with web app form option"""
+    inline_query = update.inline_query
+    user = inline_query.from_user
+    logger.info("Showing poll form for query: '%s'", query)
+
+    poll_service = context.bot_data.get("poll_service")
+    cache = poll_service.inline_cache if poll_service else None
+    language = translator.get_user_language(user)
+    results = cache.get(user.id, query, language) if cache is not None else None
+    if results is None:
+        results = build_inline_results(poll_service, user, query)
+        if cache is not None:
+            cache.put(user.id, query, language, results)
+
+    try:
+        offset = int(inline_query.offset or 0)
+    except ValueError:
+        offset = 0
+    page = results[offset:offset + INLINE_PAGE_SIZE]
+    next_offset = str(offset + INLINE_PAGE_SIZE) if offset + INLINE_PAGE_SIZE < len(results) else ""
+
+    logger.info("Sending %s of %s results to inline query", len(page), len(results))
+    # Search results are the user's own polls
+    await inline_query.answer(page, cache_time=INLINE_CACHE_TIME, is_personal=True, next_offset=next_offset)
 
 
 async def handle_chosen_inline_result(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -44,18 +99,61 @@ async def handle_chosen_inline_result(update: Update, context: ContextTypes.DEFA
     result = update.chosen_inline_result
     
     logger.info("Handling chosen inline result")
-    logger.info(f"Chosen inline result: {result.result_id}")
-    logger.info(f"Chosen result details: from_user={result.from_user.id if result.from_user else None}, query={result.query}, inline_message_id={result.inline_message_id}")
+    logger.info("Chosen inline result: %s", result.result_id)
+    logger.info("Chosen result details: from_user=%s, query=%s, inline_message_id=%s", result.from_user.id if result.from_user else None, result.query, result.inline_message_id)
     
     if result.result_id == "webapp_create_poll":
         logger.info("Web App form result selected - trigger message will be handled by handle_poll_creation_message")
+    elif result.result_id.startswith("repost:"):
+        logger.info("Repost result selected - trigger message will be handled by handle_repost_message")
+
+
+async def handle_repost_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Send a copy of one of the user's polls when they pick a search result in inline mode."""
+    message = update.message
+    match = REPOST_MARKER.search(message.text or "")
+    # Only trust trigger messages sent through this bot's inline mode
+    if not match or not message.via_bot or message.via_bot.id != context.bot.id:
+        return
+
+    poll_service = context.bot_data.get("poll_service")
+    if not poll_service:
+        return
+
+    source_id = match.group(1)
+    user = update.effective_user
+    if poll_service.poll_repository.get_poll_owner(source_id) != user.id:
+        logger.warning("User %s tried to repost poll %s they do not own", user.id, source_id)
+        return
+    source = poll_service.poll_repository.get_poll_by_id(source_id)
+    if not source:
+        return
+
+    poll = Poll(
+        question=source.question,
+        options=list(source.options),
+        anonimity=source.anonimity,
+        forwarding=source.forwarding,
+        limit=source.limit,
+    )
+    try:
+        await poll_service.send_poll(poll, update, context, target_chat_id=update.effective_chat.id)
+        logger.info("Poll %s reposted as %s in chat %s", source_id, poll.id, update.effective_chat.id)
+    except Exception as e:
+        logger.error("Could not repost poll %s: %s", source_id, e, exc_info=True)
+        return
+
+    try:
+        await message.delete()
+    except BadRequest as e:
+        logger.debug("Cannot delete repost trigger message: %s", e)
 
 
 async def handle_poll_creation_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Detect and handle Web App form trigger messages."""
     
     message_text = update.message.text
-    logger.info(f"handle_poll_creation_message called with text: '{message_text}' from chat {update.effective_chat.id}")
+    logger.info("handle_poll_creation_message called with text: '%s' from chat %s", message_text, update.effective_chat.id)
     
     if not message_text:
         logger.debug("No message text, returning")
@@ -63,11 +161,11 @@ async def handle_poll_creation_message(update: Update, context: ContextTypes.DEF
     
     # Handle Web App form trigger
     if "Check your private chat with the bot" in message_text:
-        logger.info(f"Web App form trigger detected in message: '{message_text}'")
+        logger.info("Web App form trigger detected in message: '%s'", message_text)
         
         # Use KeyboardButton with WebApp (tg.sendData works!)
         webapp_url = os.getenv("WEBAPP_URL", "")
-        logger.info(f"Web App URL from env: {webapp_url}")
+        logger.info("Web App URL from env: %s", webapp_url)
         
         # Check if URL is configured
         if not webapp_url:
@@ -102,18 +200,18 @@ async def handle_poll_creation_message(update: Update, context: ContextTypes.DEF
                     text=translator.translate("webapp_click_button_instructions", update.effective_user),
                     reply_markup=keyboard
                 )
-                logger.info(f"Sent Web App button to private chat for group {chat_id}")
+                logger.info("Sent Web App button to private chat for group %s", chat_id)
                 
                 # Delete the trigger message
                 try:
                     await update.message.delete()
                     logger.debug("Successfully deleted trigger message")
                 except BadRequest as e:
-                    logger.debug(f"Cannot delete trigger message (may not have permission): {e}")
+                    logger.debug("Cannot delete trigger message (may not have permission): %s", e)
                 except Exception as e:
-                    logger.debug(f"Error deleting trigger message: {e}")
+                    logger.debug("Error deleting trigger message: %s", e)
             except Exception as e:
-                logger.error(f"Could not send to private chat: {e}", exc_info=True)
+                logger.error("Could not send to private chat: %s", e, exc_info=True)
         else:
             # Private chat - send button directly
             webapp_button = KeyboardButton(
@@ -127,18 +225,18 @@ async def handle_poll_creation_message(update: Update, context: ContextTypes.DEF
                     translator.translate("webapp_click_button_instructions", update.effective_user),
                     reply_markup=keyboard
                 )
-                logger.info(f"Sent Web App button in private chat")
+                logger.info("Sent Web App button in private chat")
                 
                 # Delete the trigger message
                 try:
                     await update.message.delete()
                     logger.debug("Successfully deleted trigger message")
                 except BadRequest as e:
-                    logger.debug(f"Cannot delete trigger message: {e}")
+                    logger.debug("Cannot delete trigger message: %s", e)
                 except Exception as e:
-                    logger.debug(f"Error deleting trigger message: {e}")
+                    logger.debug("Error deleting trigger message: %s", e)
             except Exception as e:
-                logger.error(f"Could not send Web App button: {e}", exc_info=True)
+                logger.error("Could not send Web App button: %s", e, exc_info=True)
         
         return
     
\ No newline at end of file
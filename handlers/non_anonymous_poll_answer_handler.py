@@ -1,14 +1,9 @@
 import logging
 from telegram.ext import ContextTypes
 from telegram import Update
+from utils.logging_setup import VOTE
 
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
-# set higher logging level for httpx to avoid all GET and POST requests being logged
-logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 
@@ -19,7 +14,7 @@ async def handle_non_anonymous_poll_answer(update: Update, context: ContextTypes
     """
     poll_answer = update.poll_answer
     logger.info("Poll answer received for poll %s from user %s",
-                poll_answer.poll_id, poll_answer.user.id)
+                poll_answer.poll_id, poll_answer.user.id, extra=VOTE)
 
     poll_service = context.bot_data.get('poll_service')
     if not poll_service:
@@ -4,10 +4,6 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from utils.translations import translator
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 
@@ -68,7 +64,15 @@ async def polls_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             translator.translate("delete_poll_button", user),
             callback_data=f"delete_poll:{poll.id}"
         ))
-        
+        buttons.append(InlineKeyboardButton(
+            translator.translate("export_poll_button", user),
+            callback_data=f"export_poll:{poll.id}"
+        ))
+        buttons.append(InlineKeyboardButton(
+            translator.translate("results_poll_button", user),
+            callback_data=f"results_poll:{poll.id}"
+        ))
+
         keyboard = InlineKeyboardMarkup([buttons])
         
         await update.message.reply_text(
@@ -135,7 +139,7 @@ async def handle_poll_action(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 translator.translate("poll_closed_success", user, question=poll.question)
             )
         except Exception as e:
-            logger.error(f"Error closing poll {poll_id}: {e}")
+            logger.error("Error closing poll %s: %s", poll_id, e)
             await query.edit_message_text(
                 translator.translate("error_closing_poll", user)
             )
@@ -196,7 +200,7 @@ async def handle_delete_confirmation(update: Update, context: ContextTypes.DEFAU
                 translator.translate("poll_deleted_success", user, question=poll.question)
             )
         except Exception as e:
-            logger.error(f"Error deleting poll {poll_id}: {e}")
+            logger.error("Error deleting poll %s: %s", poll_id, e)
             await query.edit_message_text(
                 translator.translate("error_deleting_poll", user)
             )
@@ -0,0 +1,71 @@
+import logging
+
+from telegram import Update
+from telegram.constants import MessageLimit
+from telegram.ext import CallbackQueryHandler, CommandHandler, ContextTypes
+
+from utils.translations import translator
+
+logger = logging.getLogger(__name__)
+
+MAX_OPTION_CAPTION = 60
+
+
+def results_caption(poll, counts: list[int], user) -> str:
+    """Localized caption naming the options that the chart shows by number."""
+    total = sum(counts)
+    lines = [translator.translate("results_caption", user, question=poll.question), ""]
+    for i, (option, count) in enumerate(zip(poll.options, counts), start=1):
+        if len(option) > MAX_OPTION_CAPTION:
+            option = option[:MAX_OPTION_CAPTION - 1] + "…"
+        share = round(100 * count / total) if total else 0
+        lines.append(f"{i}. {option} — {count} ({share}%)")
+    lines.append("")
+    lines.append(translator.translate("results_total_voters", user, voters=poll.voters_num))
+    return "\n".join(lines)[:MessageLimit.CAPTION_LENGTH]
+
+
+async def send_poll_results(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user, poll_id: str, **kwargs) -> None:
+    """Send the results chart of a poll posted in this chat or owned by the user."""
+    poll_service = context.bot_data.get("poll_service")
+    charts = context.bot_data.get("results_charts")
+    if not poll_service or charts is None:
+        await context.bot.send_message(chat_id, translator.translate("error_service_unavailable", user))
+        return
+
+    repository = poll_service.poll_repository
+    poll, counts = repository.get_poll_with_counts(poll_id)
+    if not poll or (poll.chat_id != chat_id and repository.get_poll_owner(poll_id) != user.id):
+        # Same answer for missing and foreign polls, so ids cannot be probed
+        await context.bot.send_message(chat_id, translator.translate("poll_not_found", user))
+        return
+
+    await charts.send_chart(context.bot, chat_id, counts, results_caption(poll, counts, user), **kwargs)
+
+
+async def results_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/results <poll_id>, or /results as a reply to a poll"""
+    user = update.effective_user
+    message = update.message
+    replied = message.reply_to_message
+    if context.args:
+        poll_id = context.args[0]
+    elif replied and replied.poll:
+        poll_id = replied.poll.id
+    else:
+        await message.reply_text(translator.translate("results_usage", user))
+        return
+    await send_poll_results(context, update.effective_chat.id, user, poll_id,
+                            reply_to_message_id=message.message_id)
+
+
+async def handle_results_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Results button under a poll in /polls"""
+    query = update.callback_query
+    await query.answer()
+    _, poll_id = query.data.split(":", 1)
+    await send_poll_results(context, query.message.chat.id, update.effective_user, poll_id)
+
+
+results_handler = CommandHandler("results", results_command)
+results_button_handler = CallbackQueryHandler(handle_results_button, pattern=r'^results_poll:')
@@ -6,11 +6,6 @@ from telegram.error import BadRequest
 from models.poll import Poll
 from utils.translations import translator
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
-logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 
@@ -25,31 +20,17 @@ async def handle_webapp_data(update: Update, context: ContextTypes.DEFAULT_TYPE)
     try:
         # Parse the JSON data from the Web App
         poll_data = json.loads(update.message.web_app_data.data)
-        logger.info(f"Web App data received: {poll_data}")
-        
-        # Validate required fields
-        if not poll_data.get('question') or not poll_data.get('options'):
-            raise ValueError("Missing required fields")
-        
-        options = poll_data['options']
-        if len(options) < 2:
-            raise ValueError("At least 2 options are required")
-        
-        # Create Poll object
-        poll = Poll(
-            question=poll_data['question'],
-            options=options,
-            anonimity=poll_data.get('anonymous', False),
-            forwarding=poll_data.get('forwarding', True),
-            limit=poll_data.get('limit') if poll_data.get('limit') else None
-        )
+        logger.info("Web App data received: %s", poll_data)
         
         # Validate limit if provided
-        if poll.limit is not None and poll.limit < 1:
+        if poll_data.get('limit') and int(poll_data['limit']) < 1:
             user = update.effective_user
             message = translator.translate("invalid_limit_min", user)
             await update.message.reply_text(message)
             return
+
+        # Validate required fields and create Poll object
+        poll = Poll.from_form(poll_data)
         
         # Get poll service and send the poll
         poll_service = context.bot_data.get('poll_service')
@@ -65,11 +46,11 @@ async def handle_webapp_data(update: Update, context: ContextTypes.DEFAULT_TYPE)
         if target_chat_id:
             # Send poll directly to target chat using target_chat_id parameter
             await poll_service.send_poll(poll, update, context, target_chat_id=target_chat_id)
-            logger.info(f"Poll created in target chat {target_chat_id} from Web App")
+            logger.info("Poll created in target chat %s from Web App", target_chat_id)
         else:
             # No target chat_id - send to current chat
             await poll_service.send_poll(poll, update, context)
-            logger.info(f"Poll created successfully from Web App in chat {update.effective_chat.id}")
+            logger.info("Poll created successfully from Web App in chat %s", update.effective_chat.id)
         
         # Remove the keyboard (since we used ReplyKeyboardMarkup)
         try:
@@ -78,7 +59,7 @@ async def handle_webapp_data(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 reply_markup=ReplyKeyboardRemove()
             )
         except Exception as e:
-            logger.debug(f"Could not remove keyboard: {e}")
+            logger.debug("Could not remove keyboard: %s", e)
         
         # Delete the Web App data message to keep chat clean
         try:
@@ -87,17 +68,17 @@ async def handle_webapp_data(update: Update, context: ContextTypes.DEFAULT_TYPE)
             pass
             
     except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON from Web App: {e}")
+        logger.error("Invalid JSON from Web App: %s", e)
         user = update.effective_user
         message = translator.translate("error_occurred", user)
         await update.message.reply_text(message)
     except ValueError as e:
-        logger.error(f"Validation error: {e}")
+        logger.error("Validation error: %s", e)
         user = update.effective_user
         message = translator.translate("error_occurred", user)
         await update.message.reply_text(message)
     except Exception as e:
-        logger.error(f"Error creating poll from Web App: {e}", exc_info=True)
+        logger.error("Error creating poll from Web App: %s", e, exc_info=True)
         user = update.effective_user
         message = translator.translate("error_occurred", user)
         await update.message.reply_text(message)
@@ -1,50 +1,140 @@
+import time
+# Taken before the other imports, which are part of the startup timings
+_started = time.perf_counter()
+import asyncio
 import logging
-from telegram import Update
-from telegram.ext import ApplicationBuilder, ContextTypes, PollAnswerHandler, PollHandler, CallbackContext, InlineQueryHandler, ChosenInlineResultHandler, CommandHandler, MessageHandler, filters, CallbackQueryHandler
 import os
+
 from dotenv import load_dotenv
-from handlers.error_handler import error_handler
-from handlers.help_handler import help_handler
-from handlers.unknown_handler import unknown_handler
-from handlers.cancel_handler import cancel_handler
-from handlers.conversation_handler import conv_handler
-from handlers.non_anonymous_poll_answer_handler import handle_non_anonymous_poll_answer
-from handlers.anonymous_poll_update_handler import handle_anonymous_poll_update
-from handlers.inline_query_handler import handle_inline_query, handle_chosen_inline_result, handle_poll_creation_message
-from handlers.webapp_handler import webapp_handler_status
-from handlers.form_handler import form_command
-from handlers.polls_handler import polls_command, handle_poll_action, handle_delete_confirmation
-from database.poll_repository import PollRepository
-from services.poll_service import PollService
-from utils.translations import translator
-
-load_dotenv()
-
-telegram_token = os.getenv("TELEGRAM_TOKEN")
-polls_db = os.getenv("POLLS_DB")
-
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
-# set higher logging level for httpx to avoid all GET and POST requests being logged
-logging.getLogger("httpx").setLevel(logging.WARNING)
+from telegram import Update
+
+from utils.logging_setup import setup_logging
+from utils.startup import StartupTimer
+
+_imported = time.perf_counter()
 logger = logging.getLogger(__name__)
 
-async def start_command_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
+
+def configure() -> None:
+    """Read .env and set up logging. Each bot process runs this first; nothing does on import."""
+    load_dotenv()
+    setup_logging()
+
+
+async def start_command_group(update: Update, context):
     """Handle /start command in group chats - delegate to /form command."""
-    logger.info(f"/start in group - delegating to /form command")
+    from handlers.form_handler import form_command
+
+    logger.info("/start in group - delegating to /form command")
     
     # Simply call the form_command
     await form_command(update, context)
 
-if __name__ == '__main__':
-    application = ApplicationBuilder().token(telegram_token).build()
+async def post_init(application) -> None:
+    """Start background helpers that need the running event loop."""
+    # Application.initialize (getMe) has just finished
+    startup = application.bot_data["startup"]
+    startup.mark("initialize")
 
-    poll_repository = PollRepository(polls_db)
-    poll_service = PollService(poll_repository)
+    watchdog = application.bot_data.get("loop_watchdog")
+    if watchdog:
+        watchdog.start()
+
+    if application.tracer:
+        if "worker_index" in application.bot_data:
+            # One trace file per sharded worker, so lines never interleave
+            application.tracer.path = "%s.%d" % (application.tracer.path, application.bot_data["worker_index"])
+        application.tracer.start()
+
+    recorder = application.bot_data.get("update_recorder")
+    if recorder is not None:
+        if "worker_index" in application.bot_data:
+            recorder.path = "%s.%d" % (recorder.path, application.bot_data["worker_index"])
+        recorder.start()
+
+    # Also replays whatever the outbox still holds from before a restart
+    application.bot_data["poll_service"].outbox_dispatcher.start(application.bot)
+
+    webapp_port = os.getenv("WEBAPP_SERVER_PORT")
+    if webapp_port:
+        from webapp.api import start_webapp_server
+        application.bot_data["webapp_server"] = start_webapp_server(
+            application, int(webapp_port), os.getenv("WEBAPP_SERVER_ADDRESS", ""))
+
+    metrics_port = os.getenv("METRICS_PORT")
+    if metrics_port:
+        from webapp.api import start_metrics_server
+        # Sharded workers each keep their own metrics, one port per worker
+        application.bot_data["metrics_server"] = start_metrics_server(
+            int(metrics_port) + application.bot_data.get("worker_index", 0), os.getenv("METRICS_ADDRESS", ""))
+
+    startup.mark("post_init")
+    startup.log("Bot started")
+
+
+async def post_shutdown(application) -> None:
+    """Stop the background helpers started in post_init."""
+    webapp_server = application.bot_data.get("webapp_server")
+    if webapp_server:
+        webapp_server.stop()
+
+    metrics_server = application.bot_data.get("metrics_server")
+    if metrics_server:
+        metrics_server.stop()
+
+    await application.bot_data["poll_service"].outbox_dispatcher.stop()
+
+    watchdog = application.bot_data.get("loop_watchdog")
+    if watchdog:
+        await watchdog.stop()
+
+    if application.tracer:
+        application.tracer.stop()
+
+    recorder = application.bot_data.get("update_recorder")
+    if recorder is not None:
+        recorder.stop()
+
+    sql_profiler = application.bot_data.get("sql_profiler")
+    profile_file = os.getenv("SQL_PROFILE_FILE")
+    if sql_profiler and profile_file:
+        if "worker_index" in application.bot_data:
+            profile_file = "%s.%d" % (profile_file, application.bot_data["worker_index"])
+        sql_profiler.dump(profile_file)
+
+
+async def purge_vote_rollups(context) -> None:
+    """Job that drops per-minute vote rollups older than the retention in job.data."""
+    if context.bot_data.get("worker_index", 0):
+        # Sharded workers share the database; one of them is enough
+        return
+    repository, retention = context.job.data
+    purged = await asyncio.to_thread(repository.purge, "minute", retention)
+    if purged:
+        logger.info("Purged %s per-minute vote rollup rows", purged)
 
-    application.bot_data["poll_service"] = poll_service
+
+def register_handlers(application) -> None:
+    """Register every update handler on the application."""
+    from telegram.ext import (CallbackQueryHandler, ChosenInlineResultHandler, CommandHandler, InlineQueryHandler,
+                              MessageHandler, PollAnswerHandler, PollHandler, filters)
+    from handlers.error_handler import error_handler
+    from handlers.help_handler import help_handler
+    from handlers.unknown_handler import unknown_handler
+    from handlers.cancel_handler import cancel_handler
+    from handlers.conversation_handler import conv_handler
+    from handlers.non_anonymous_poll_answer_handler import handle_non_anonymous_poll_answer
+    from handlers.anonymous_poll_update_handler import handle_anonymous_poll_update
+    from handlers.admin_handler import admin_user_ids, sqlprofile_handler
+    from handlers.chatstats_handler import chatstats_handler
+    from handlers.export_handler import export_handler, export_button_handler
+    from handlers.results_handler import results_handler, results_button_handler
+    from handlers.inline_query_handler import (handle_inline_query, handle_chosen_inline_result,
+                                               handle_poll_creation_message, handle_repost_message)
+    from handlers.webapp_handler import webapp_handler_status
+    from handlers.form_handler import form_command
+    from handlers.polls_handler import polls_command, handle_poll_action, handle_delete_confirmation
+    from utils.metrics import instrument_handlers
 
     inline_query_handler = InlineQueryHandler(handle_inline_query)
     chosen_inline_result_handler = ChosenInlineResultHandler(
@@ -59,6 +149,8 @@ if __name__ == '__main__':
 
     application.add_handler(MessageHandler(filters.TEXT & filters.Regex(
         r'^📝 Check your private chat'), handle_poll_creation_message), group=1)  # Handle Web App form trigger from inline queries - BEFORE conv_handler
+    application.add_handler(MessageHandler(filters.TEXT & filters.VIA_BOT & filters.Regex(
+        r'\n🆔 \S+$'), handle_repost_message), group=1)  # Repost chosen from inline search results
     
     application.add_handler(conv_handler)  # Handles /start in private chats
     application.add_handler(CommandHandler("form", form_command))
@@ -70,6 +162,14 @@ if __name__ == '__main__':
     # Callback handlers for poll management
     application.add_handler(CallbackQueryHandler(handle_poll_action, pattern=r'^(close_poll|delete_poll):'))
     application.add_handler(CallbackQueryHandler(handle_delete_confirmation, pattern=r'^(confirm_delete|cancel_delete)'))
+    application.add_handler(export_button_handler)
+    application.add_handler(export_handler)
+    application.add_handler(results_button_handler)
+    application.add_handler(results_handler)
+    application.add_handler(chatstats_handler)
+    application.add_handler(sqlprofile_handler)
+    # Parsed now, so a malformed ADMIN_USER_IDS is reported at startup
+    admin_user_ids()
     
     application.add_handler(inline_query_handler)
     application.add_handler(chosen_inline_result_handler)
@@ -80,7 +180,192 @@ if __name__ == '__main__':
     # For anonymous polls (and all polls)
     application.add_handler(PollHandler(handle_anonymous_poll_update))
     application.add_handler(unknown_handler)
+
+    instrument_handlers(application)
     
     # application.add_handler(CommandHandler("poll_results", poll.get_poll_results))'''
 
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+
+def register_metrics(application) -> None:
+    """Gauges read at scrape time from the objects that already hold the numbers."""
+    from utils.metrics import registry
+
+    poll_service = application.bot_data["poll_service"]
+    charts = application.bot_data["results_charts"]
+    registry.gauge("open_polls", "Polls not closed yet",
+                   callback=poll_service.poll_repository.count_open_polls)
+    registry.gauge("outbox_unfinished", "Outbox actions pending or in flight",
+                   callback=poll_service.outbox_dispatcher.outbox_repository.count_unfinished)
+    registry.gauge("update_queue_depth", "Updates waiting to be processed",
+                   callback=application.update_queue.qsize)
+    registry.gauge("cached_polls", "Polls held in bot_data",
+                   callback=lambda: sum(1 for value in list(application.bot_data.values()) if isinstance(value, dict)))
+    registry.gauge("vote_stream_subscribers", "Subscribers of live vote counts",
+                   callback=poll_service.pubsub.subscriber_count)
+    registry.gauge("results_chart_cache_size", "Cached results chart file ids", callback=lambda: len(charts))
+    registry.counter("results_chart_requests_total", "Results charts sent", ("cache",),
+                     callback=lambda: {"hit": charts.hits, "miss": charts.misses})
+    if poll_service.inline_cache is not None:
+        inline_cache = poll_service.inline_cache
+        registry.gauge("inline_results_cache_entries", "Cached inline result sets (one per user and query)",
+                       callback=lambda: len(inline_cache))
+        registry.counter("inline_results_requests_total", "Inline result lookups", ("cache",),
+                         callback=lambda: {"hit": inline_cache.hits, "miss": inline_cache.misses})
+    if poll_service.live_results is not None:
+        live_results = poll_service.live_results
+        registry.gauge("live_results_messages", "Live results messages being kept up to date",
+                       callback=lambda: len(live_results))
+
+
+def build_application(with_updater: bool = True):
+    """
+    Build the bot application with its services and handlers.
+    Workers in sharded mode receive updates from the ingress process,
+    so they are built without an Updater.
+    """
+    startup = StartupTimer(_started)
+    startup.mark("imports", at=_imported)
+    configure()
+    startup.mark("configure")
+
+    from telegram.ext import ApplicationBuilder, TypeHandler
+    from database.poll_db import setup_database
+    from database.analytics import AnalyticsRepository
+    from database.poll_repository import PollRepository
+    from database.profiler import profiler_from_env
+    from database.timeline_repository import TimelineRepository
+    from database.outbox_repository import OutboxRepository
+    from services.poll_service import PollService
+    from services.outbox_dispatcher import OutboxDispatcher
+    from services.live_results import LiveResultsScheduler
+    from services.vote_pubsub import VotePubSub
+    from services.inline_results_cache import InlineResultsCache
+    from services.results_chart import ResultsChartService, report_results_charts
+    from utils.translations import translator
+    from utils.bot_api_transport import TransportConfig, build_requests, report_bot_api_latency
+    from utils.loop_watchdog import watchdog_from_env, report_loop_stalls
+    from utils.tracing import TracingApplication, tracer_from_env
+    from utils.update_capture import recorder_from_env
+    startup.mark("modules")
+
+    polls_db = os.getenv("POLLS_DB")
+    transport_config = TransportConfig.from_env()
+    request, get_updates_request = build_requests(transport_config)
+    watchdog = watchdog_from_env()
+
+    builder = (ApplicationBuilder()
+               .application_class(TracingApplication, kwargs={"tracer": tracer_from_env(), "watchdog": watchdog})
+               .token(os.getenv("TELEGRAM_TOKEN"))
+               .request(request)
+               .post_init(post_init)
+               .post_shutdown(post_shutdown))
+    if transport_config.base_url:
+        builder = builder.base_url(transport_config.base_url)
+    if with_updater:
+        builder = builder.get_updates_request(get_updates_request)
+    else:
+        builder = builder.updater(None)
+    application = builder.build()
+    application.bot_data["startup"] = startup
+    startup.mark("application")
+
+    if transport_config.latency_report_interval > 0:
+        application.job_queue.run_repeating(
+            report_bot_api_latency, interval=transport_config.latency_report_interval)
+
+    translator.load_translations()
+    startup.mark("translations")
+
+    setup_database(polls_db)
+    startup.mark("database")
+    sql_profiler = profiler_from_env()
+    poll_repository = PollRepository(polls_db, sql_profiler)
+    outbox_dispatcher = OutboxDispatcher(OutboxRepository(polls_db), poll_repository)
+    live_results = None
+    if os.getenv("LIVE_RESULTS", "").strip().lower() in ("1", "true", "yes", "on"):
+        live_results = LiveResultsScheduler(interval=float(os.getenv("LIVE_RESULTS_INTERVAL", "10")),
+                                            max_idle=float(os.getenv("LIVE_RESULTS_MAX_IDLE", "86400")))
+    inline_cache = InlineResultsCache(ttl=float(os.getenv("INLINE_RESULTS_TTL", "300")))
+    poll_service = PollService(poll_repository, outbox_dispatcher, live_results, VotePubSub(), inline_cache,
+                               AnalyticsRepository(polls_db))
+
+    application.bot_data["poll_service"] = poll_service
+    if sql_profiler:
+        application.bot_data["sql_profiler"] = sql_profiler
+    application.bot_data["results_charts"] = ResultsChartService()
+    results_report_interval = float(os.getenv("RESULTS_CHART_REPORT_INTERVAL", "600"))
+    if results_report_interval > 0:
+        application.job_queue.run_repeating(report_results_charts, interval=results_report_interval)
+
+    # The per-minute series is for recent activity; hour buckets are kept
+    rollup_retention = float(os.getenv("VOTE_ROLLUP_MINUTE_RETENTION_DAYS", "7")) * 24 * 3600
+    if rollup_retention > 0:
+        application.job_queue.run_repeating(purge_vote_rollups, interval=3600, first=60,
+                                            data=(TimelineRepository(polls_db), rollup_retention))
+
+    if watchdog:
+        application.bot_data["loop_watchdog"] = watchdog
+        application.job_queue.run_repeating(
+            report_loop_stalls, interval=float(os.getenv("LOOP_WATCHDOG_REPORT_INTERVAL", "600")))
+
+    recorder = recorder_from_env()
+    if recorder is not None:
+        application.bot_data["update_recorder"] = recorder
+        # First group, so every update is captured before any handler runs
+        application.add_handler(TypeHandler(Update, recorder.capture), group=-100)
+
+    register_handlers(application)
+    register_metrics(application)
+    startup.watch_first_update(application)
+    startup.mark("services")
+    return application
+
+
+def run_sharded(num_workers: int) -> None:
+    """Run an ingress in this process and hand updates to worker processes."""
+    from services.sharding import DEFAULT_BASE_URL, ShardSupervisor, run_update_worker, poll_updates, serve_webhook
+    from utils.bot_api_transport import TransportConfig
+
+    telegram_token = os.getenv("TELEGRAM_TOKEN")
+    # The ingress talks to the same Bot API server as the workers
+    base_url = TransportConfig.from_env().base_url or DEFAULT_BASE_URL
+    supervisor = ShardSupervisor(
+        num_workers,
+        run_update_worker,
+        worker_args=(build_application, num_workers),
+        heartbeat_timeout=float(os.getenv("BOT_WORKER_HEARTBEAT_TIMEOUT", "30")))
+    supervisor.start()
+    logger.info("Started %s bot workers", num_workers)
+
+    try:
+        if os.getenv("BOT_INGRESS", "polling") == "webhook":
+            serve_webhook(
+                telegram_token,
+                supervisor,
+                listen=os.getenv("WEBHOOK_LISTEN", "0.0.0.0"),
+                port=int(os.getenv("WEBHOOK_PORT", "8443")),
+                path=os.getenv("WEBHOOK_PATH", "/telegram"),
+                webhook_url=os.getenv("WEBHOOK_URL"),
+                secret_token=os.getenv("WEBHOOK_SECRET"),
+                allowed_updates=Update.ALL_TYPES,
+                base_url=base_url)
+        else:
+            poll_updates(telegram_token, supervisor, allowed_updates=Update.ALL_TYPES, base_url=base_url)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
+
+
+def main() -> None:
+    configure()
+    num_workers = int(os.getenv("BOT_WORKERS", "0"))
+    if num_workers > 0:
+        run_sharded(num_workers)
+    else:
+        application = build_application()
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
+
+
+if __name__ == '__main__':
+    main()
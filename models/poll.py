@@ -3,14 +3,13 @@ from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 import sys
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
-# set higher logging level for httpx to avoid all GET and POST requests being logged
-logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
+# Bot API limits for sendPoll
+MAX_QUESTION_LENGTH = 300
+MAX_OPTION_LENGTH = 100
+MAX_OPTIONS = 12
+
 
 @dataclass
 class Poll:
@@ -27,6 +26,46 @@ class Poll:
     closed: bool = False
     message_id: int = None
     chat_id: int = None
+    results_message_id: int = None
+
+    @classmethod
+    def from_form(cls, data: dict) -> "Poll":
+        """
+        Build a poll from the Web App form payload.
+        Raises ValueError when the payload is not a valid poll.
+        """
+        question = str(data.get('question') or '').strip()
+        options = data.get('options')
+        if not question or not options:
+            raise ValueError("Missing required fields")
+        if not isinstance(options, list):
+            raise ValueError("Options must be a list")
+        options = [str(option).strip() for option in options if str(option).strip()]
+        if len(options) < 2:
+            raise ValueError("At least 2 options are required")
+        if len(options) > MAX_OPTIONS:
+            raise ValueError(f"At most {MAX_OPTIONS} options are allowed")
+        if len(question) > MAX_QUESTION_LENGTH:
+            raise ValueError(f"Question is longer than {MAX_QUESTION_LENGTH} characters")
+        if any(len(option) > MAX_OPTION_LENGTH for option in options):
+            raise ValueError(f"Options must be at most {MAX_OPTION_LENGTH} characters")
+
+        limit = data.get('limit')
+        if limit:
+            try:
+                limit = int(limit)
+            except (TypeError, ValueError):
+                raise ValueError("Vote limit must be a number")
+            if limit < 1:
+                raise ValueError("Vote limit must be at least 1")
+
+        return cls(
+            question=question,
+            options=options,
+            anonimity=bool(data.get('anonymous', False)),
+            forwarding=bool(data.get('forwarding', True)),
+            limit=limit if limit else None
+        )
 
     def get_vote_counts(self) -> dict:
         """
@@ -74,4 +113,5 @@ class Poll:
             "closed": self.closed,
             "message_id": self.message_id,
             "chat_id": self.chat_id,
+            "results_message_id": self.results_message_id,
         }
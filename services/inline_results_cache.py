@@ -0,0 +1,46 @@
+from cachetools import TTLCache
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class InlineResultsCache:
+    """
+    Inline query result sets, built once and paged from memory.
+
+    Entries are grouped per user so that a change to one user's polls drops
+    all of that user's result sets at once. A user's group expires `ttl`
+    seconds after its first entry, which bounds staleness should an
+    invalidation ever be missed.
+    """
+
+    def __init__(self, ttl: float = 300, max_users: int = 10000, max_queries_per_user: int = 32):
+        self.max_queries_per_user = max_queries_per_user
+        self._users = TTLCache(maxsize=max_users, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._users.values())
+
+    def get(self, user_id: int, query: str, language: str) -> list:
+        entries = self._users.get(user_id)
+        results = entries.get((normalize_query(query), language)) if entries else None
+        if results is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return results
+
+    def put(self, user_id: int, query: str, language: str, results: list) -> None:
+        entries = self._users.get(user_id)
+        if entries is None:
+            entries = self._users[user_id] = {}
+        elif len(entries) >= self.max_queries_per_user:
+            # Oldest first: the user has moved on from the early keystrokes
+            del entries[next(iter(entries))]
+        entries[(normalize_query(query), language)] = results
+
+    def invalidate_user(self, user_id: int) -> None:
+        self._users.pop(user_id, None)
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+from models.poll import Poll
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LiveMessage:
+    chat_id: int
+    message_id: int
+    poll: Poll
+    text: str = ""
+    last_edit: float = 0.0
+    last_vote: float = 0.0
+    task: asyncio.Task = None
+
+
+class LiveResultsScheduler:
+    """
+    Keeps one "live results" message per poll up to date.
+
+    Votes only mark the message dirty; at most one edit per `interval`
+    seconds is sent per message, carrying the latest state, and nothing is
+    sent when the rendered text did not change. An edit refused by flood
+    control is sent again after retry_after.
+
+    Messages without votes for `max_idle` seconds are forgotten, so polls
+    that expire without being closed do not pile up; a later vote picks the
+    message up again from poll.results_message_id.
+    """
+
+    def __init__(self, interval: float = 10.0, max_idle: float = 24 * 3600):
+        self.interval = interval
+        self.max_idle = max_idle
+        self._messages: dict[str, LiveMessage] = {}
+        self._last_prune = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    async def publish(self, bot, poll: Poll, chat_id: int) -> int:
+        """Post the live results message for a poll and start tracking it."""
+        text = poll.get_results_summary()
+        message = await bot.send_message(chat_id, text)
+        now = time.monotonic()
+        self._messages[poll.id] = LiveMessage(chat_id, message.message_id, poll, text, now, now)
+        return message.message_id
+
+    def notify(self, bot, poll: Poll) -> None:
+        """Schedule an edit for the poll's live message, coalescing with a pending one."""
+        if not poll.results_message_id or poll.closed:
+            return
+        now = time.monotonic()
+        self._prune(now)
+        live = self._messages.get(poll.id)
+        if live is None:
+            # Loaded from the database after a restart, or pruned while idle
+            live = self._messages[poll.id] = LiveMessage(poll.chat_id, poll.results_message_id, poll)
+        live.poll = poll
+        live.last_vote = now
+        if _pending(live):
+            return
+        delay = max(0.0, live.last_edit + self.interval - now)
+        live.task = asyncio.get_running_loop().create_task(self._edit_later(bot, live, delay))
+
+    def _prune(self, now: float) -> None:
+        """Forget idle messages, looking at most once per interval."""
+        if now - self._last_prune < self.interval:
+            return
+        self._last_prune = now
+        idle = [poll_id for poll_id, live in self._messages.items()
+                if now - live.last_vote > self.max_idle and not _pending(live)]
+        for poll_id in idle:
+            del self._messages[poll_id]
+
+    async def stop(self, bot, poll: Poll) -> None:
+        """Send the final state of a closed poll and stop tracking it."""
+        live = self._messages.pop(poll.id, None)
+        if live is None:
+            return
+        if _pending(live):
+            live.task.cancel()
+        live.poll = poll
+        await self._edit(bot, live)
+
+    async def _edit_later(self, bot, live: LiveMessage, delay: float) -> None:
+        await asyncio.sleep(delay)
+        await self._edit(bot, live)
+
+    async def _edit(self, bot, live: LiveMessage) -> None:
+        text = live.poll.get_results_summary()
+        if text == live.text:
+            return
+        try:
+            await bot.edit_message_text(text, chat_id=live.chat_id, message_id=live.message_id)
+            live.text = text
+        except RetryAfter as e:
+            # The text stays the old one, so the retry sends whatever is newest by then
+            retry_after = e.retry_after
+            delay = retry_after.total_seconds() if isinstance(retry_after, timedelta) else retry_after
+            logger.warning("Flood control while editing live results for poll %s, retrying in %ss",
+                           live.poll.id, delay)
+            live.task = asyncio.get_running_loop().create_task(self._edit_later(bot, live, delay))
+        except BadRequest as e:
+            # "message is not modified" after a restart, or the message was deleted
+            if "not modified" in e.message.lower():
+                live.text = text
+            else:
+                logger.warning("Stopped live results for poll %s: %s", live.poll.id, e)
+                self._messages.pop(live.poll.id, None)
+        except TelegramError as e:
+            logger.warning("Could not edit live results for poll %s: %s", live.poll.id, e)
+        finally:
+            live.last_edit = time.monotonic()
+
+
+def _pending(live: LiveMessage) -> bool:
+    return live.task is not None and not live.task.done()
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import timedelta
+
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from database.outbox_repository import OutboxEntry, OutboxRepository
+from database.poll_repository import PollRepository
+
+logger = logging.getLogger(__name__)
+
+# BadRequest messages meaning the action already happened
+ALREADY_DONE_ERRORS = ("poll has already been closed",)
+
+
+class OutboxDispatcher:
+    """
+    Drains the outbox table: performs queued Telegram actions with retries
+    and exponential backoff. On start it drains whatever a previous process
+    left behind, so recovery after a crash needs no manual step.
+
+    Delivery is at-least-once: a crash between a successful API call and
+    mark_done repeats the call once the lease expires.
+    """
+
+    def __init__(self, outbox_repository: OutboxRepository, poll_repository: PollRepository,
+                 batch_size: int = 50, max_attempts: int = 8, base_delay: float = 1.0,
+                 max_delay: float = 300.0, lease: float = 60.0, idle_interval: float = 5.0,
+                 retention: float = 7 * 24 * 3600):
+        self.outbox_repository = outbox_repository
+        self.poll_repository = poll_repository
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease = lease
+        self.idle_interval = idle_interval
+        self.retention = retention
+        self.bot = None
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._executors = {
+            "stop_poll": self._stop_poll,
+            "send_message": self._send_message,
+        }
+
+    def start(self, bot) -> None:
+        self.bot = bot
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def wake(self) -> None:
+        """Have the background task drain now instead of after idle_interval."""
+        self._wakeup.set()
+
+    async def drain(self) -> int:
+        """Dispatch ready entries until none are left. Returns how many were attempted."""
+        if self.bot is None:
+            return 0
+        attempted = 0
+        async with self._lock:
+            while True:
+                batch = self.outbox_repository.claim_batch(self.batch_size, self.lease)
+                if not batch:
+                    return attempted
+                # A batch holds at most one entry per aggregate, so they can run concurrently
+                await asyncio.gather(*(self._dispatch(entry) for entry in batch))
+                attempted += len(batch)
+
+    async def _run(self) -> None:
+        last_purge = 0.0
+        while True:
+            try:
+                dispatched = await self.drain()
+                if dispatched:
+                    logger.info("Dispatched %s outbox entries", dispatched)
+                if time.time() - last_purge > 3600:
+                    last_purge = time.time()
+                    self.outbox_repository.purge_done(time.time() - self.retention)
+            except Exception as e:
+                logger.error("Outbox dispatcher error: %s", e, exc_info=True)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.idle_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _dispatch(self, entry: OutboxEntry) -> None:
+        executor = self._executors.get(entry.action)
+        if executor is None:
+            logger.error("Unknown outbox action %s (entry %s)", entry.action, entry.id)
+            self.outbox_repository.mark_failed(entry.id, "unknown action")
+            return
+
+        try:
+            await executor(entry)
+        except RetryAfter as e:
+            self._retry(entry, e, _seconds(e.retry_after))
+        except BadRequest as e:
+            if any(text in e.message.lower() for text in ALREADY_DONE_ERRORS):
+                logger.info("Outbox entry %s was already applied: %s", entry.idempotency_key, e.message)
+                self.outbox_repository.mark_done(entry.id)
+            else:
+                self._fail(entry, e)
+        except Forbidden as e:
+            self._fail(entry, e)
+        except (TelegramError, OSError) as e:
+            # TimedOut, NetworkError and other transient failures
+            self._retry(entry, e)
+        except Exception as e:
+            logger.error("Outbox entry %s raised: %s", entry.idempotency_key, e, exc_info=True)
+            self._retry(entry, e)
+        else:
+            self.outbox_repository.mark_done(entry.id)
+            logger.info("Outbox entry %s done", entry.idempotency_key)
+
+    def _retry(self, entry: OutboxEntry, error: Exception, delay: float = None) -> None:
+        """Schedule another attempt. An explicit delay (flood control) does not use up attempts."""
+        count_attempt = delay is None
+        if count_attempt:
+            if entry.attempts >= self.max_attempts:
+                self._fail(entry, error)
+                return
+            delay = min(self.base_delay * 2 ** (entry.attempts - 1), self.max_delay)
+            delay *= random.uniform(0.8, 1.2)
+        logger.warning("Outbox entry %s failed (attempt %s), retrying in %.1fs: %s",
+                       entry.idempotency_key, entry.attempts, delay, error)
+        self.outbox_repository.mark_retry(entry.id, str(error), time.time() + delay, count_attempt)
+
+    def _fail(self, entry: OutboxEntry, error: Exception) -> None:
+        logger.error("Outbox entry %s failed permanently after %s attempts: %s",
+                     entry.idempotency_key, entry.attempts, error)
+        self.outbox_repository.mark_failed(entry.id, str(error))
+
+    async def _stop_poll(self, entry: OutboxEntry) -> None:
+        payload = entry.payload
+        if "final_counts" not in payload:
+            stopped_poll = await self.bot.stop_poll(payload["chat_id"], payload["message_id"])
+            if not payload.get("anonymous"):
+                return
+            # A repeated stop_poll only answers "already closed", so the counts it
+            # returned are kept with the entry before anything else can fail
+            payload["final_counts"] = [option.voter_count for option in stopped_poll.options]
+            payload["total_voters"] = stopped_poll.total_voter_count
+            self.outbox_repository.update_payload(entry.id, payload)
+
+        # For anonymous polls, persist final counts
+        if not self.poll_repository.update_anonymous_poll_counts(
+                payload["poll_id"], dict(enumerate(payload["final_counts"])), payload["total_voters"]):
+            raise RuntimeError("could not persist the final counts of poll %s" % payload["poll_id"])
+        logger.info("Persisted final counts for anonymous poll %s: %s voters",
+                    payload["poll_id"], payload["total_voters"])
+
+    async def _send_message(self, entry: OutboxEntry) -> None:
+        await self.bot.send_message(entry.payload["chat_id"], entry.payload["text"])
+
+
+def _seconds(value) -> float:
+    return value.total_seconds() if isinstance(value, timedelta) else float(value)
@@ -2,24 +2,32 @@ import logging
 from telegram import Update
 from telegram.ext import ContextTypes
 from database.poll_repository import PollRepository
+from database.outbox_repository import OutboxAction
 from models.poll import Poll
+from services.vote_pubsub import vote_snapshot
+from utils.logging_setup import POLL_UPDATE, VOTE
+from utils.tracing import traced
 from utils.translations import translator
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
-# set higher logging level for httpx to avoid all GET and POST requests being logged
-logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 
 class PollService:
-    def __init__(self, poll_repository: PollRepository):
+    def __init__(self, poll_repository: PollRepository, outbox_dispatcher=None, live_results=None, pubsub=None,
+                 inline_cache=None, analytics=None):
         self.poll_repository = poll_repository
-
-    async def send_poll(self, poll: Poll, update: Update, context: ContextTypes.DEFAULT_TYPE, target_chat_id: int = None) -> None:
-        """Sends a new poll"""
+        self.outbox_dispatcher = outbox_dispatcher
+        self.live_results = live_results
+        self.pubsub = pubsub
+        self.inline_cache = inline_cache
+        self.analytics = analytics
+
+    @traced("service")
+    async def send_poll(self, poll: Poll, update: Update, context: ContextTypes.DEFAULT_TYPE, target_chat_id: int = None, user=None) -> str:
+        """
+        Sends a new poll and returns its id.
+        Callers without an update (the Web App API) pass target_chat_id and user.
+        """
 
         # Determine the chat to send to
         chat_id = target_chat_id if target_chat_id else update.effective_chat.id
@@ -47,8 +55,9 @@ class PollService:
         poll.chat_id = chat_id
 
         # Extract user info
-        user_id = update.message.from_user.id
-        user = update.message.from_user
+        if user is None:
+            user = update.message.from_user
+        user_id = user.id
 
         # Save some info about the poll the bot_data for later use in record_poll_answer
         payload = {
@@ -72,9 +81,17 @@ class PollService:
 
         # Database logic
         self.poll_repository.create_poll(poll, user_id, poll.chat_id, message.message_id)
+        self._invalidate_inline_results(user_id)
+
+        # Public polls get a results message that follows the votes
+        if self.live_results is not None and not poll.anonimity:
+            poll.results_message_id = await self.live_results.publish(context.bot, poll, poll.chat_id)
+            self.poll_repository.set_results_message_id(poll.id, poll.results_message_id)
 
         logger.info("Poll %s created and sent successfully", poll.id)
+        return poll.id
 
+    @traced("service")
     async def handle_anonymous_poll_update(self, poll, context: ContextTypes.DEFAULT_TYPE) -> None:
         """
         Handle Poll update for anonymous polls.
@@ -88,7 +105,12 @@ class PollService:
             vote_counts[i] = option.voter_count
 
         logger.info("Poll %s update - vote counts: %s, total voters: %s",
-                    poll_id, vote_counts, poll.total_voter_count)
+                    poll_id, vote_counts, poll.total_voter_count, extra=POLL_UPDATE)
+
+        if self.pubsub:
+            self.pubsub.publish(poll_id, vote_snapshot(
+                poll_id, [option.text for option in poll.options], list(vote_counts.values()),
+                poll.total_voter_count, poll.is_closed))
 
         # Check if this is our poll
         if poll_id not in context.bot_data:
@@ -108,7 +130,7 @@ class PollService:
                 self.poll_repository.update_anonymous_poll_counts(
                     poll_id, vote_counts, poll.total_voter_count)
                 logger.info(
-                    "Updated vote counts for anonymous poll %s in database", poll_id)
+                    "Updated vote counts for anonymous poll %s in database", poll_id, extra=POLL_UPDATE)
 
             # Update our poll object with current voter count
             if our_poll:
@@ -123,6 +145,7 @@ class PollService:
                         "Poll %s reached limit of %s voters, closing...", poll_id, our_poll.limit)
                     await self.close_poll(our_poll, poll_data, context)
 
+    @traced("service")
     async def record_poll_answer(self, poll: Poll, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Tracks users' poll responses and closes poll if the limit is reached."""
         import sys
@@ -133,7 +156,7 @@ class PollService:
         selected_options = answer.option_ids
 
         logger.info("Recording vote for poll %s from user %s",
-                    poll_id, user_id)
+                    poll_id, user_id, extra=VOTE)
 
         # If poll not provided, try to load it
         if not poll:
@@ -147,7 +170,7 @@ class PollService:
                 # First try to get the stored poll object
                 poll = poll_data.get("poll_object")
                 if poll:
-                    logger.info("Retrieved stored poll object from bot_data")
+                    logger.info("Retrieved stored poll object from bot_data", extra=VOTE)
                 else:
                     # Fallback: reconstruct from data (for backward compatibility)
                     votes_dict = {}
@@ -209,6 +232,11 @@ class PollService:
         self.poll_repository.record_poll_answer(
             poll, user_id, selected_options, poll.closed)
 
+        if self.live_results is not None:
+            self.live_results.notify(context.bot, poll)
+        self._publish_votes(poll)
+
+    @traced("service")
     async def retract_vote(self, poll: Poll, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Removes the votes when user clicks 'retract vote'"""
 
@@ -217,34 +245,36 @@ class PollService:
         user_id = answer.user.id  # User who voted
         self.poll_repository.remove_vote(poll_id, user_id)
 
+        # Keep the cached poll in sync so live results drop the retracted vote
+        poll_data = context.bot_data.get(poll_id)
+        if poll_data and poll_data.get("poll_object"):
+            cached_poll = poll_data["poll_object"]
+            cached_poll.votes.pop(user_id, None)
+            poll_data.get("votes", {}).pop(str(user_id), None)
+            if self.live_results is not None:
+                self.live_results.notify(context.bot, cached_poll)
+            self._publish_votes(cached_poll)
+
 
+    @traced("service")
     async def list_polls_by_user(self, user_id: int) -> list[Poll]:
         """Lists all polls created by a user"""
         return self.poll_repository.get_polls_by_user(user_id)
 
+    @traced("service")
     async def delete_poll(self, poll: Poll) -> None:
         """Deletes a poll"""
+        owner_id = self.poll_repository.get_poll_owner(poll.id) if self.inline_cache is not None else None
         self.poll_repository.delete_poll(poll.id)
+        self._invalidate_inline_results(owner_id)
 
+    @traced("service")
     async def close_poll(self, poll: Poll, poll_data: dict, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """Closes a poll when limit is reached"""
-
-        stopped_poll = await context.bot.stop_poll(poll_data["chat_id"], poll_data["message_id"])
-
-        # For anonymous polls, persist final counts
-        if poll_data.get("anonimity"):
-            final_vote_counts = {}
-            for i, option in enumerate(stopped_poll.options):
-                final_vote_counts[i] = option.voter_count
-
-            self.poll_repository.update_anonymous_poll_counts(
-                poll.id, final_vote_counts, stopped_poll.total_voter_count)
-            logger.info("Persisted final counts for anonymous poll %s: %s voters",
-                        poll.id, stopped_poll.total_voter_count)
-
-        # Update closed status in database
-        self.poll_repository.close_poll(poll.id)
-        poll.closed = True
+        """
+        Closes a poll when limit is reached.
+        The closed state and the stop_poll/notice actions commit together in the
+        outbox; the dispatcher performs the Telegram calls and retries failures.
+        """
 
         # Get the user who created the poll for language detection
         user = poll_data.get("user")
@@ -252,7 +282,52 @@ class PollService:
                                        question=poll_data['question'],
                                        limit=poll.limit)
 
-        await context.bot.send_message(
-            poll_data["chat_id"],
-            message
-        )
+        actions = [
+            OutboxAction(
+                idempotency_key=f"stop_poll:{poll.id}",
+                aggregate_id=poll.id,
+                action="stop_poll",
+                payload={
+                    "poll_id": poll.id,
+                    "chat_id": poll_data["chat_id"],
+                    "message_id": poll_data["message_id"],
+                    # For anonymous polls, final counts are persisted from the stopped poll
+                    "anonymous": bool(poll_data.get("anonimity")),
+                }),
+            OutboxAction(
+                idempotency_key=f"close_notice:{poll.id}",
+                aggregate_id=poll.id,
+                action="send_message",
+                payload={"chat_id": poll_data["chat_id"], "text": message}),
+        ]
+
+        # Update closed status in database
+        self.poll_repository.close_poll(poll.id, actions)
+        poll.closed = True
+        if user:
+            self._invalidate_inline_results(user.id)
+
+        if self.live_results is not None:
+            await self.live_results.stop(context.bot, poll)
+        if self.pubsub:
+            # Anonymous polls have no per-user votes here; close the last published counts
+            latest = self.pubsub.latest(poll.id)
+            if latest:
+                self.pubsub.publish(poll.id, {**latest, "closed": True})
+
+        if self.outbox_dispatcher:
+            self.outbox_dispatcher.wake()
+
+    def _invalidate_inline_results(self, user_id: int) -> None:
+        """Drop the cached inline search results of a user whose polls changed."""
+        if self.inline_cache is not None and user_id:
+            self.inline_cache.invalidate_user(user_id)
+
+    def _publish_votes(self, poll: Poll) -> None:
+        """Publish the counts of a non-anonymous poll to Web App subscribers."""
+        if not self.pubsub or poll.anonimity:
+            return
+        vote_counts = poll.get_vote_counts()
+        self.pubsub.publish(poll.id, vote_snapshot(
+            poll.id, poll.options, [vote_counts[i] for i in range(len(poll.options))],
+            len(poll.votes), poll.closed))
@@ -0,0 +1,81 @@
+import asyncio
+import hashlib
+import logging
+import time
+
+from cachetools import LRUCache
+from telegram import Message
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes
+
+from utils.chart import render_bar_chart
+from utils.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+RENDER_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+
+def chart_key(counts: list[int]) -> str:
+    """
+    The image depends on nothing but the counts (option names and the poll's
+    language live in the caption), so equal counts share one upload.
+    """
+    return hashlib.sha1(",".join(map(str, counts)).encode()).hexdigest()
+
+
+class ResultsChartService:
+    """Sends results charts, uploading each distinct chart once and reusing its file_id."""
+
+    def __init__(self, max_entries: int = 10000):
+        self._file_ids = LRUCache(maxsize=max_entries)
+        self.render_time = Histogram(RENDER_BUCKETS)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._file_ids)
+
+    @property
+    def hit_rate(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    async def send_chart(self, bot, chat_id: int, counts: list[int], caption: str, **kwargs) -> Message:
+        key = chart_key(counts)
+        file_id = self._file_ids.get(key)
+        if file_id:
+            try:
+                message = await bot.send_photo(chat_id, photo=file_id, caption=caption, **kwargs)
+                self.hits += 1
+                return message
+            except BadRequest as e:
+                # file_ids are bot-specific and can expire; upload again
+                logger.warning("Cached chart %s was rejected, uploading again: %s", key, e)
+                self._file_ids.pop(key, None)
+
+        self.misses += 1
+        started = time.perf_counter()
+        png = await asyncio.to_thread(render_bar_chart, counts)
+        self.render_time.observe(time.perf_counter() - started)
+        message = await bot.send_photo(chat_id, photo=png, filename="results.png", caption=caption, **kwargs)
+        self._file_ids[key] = message.photo[-1].file_id
+        return message
+
+    def report(self) -> list[str]:
+        summary = self.render_time.summary()
+        return [
+            "Results charts: %d sent, hit rate %.1f%%, %d cached file ids"
+            % (self.hits + self.misses, 100 * self.hit_rate, len(self)),
+            "Chart render: n=%d avg=%.1fms p95=%.1fms max=%.1fms"
+            % (summary["count"], summary["avg"] * 1000, summary["p95"] * 1000, summary["max"] * 1000),
+        ]
+
+
+async def report_results_charts(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Job that logs chart cache and render statistics."""
+    charts = context.bot_data.get("results_charts")
+    if charts is None or not charts.hits + charts.misses:
+        return
+    for line in charts.report():
+        logger.info(line)
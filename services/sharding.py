@@ -0,0 +1,305 @@
+"""
+Multi-process update handling.
+
+A lightweight ingress (long polling or webhook) receives raw updates and hands
+them to N worker processes. Each worker runs its own ``Application`` without an
+``Updater``. Updates are partitioned by a stable hash of the poll id (poll
+answers and poll updates) or the chat id (everything else), so all updates for
+one poll are processed in order by the same worker.
+
+``bot_data`` is per process: a worker that sees a poll for the first time
+loads it from the database, which stays the source of truth.
+
+In-memory caches are per process too. Inline queries go to the worker of
+the querying user, while votes and closes of that user's polls go to the
+workers of the polls, whose invalidations only reach their own inline
+results cache. Cached inline results can therefore show counts or an open
+state up to INLINE_RESULTS_TTL seconds old; lower it when that matters.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = 1.0
+DEFAULT_BASE_URL = "https://api.telegram.org/bot"
+
+
+def partition_key(update: dict) -> str:
+    """Return the key used to route an update to a worker."""
+    if "poll_answer" in update:
+        return "poll:%s" % update["poll_answer"]["poll_id"]
+    if "poll" in update:
+        return "poll:%s" % update["poll"]["id"]
+
+    for field in ("message", "edited_message", "channel_post", "edited_channel_post",
+                  "my_chat_member", "chat_member", "chat_join_request"):
+        if field in update:
+            return "chat:%s" % update[field]["chat"]["id"]
+
+    callback_query = update.get("callback_query")
+    if callback_query:
+        if callback_query.get("message"):
+            return "chat:%s" % callback_query["message"]["chat"]["id"]
+        return "chat:%s" % callback_query["from"]["id"]
+
+    # Inline queries and chosen inline results have no chat, only a user.
+    # A user's private chat id equals their user id, so this keeps them on the
+    # same worker as their private chat messages.
+    for field in ("inline_query", "chosen_inline_result"):
+        if field in update:
+            return "chat:%s" % update[field]["from"]["id"]
+
+    return "update:%s" % update.get("update_id", 0)
+
+
+def shard_for(update: dict, num_workers: int) -> int:
+    """Stable shard index for an update (``hash()`` is salted per process)."""
+    return zlib.crc32(partition_key(update).encode()) % num_workers
+
+
+def shard_for_poll(poll_id: str, num_workers: int) -> int:
+    """Index of the worker that handles the answers and updates of a poll."""
+    return shard_for({"poll": {"id": poll_id}}, num_workers)
+
+
+def run_update_worker(index: int, updates: multiprocessing.Queue, heartbeat, app_factory,
+                      num_workers: int = 1) -> None:
+    """Entry point of a bot worker process."""
+    asyncio.run(_serve_updates(index, updates, heartbeat, app_factory, num_workers))
+
+
+async def _serve_updates(index: int, updates: multiprocessing.Queue, heartbeat, app_factory,
+                         num_workers: int) -> None:
+    from telegram import Update
+
+    application = app_factory(with_updater=False)
+    application.bot_data["worker_index"] = index
+    application.bot_data["num_workers"] = num_workers
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    logger.info("Worker %s started", index)
+
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            heartbeat.value = time.time()
+            try:
+                data = await loop.run_in_executor(None, updates.get, True, HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                continue
+            if data is None:
+                break
+            await application.update_queue.put(Update.de_json(data, application.bot))
+    finally:
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        logger.info("Worker %s stopped", index)
+
+
+class WorkerHandle:
+    """A worker process together with its inbound queue and heartbeat."""
+
+    def __init__(self, index: int, updates: multiprocessing.Queue, heartbeat):
+        self.index = index
+        self.updates = updates
+        self.heartbeat = heartbeat
+        self.process = None
+        self.restarts = 0
+
+
+class ShardSupervisor:
+    """
+    Starts worker processes, routes updates to them and restarts workers that
+    crash or stop sending heartbeats.
+
+    worker_target is called in the child as
+    ``worker_target(index, updates, heartbeat, *worker_args)`` and must store
+    ``time.time()`` into ``heartbeat.value`` at least every HEARTBEAT_INTERVAL.
+    """
+
+    def __init__(self, num_workers: int, worker_target, worker_args: tuple = (),
+                 heartbeat_timeout: float = 30.0, queue_size: int = 10000):
+        if num_workers < 1:
+            raise ValueError("num_workers must be at least 1")
+        self.num_workers = num_workers
+        self.worker_target = worker_target
+        self.worker_args = worker_args
+        self.heartbeat_timeout = heartbeat_timeout
+        self._ctx = multiprocessing.get_context("spawn")
+        self.workers = [
+            WorkerHandle(i, self._ctx.Queue(queue_size), self._ctx.Value("d", 0.0))
+            for i in range(num_workers)
+        ]
+        self._stopping = threading.Event()
+        self._monitor = None
+
+    def start(self) -> None:
+        for worker in self.workers:
+            self._spawn(worker)
+        self._monitor = threading.Thread(
+            target=self._monitor_loop, name="shard-monitor", daemon=True)
+        self._monitor.start()
+
+    def dispatch(self, update: dict) -> None:
+        """Route a raw update to its worker. Blocks while that worker's queue is full."""
+        self.workers[shard_for(update, self.num_workers)].updates.put(update)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stopping.set()
+        for worker in self.workers:
+            worker.updates.put(None)
+        for worker in self.workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                logger.warning("Worker %s did not stop in time, terminating", worker.index)
+                worker.process.terminate()
+                worker.process.join()
+
+    def health(self) -> list[dict]:
+        """Snapshot of every worker's state."""
+        now = time.time()
+        return [
+            {
+                "worker": worker.index,
+                "pid": worker.process.pid if worker.process else None,
+                "alive": bool(worker.process and worker.process.is_alive()),
+                "heartbeat_age": round(now - worker.heartbeat.value, 3) if worker.heartbeat.value else None,
+                "queued": _qsize(worker.updates),
+                "restarts": worker.restarts,
+            }
+            for worker in self.workers
+        ]
+
+    def _spawn(self, worker: WorkerHandle) -> None:
+        # Give a fresh process a full timeout window before it must beat
+        worker.heartbeat.value = time.time()
+        worker.process = self._ctx.Process(
+            target=self.worker_target,
+            args=(worker.index, worker.updates, worker.heartbeat, *self.worker_args),
+            name="bot-worker-%s" % worker.index,
+            daemon=True,
+        )
+        worker.process.start()
+        logger.info("Started worker %s (pid %s)", worker.index, worker.process.pid)
+
+    def check_health(self) -> None:
+        """Restart workers that exited or whose heartbeat went stale."""
+        now = time.time()
+        for worker in self.workers:
+            if self._stopping.is_set():
+                return
+            if not worker.process.is_alive():
+                logger.error("Worker %s exited with code %s, restarting",
+                             worker.index, worker.process.exitcode)
+            elif now - worker.heartbeat.value > self.heartbeat_timeout:
+                logger.error("Worker %s missed heartbeats for %.1fs, restarting",
+                             worker.index, now - worker.heartbeat.value)
+                worker.process.kill()
+                worker.process.join()
+            else:
+                continue
+            worker.restarts += 1
+            # Pending updates stay in the worker's queue for the replacement
+            self._spawn(worker)
+
+    def _monitor_loop(self) -> None:
+        while not self._stopping.wait(HEARTBEAT_INTERVAL):
+            try:
+                self.check_health()
+            except Exception as e:
+                logger.error("Worker health check failed: %s", e)
+
+
+def _qsize(q) -> int:
+    try:
+        return q.qsize()
+    except NotImplementedError:  # macOS
+        return -1
+
+
+def poll_updates(token: str, supervisor: ShardSupervisor, allowed_updates: list[str] = None,
+                 base_url: str = DEFAULT_BASE_URL, timeout: int = 30) -> None:
+    """Long-poll getUpdates and hand every update to the supervisor."""
+    offset = None
+    api_url = "%s%s/" % (base_url, token)
+    with httpx.Client(timeout=timeout + 10) as client:
+        # getUpdates is refused while a webhook is set
+        client.post(api_url + "deleteWebhook")
+        while True:
+            params = {"timeout": timeout}
+            if allowed_updates is not None:
+                params["allowed_updates"] = json.dumps(allowed_updates)
+            if offset is not None:
+                params["offset"] = offset
+            try:
+                response = client.get(api_url + "getUpdates", params=params)
+                payload = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                logger.warning("getUpdates failed: %s", e)
+                time.sleep(1)
+                continue
+
+            if not payload.get("ok"):
+                logger.warning("getUpdates returned an error: %s", payload.get("description"))
+                time.sleep(payload.get("parameters", {}).get("retry_after", 1))
+                continue
+
+            for update in payload["result"]:
+                supervisor.dispatch(update)
+                offset = update["update_id"] + 1
+
+
+def serve_webhook(token: str, supervisor: ShardSupervisor, listen: str, port: int, path: str,
+                  webhook_url: str = None, secret_token: str = None, allowed_updates: list[str] = None,
+                  base_url: str = DEFAULT_BASE_URL) -> None:
+    """Accept webhook POSTs from Telegram and hand the updates to the supervisor."""
+    if webhook_url:
+        params = {"url": webhook_url}
+        if secret_token:
+            params["secret_token"] = secret_token
+        if allowed_updates is not None:
+            params["allowed_updates"] = json.dumps(allowed_updates)
+        response = httpx.post("%s%s/setWebhook" % (base_url, token), data=params)
+        logger.info("setWebhook: %s", response.json().get("description"))
+
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != path:
+                self.send_error(404)
+                return
+            if secret_token and self.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret_token:
+                self.send_error(403)
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                update = json.loads(self.rfile.read(length))
+            except ValueError:
+                self.send_error(400)
+                return
+            supervisor.dispatch(update)
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    with ThreadingHTTPServer((listen, port), WebhookHandler) as httpd:
+        logger.info("Webhook ingress listening on %s:%s%s", listen, port, path)
+        httpd.serve_forever()
@@ -0,0 +1,100 @@
+import asyncio
+
+
+class Topic:
+    __slots__ = ("latest", "version", "subscribers")
+
+    def __init__(self):
+        self.latest = None
+        self.version = 0
+        self.subscribers: set["Subscription"] = set()
+
+
+class Subscription:
+    """
+    A subscriber's view of one poll. It only holds a flag, never a queue:
+    whatever is published while the subscriber is busy collapses into the
+    latest snapshot, so slow clients skip intermediate frames.
+    """
+    __slots__ = ("topic", "_event", "seen_version")
+
+    def __init__(self, topic: Topic):
+        self.topic = topic
+        self._event = asyncio.Event()
+        self.seen_version = 0
+
+    def notify(self) -> None:
+        self._event.set()
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for a change; False when `timeout` passed without one."""
+        if self._event.is_set():
+            return True
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def take(self) -> dict:
+        """Latest snapshot if it is newer than the last one taken, else None."""
+        self._event.clear()
+        if self.topic.version == self.seen_version:
+            return None
+        self.seen_version = self.topic.version
+        return self.topic.latest
+
+
+class VotePubSub:
+    """In-process pub/sub of per-poll vote count snapshots."""
+
+    def __init__(self):
+        self._topics: dict[str, Topic] = {}
+
+    def publish(self, poll_id: str, snapshot: dict) -> None:
+        topic = self._topics.get(poll_id)
+        if topic is None:
+            # Nobody is watching; nothing to keep
+            return
+        if snapshot == topic.latest:
+            return
+        topic.latest = snapshot
+        topic.version += 1
+        for subscription in topic.subscribers:
+            subscription.notify()
+
+    def subscribe(self, poll_id: str) -> Subscription:
+        topic = self._topics.setdefault(poll_id, Topic())
+        subscription = Subscription(topic)
+        subscription.seen_version = topic.version
+        topic.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, poll_id: str, subscription: Subscription) -> None:
+        topic = self._topics.get(poll_id)
+        if topic is None:
+            return
+        topic.subscribers.discard(subscription)
+        if not topic.subscribers:
+            del self._topics[poll_id]
+
+    def latest(self, poll_id: str) -> dict:
+        topic = self._topics.get(poll_id)
+        return topic.latest if topic else None
+
+    def has_subscribers(self, poll_id: str) -> bool:
+        # Topics are dropped with their last subscriber
+        return poll_id in self._topics
+
+    def subscriber_count(self) -> int:
+        return sum(len(topic.subscribers) for topic in self._topics.values())
+
+
+def vote_snapshot(poll_id: str, options: list[str], counts: list[int], total_voters: int, closed: bool) -> dict:
+    return {
+        "poll_id": poll_id,
+        "options": list(options),
+        "counts": list(counts),
+        "total_voters": total_voters,
+        "closed": closed,
+    }
@@ -0,0 +1,129 @@
+import asyncio
+import time
+import unittest
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from telegram.error import BadRequest, RetryAfter
+
+from models.poll import Poll
+from services.live_results import LiveResultsScheduler
+
+INTERVAL = 0.05
+CHAT = -1001234567890
+
+
+class StubBot:
+    """Records edits; raises the queued errors first."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.edits = []
+
+    async def send_message(self, chat_id, text):
+        return SimpleNamespace(message_id=7)
+
+    async def edit_message_text(self, text, chat_id, message_id):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.edits.append(text)
+
+
+class LiveResultsSchedulerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.scheduler = LiveResultsScheduler(interval=INTERVAL, max_idle=3600)
+        self.poll = Poll(id="p1", question="Lunch?", options=["Pizza", "Sushi"], chat_id=CHAT)
+
+    async def publish(self, bot):
+        self.poll.results_message_id = await self.scheduler.publish(bot, self.poll, CHAT)
+
+    def vote(self, bot, user_id, option):
+        self.poll.votes[user_id] = [option]
+        self.scheduler.notify(bot, self.poll)
+
+    async def test_votes_within_an_interval_make_one_edit(self):
+        bot = StubBot()
+        await self.publish(bot)
+        for user_id in range(5):
+            self.vote(bot, user_id, user_id % 2)
+        await asyncio.sleep(INTERVAL / 2)
+        self.assertEqual(bot.edits, [])
+        await asyncio.sleep(INTERVAL)
+        self.assertEqual(bot.edits, [self.poll.get_results_summary()])
+        self.assertIn("Total voters: 5", bot.edits[0])
+
+    async def test_edits_are_spaced_by_the_interval(self):
+        bot = StubBot()
+        await self.publish(bot)
+        await asyncio.sleep(INTERVAL * 1.5)
+        self.vote(bot, 1, 0)
+        # Long enough since the last edit: sent at once
+        await asyncio.sleep(INTERVAL / 10)
+        self.assertEqual(len(bot.edits), 1)
+        self.vote(bot, 2, 1)
+        await asyncio.sleep(INTERVAL / 2)
+        self.assertEqual(len(bot.edits), 1)
+        await asyncio.sleep(INTERVAL)
+        self.assertEqual(len(bot.edits), 2)
+
+    async def test_unchanged_text_is_not_sent(self):
+        bot = StubBot()
+        await self.publish(bot)
+        self.scheduler.notify(bot, self.poll)
+        await asyncio.sleep(INTERVAL * 1.5)
+        self.assertEqual(bot.edits, [])
+
+        self.vote(bot, 1, 0)
+        await asyncio.sleep(INTERVAL * 1.5)
+        self.vote(bot, 1, 0)
+        await asyncio.sleep(INTERVAL * 1.5)
+        self.assertEqual(len(bot.edits), 1)
+
+    async def test_flood_control_retries_with_the_newest_text(self):
+        bot = StubBot(RetryAfter(timedelta(seconds=INTERVAL * 2)))
+        await self.publish(bot)
+        self.vote(bot, 1, 0)
+        await asyncio.sleep(INTERVAL * 1.5)
+        self.assertEqual(bot.edits, [])
+        # Coalesced into the pending retry
+        self.vote(bot, 2, 1)
+        await asyncio.sleep(INTERVAL * 2)
+        self.assertEqual(bot.edits, [self.poll.get_results_summary()])
+        self.assertIn("Total voters: 2", bot.edits[0])
+
+    async def test_deleted_message_stops_tracking(self):
+        bot = StubBot(BadRequest("Message to edit not found"))
+        await self.publish(bot)
+        self.vote(bot, 1, 0)
+        await asyncio.sleep(INTERVAL * 1.5)
+        self.assertEqual(len(self.scheduler), 0)
+
+    async def test_stop_sends_the_final_state(self):
+        bot = StubBot()
+        await self.publish(bot)
+        self.vote(bot, 1, 0)
+        self.poll.votes[2] = [1]
+        self.poll.closed = True
+        await self.scheduler.stop(bot, self.poll)
+        self.assertEqual(bot.edits, [self.poll.get_results_summary()])
+        self.assertEqual(len(self.scheduler), 0)
+        # The cancelled scheduled edit does not send again
+        await asyncio.sleep(INTERVAL * 1.5)
+        self.assertEqual(len(bot.edits), 1)
+
+    async def test_idle_messages_are_forgotten(self):
+        bot = StubBot()
+        scheduler = self.scheduler = LiveResultsScheduler(interval=INTERVAL, max_idle=10)
+        await self.publish(bot)
+        other = Poll(id="p2", question="Coffee?", options=["Yes", "No"], chat_id=CHAT, results_message_id=8)
+        with mock.patch("services.live_results.time.monotonic", return_value=time.monotonic() + 11):
+            scheduler.notify(bot, other)
+        self.assertEqual(len(scheduler), 1)
+        # A later vote picks the message up again
+        self.vote(bot, 1, 0)
+        self.assertEqual(len(scheduler), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
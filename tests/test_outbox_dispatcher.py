@@ -0,0 +1,84 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from telegram.error import RetryAfter, TimedOut
+
+from database.outbox_repository import DONE, FAILED, IN_FLIGHT, PENDING, OutboxAction, OutboxRepository, insert_actions
+from database.poll_db import setup_database
+from services.outbox_dispatcher import OutboxDispatcher
+
+NOW = 1_760_000_000.0
+
+
+class StubBot:
+    """Raises the queued errors in turn, then sends."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((chat_id, text))
+
+
+class OutboxDispatcherTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        handle, self.db = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.addCleanup(os.remove, self.db)
+        setup_database(self.db)
+        self.repository = OutboxRepository(self.db)
+        self.dispatcher = OutboxDispatcher(self.repository, None, max_attempts=2, base_delay=1, lease=60)
+        clock = mock.patch("time.time", return_value=NOW)
+        self.time = clock.start()
+        self.addCleanup(clock.stop)
+        with sqlite3.connect(self.db) as conn:
+            insert_actions(conn.cursor(), [OutboxAction("notice-1", "poll:p1", "send_message",
+                                                        {"chat_id": 42, "text": "Poll closed"})])
+            conn.commit()
+
+    def row(self):
+        with sqlite3.connect(self.db) as conn:
+            return conn.execute("SELECT status, attempts, next_attempt_at FROM outbox").fetchone()
+
+    async def run_until_idle(self, rounds=10):
+        for _ in range(rounds):
+            await self.dispatcher.drain()
+            status, _, next_attempt_at = self.row()
+            if status not in (PENDING, IN_FLIGHT):
+                return
+            self.time.return_value = max(self.time.return_value, next_attempt_at)
+
+    async def test_flood_control_does_not_use_up_attempts(self):
+        self.dispatcher.bot = StubBot(RetryAfter(5), RetryAfter(5), RetryAfter(5), TimedOut())
+        await self.dispatcher.drain()
+        self.assertEqual(self.row(), (PENDING, 0, NOW + 5))
+
+        await self.run_until_idle()
+        self.assertEqual(self.dispatcher.bot.sent, [(42, "Poll closed")])
+        self.assertEqual(self.row()[:2], (DONE, 2))
+
+    async def test_backoff_ignores_flood_control_waits(self):
+        self.dispatcher.bot = StubBot(RetryAfter(5), RetryAfter(5), TimedOut())
+        for _ in range(2):
+            await self.dispatcher.drain()
+            self.time.return_value = self.row()[2]
+        with mock.patch("services.outbox_dispatcher.random.uniform", return_value=1.0):
+            await self.dispatcher.drain()
+        # First counted attempt: base_delay, not base_delay * 2 ** 2
+        self.assertEqual(self.row(), (PENDING, 1, self.time.return_value + 1))
+
+    async def test_transient_errors_use_up_attempts(self):
+        self.dispatcher.bot = StubBot(TimedOut(), TimedOut(), TimedOut())
+        await self.run_until_idle()
+        self.assertEqual(self.row()[:2], (FAILED, 2))
+        self.assertEqual(self.dispatcher.bot.sent, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from database.outbox_repository import DONE, FAILED, IN_FLIGHT, PENDING, OutboxAction, OutboxRepository, insert_actions
+from database.poll_db import setup_database
+
+NOW = 1_760_000_000.0
+LEASE = 60
+
+
+class OutboxRepositoryTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.db = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.addCleanup(os.remove, self.db)
+        setup_database(self.db)
+        self.repository = OutboxRepository(self.db)
+        clock = mock.patch("database.outbox_repository.time.time", return_value=NOW)
+        self.time = clock.start()
+        self.addCleanup(clock.stop)
+
+    def queue(self, *actions):
+        with sqlite3.connect(self.db) as conn:
+            insert_actions(conn.cursor(), [OutboxAction(key, aggregate, "stop_poll", {"key": key})
+                                           for key, aggregate in actions])
+            conn.commit()
+
+    def claim(self, limit=10, lease=LEASE):
+        return [entry.idempotency_key for entry in self.repository.claim_batch(limit, lease)]
+
+    def entry_id(self, key):
+        with sqlite3.connect(self.db) as conn:
+            return conn.execute("SELECT id FROM outbox WHERE idempotency_key = ?", (key,)).fetchone()[0]
+
+    def status(self, key):
+        with sqlite3.connect(self.db) as conn:
+            return conn.execute("SELECT status, attempts, next_attempt_at, last_error FROM outbox "
+                                "WHERE idempotency_key = ?", (key,)).fetchone()
+
+    def test_claims_oldest_entry_per_aggregate(self):
+        self.queue(("a1", "poll:a"), ("b1", "poll:b"), ("a2", "poll:a"))
+        self.assertEqual(self.claim(), ["a1", "b1"])
+        # a2 waits for a1 even though a1 is only in flight
+        self.assertEqual(self.claim(), [])
+        self.repository.mark_done(self.entry_id("a1"))
+        self.assertEqual(self.claim(), ["a2"])
+
+    def test_limit(self):
+        self.queue(("a1", "poll:a"), ("b1", "poll:b"), ("c1", "poll:c"))
+        self.assertEqual(self.claim(limit=2), ["a1", "b1"])
+        self.assertEqual(self.claim(limit=2), ["c1"])
+
+    def test_claimed_entry_is_leased(self):
+        self.queue(("a1", "poll:a"))
+        [entry] = self.repository.claim_batch(10, LEASE)
+        self.assertEqual((entry.aggregate_id, entry.action, entry.payload, entry.attempts),
+                         ("poll:a", "stop_poll", {"key": "a1"}, 1))
+        self.assertEqual(self.status("a1")[:3], (IN_FLIGHT, 1, NOW + LEASE))
+
+        self.time.return_value = NOW + LEASE - 1
+        self.assertEqual(self.claim(), [])
+        # A dispatcher that died mid-call leaves the entry to be claimed again
+        self.time.return_value = NOW + LEASE
+        [entry] = self.repository.claim_batch(10, LEASE)
+        self.assertEqual((entry.idempotency_key, entry.attempts), ("a1", 2))
+
+    def test_retry_waits_for_next_attempt(self):
+        self.queue(("a1", "poll:a"), ("a2", "poll:a"))
+        self.claim()
+        self.repository.mark_retry(self.entry_id("a1"), "timed out", NOW + 30)
+        self.assertEqual(self.status("a1"), (PENDING, 1, NOW + 30, "timed out"))
+        self.assertEqual(self.claim(), [])
+        self.time.return_value = NOW + 30
+        self.assertEqual(self.claim(), ["a1"])
+        self.assertEqual(self.status("a1")[1], 2)
+
+    def test_done_and_failed_entries_are_not_claimed(self):
+        self.queue(("a1", "poll:a"), ("b1", "poll:b"))
+        self.claim()
+        self.repository.mark_done(self.entry_id("a1"))
+        self.repository.mark_failed(self.entry_id("b1"), "chat not found")
+        self.time.return_value = NOW + 2 * LEASE
+        self.assertEqual(self.claim(), [])
+        self.assertEqual(self.status("a1")[0], DONE)
+        self.assertEqual(self.status("b1")[::3], (FAILED, "chat not found"))
+        self.assertEqual(self.repository.count_unfinished(), 0)
+
+    def test_duplicate_key_is_ignored(self):
+        self.queue(("a1", "poll:a"))
+        self.queue(("a1", "poll:a"), ("a2", "poll:a"))
+        self.assertEqual(self.repository.count_unfinished(), 2)
+
+    def test_update_payload_survives_retry(self):
+        self.queue(("a1", "poll:a"))
+        [entry] = self.repository.claim_batch(10, LEASE)
+        self.repository.update_payload(entry.id, {**entry.payload, "final_counts": [3, 4]})
+        self.repository.mark_retry(entry.id, "flood", NOW)
+        [entry] = self.repository.claim_batch(10, LEASE)
+        self.assertEqual(entry.payload, {"key": "a1", "final_counts": [3, 4]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from unittest import mock
+
+from webapp.api import UserRateLimiter
+
+
+class UserRateLimiterTest(unittest.TestCase):
+    def setUp(self):
+        clock = mock.patch("webapp.api.time.monotonic", return_value=1000.0)
+        self.time = clock.start()
+        self.addCleanup(clock.stop)
+
+    def allowed(self, limiter, user_id=1, requests=20):
+        return sum(limiter.allow(user_id) for _ in range(requests))
+
+    def test_burst_then_leak(self):
+        limiter = UserRateLimiter(5, 60)
+        self.assertEqual(self.allowed(limiter), 5)
+        # One request leaks out every 12 seconds
+        self.time.return_value += 11
+        self.assertFalse(limiter.allow(1))
+        self.time.return_value += 1
+        self.assertTrue(limiter.allow(1))
+        self.assertFalse(limiter.allow(1))
+
+    def test_users_are_separate(self):
+        limiter = UserRateLimiter(2, 60)
+        self.assertEqual(self.allowed(limiter, user_id=1), 2)
+        self.assertEqual(self.allowed(limiter, user_id=2), 2)
+
+    def test_rate_below_one_per_period(self):
+        # 5 per minute shared by 8 workers
+        limiter = UserRateLimiter(5 / 8, 60)
+        self.assertEqual(self.allowed(limiter), 1)
+        self.time.return_value += 60 * 8 / 5 - 1
+        self.assertFalse(limiter.allow(1))
+        self.time.return_value += 1
+        self.assertTrue(limiter.allow(1))
+
+    def test_drained_buckets_are_swept(self):
+        limiter = UserRateLimiter(5, 60)
+        for user_id in range(100):
+            limiter.allow(user_id)
+        self.time.return_value += 61
+        limiter.allow(1000)
+        self.assertEqual(list(limiter._buckets), [1000])
+
+
+if __name__ == "__main__":
+    unittest.main()
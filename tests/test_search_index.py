@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from database.poll_repository import PollRepository
+from database.poll_db import setup_database
+from database.search_index import MAX_TERMS, match_expression
+
+OWNER = 42
+OTHER_USER = 43
+
+
+class MatchExpressionTest(unittest.TestCase):
+    def test_last_word_is_a_prefix(self):
+        self.assertEqual(match_expression(OWNER, "Lunch Fri"),
+                         'owner : "u42" AND {question options} : ("lunch" AND "fri"*)')
+
+    def test_no_words(self):
+        for text in ("", "   ", "?!", '"', "* - ( ) :"):
+            self.assertIsNone(match_expression(OWNER, text), text)
+
+    def test_quotes_are_dropped(self):
+        self.assertEqual(match_expression(OWNER, 'say "hi" there'),
+                         'owner : "u42" AND {question options} : ("say" AND "hi" AND "there"*)')
+        self.assertEqual(match_expression(OWNER, '") OR owner : "u43'),
+                         match_expression(OWNER, "or owner u43"))
+
+    def test_operators_are_searched_as_words(self):
+        self.assertEqual(match_expression(OWNER, "pizza OR NOT sushi NEAR(a b)"),
+                         'owner : "u42" AND {question options} : ("pizza" AND "or" AND "not" AND "sushi" AND '
+                         '"near" AND "a" AND "b"*)')
+        self.assertEqual(match_expression(OWNER, "-salad ^burger* question:x {owner}"),
+                         'owner : "u42" AND {question options} : ("salad" AND "burger" AND "question" AND '
+                         '"x" AND "owner"*)')
+
+    def test_at_most_max_terms(self):
+        words = ["w%d" % n for n in range(MAX_TERMS + 4)]
+        expression = match_expression(OWNER, " ".join(words))
+        self.assertIn('"w%d"*' % (MAX_TERMS - 1), expression)
+        self.assertNotIn('"w%d"' % MAX_TERMS, expression)
+
+    def test_unicode_words(self):
+        self.assertEqual(match_expression(OWNER, "Café über"),
+                         'owner : "u42" AND {question options} : ("café" AND "über"*)')
+
+
+class SearchPollsTest(unittest.TestCase):
+    """The expressions run against the index setup_database creates."""
+
+    def setUp(self):
+        handle, self.db = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.addCleanup(os.remove, self.db)
+        setup_database(self.db)
+        with sqlite3.connect(self.db) as conn:
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'polls_fts'").fetchone():
+                self.skipTest("SQLite has no FTS5")
+        self.add_poll("p1", OWNER, "Where should we go for lunch?", ["Pizza", "Sushi"])
+        self.add_poll("p2", OWNER, "Which day for the retro?", ["Monday", "Friday"])
+        self.add_poll("p3", OTHER_USER, "Where should we go for lunch?", ["Pizza", "Salad"])
+        self.repository = PollRepository(self.db)
+
+    def add_poll(self, poll_id, user_id, question, options):
+        with sqlite3.connect(self.db) as conn:
+            conn.execute("INSERT INTO polls (poll_id, user_id, chat_id, message_id, anonimity, forwarding, question, "
+                         "voters_num, closed) VALUES (?, ?, ?, 1, 0, 1, ?, 0, 0)", (poll_id, user_id, user_id, question))
+            conn.executemany("INSERT INTO poll_options (poll_id, option_text) VALUES (?, ?)",
+                             [(poll_id, text) for text in options])
+
+    def search(self, text, user_id=OWNER):
+        return [poll.id for poll in self.repository.search_polls(user_id, text)]
+
+    def test_matches_question_and_options(self):
+        self.assertEqual(self.search("lunch"), ["p1"])
+        self.assertEqual(self.search("sushi"), ["p1"])
+        self.assertEqual(self.search("where sus"), ["p1"])
+        self.assertEqual(self.search("fri"), ["p2"])
+        self.assertEqual(self.search("lunch monday"), [])
+
+    def test_only_own_polls(self):
+        self.assertEqual(self.search("salad"), [])
+        self.assertEqual(self.search("salad", user_id=OTHER_USER), ["p3"])
+        self.assertEqual(self.search('") OR owner : "u43'), [])
+
+    def test_operators_are_valid_queries(self):
+        # search_polls logs and swallows query errors, so MATCH runs here directly
+        with sqlite3.connect(self.db) as conn:
+            for text in ('lunch"', "lunch OR", "NOT lunch", "NEAR(lunch pizza)", "lunch*", "-pizza",
+                         "question: lunch", "(lunch", "lunch)", "^lunch", "AND AND", "{owner} lunch"):
+                conn.execute("SELECT rowid FROM polls_fts WHERE polls_fts MATCH ?",
+                             (match_expression(OWNER, text),)).fetchall()
+        self.assertEqual(self.search("lunch AND"), [])
+        self.assertEqual(self.search("(pizza)"), ["p1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+
+from services.sharding import partition_key, shard_for, shard_for_poll
+
+POLL_ID = "5432167890123456789"
+CHAT = {"id": -1001234567890, "type": "supergroup"}
+USER = {"id": 42, "is_bot": False, "first_name": "Ada"}
+
+
+def poll_answer(poll_id=POLL_ID, user=USER, update_id=1):
+    return {"update_id": update_id, "poll_answer": {"poll_id": poll_id, "user": user, "option_ids": [0]}}
+
+
+def poll(poll_id=POLL_ID, update_id=2):
+    return {"update_id": update_id, "poll": {"id": poll_id, "question": "Lunch?", "total_voter_count": 3}}
+
+
+def message(chat=CHAT, update_id=3):
+    return {"update_id": update_id, "message": {"message_id": 7, "chat": chat, "from": USER, "text": "/start"}}
+
+
+class PartitionKeyTest(unittest.TestCase):
+    def test_poll_updates_share_the_poll_key(self):
+        self.assertEqual(partition_key(poll_answer()), "poll:%s" % POLL_ID)
+        self.assertEqual(partition_key(poll()), "poll:%s" % POLL_ID)
+
+    def test_poll_answers_ignore_the_voter(self):
+        other_user = {**USER, "id": 43}
+        self.assertEqual(partition_key(poll_answer(user=other_user, update_id=9)), partition_key(poll_answer()))
+
+    def test_chat_updates(self):
+        self.assertEqual(partition_key(message()), "chat:%s" % CHAT["id"])
+        for field in ("edited_message", "channel_post", "my_chat_member", "chat_join_request"):
+            self.assertEqual(partition_key({"update_id": 4, field: {"chat": CHAT, "from": USER}}),
+                             "chat:%s" % CHAT["id"], field)
+
+    def test_callback_query_uses_the_message_chat(self):
+        update = {"update_id": 5, "callback_query": {"id": "1", "from": USER, "data": "close",
+                                                     "message": {"message_id": 7, "chat": CHAT}}}
+        self.assertEqual(partition_key(update), "chat:%s" % CHAT["id"])
+
+    def test_inline_callback_query_uses_the_user(self):
+        update = {"update_id": 5, "callback_query": {"id": "1", "from": USER, "inline_message_id": "AgAA"}}
+        self.assertEqual(partition_key(update), "chat:%s" % USER["id"])
+
+    def test_inline_updates_follow_the_private_chat(self):
+        private_chat = {"id": USER["id"], "type": "private"}
+        expected = partition_key(message(chat=private_chat))
+        self.assertEqual(partition_key({"update_id": 6, "inline_query": {"id": "1", "from": USER, "query": "lunch"}}),
+                         expected)
+        self.assertEqual(partition_key({"update_id": 7, "chosen_inline_result": {
+            "result_id": "poll-1", "from": USER, "query": "lunch"}}), expected)
+
+    def test_poll_and_chat_keys_do_not_collide(self):
+        self.assertNotEqual(partition_key(poll(poll_id="42")), partition_key(message(chat=USER)))
+
+    def test_unknown_update_uses_its_id(self):
+        self.assertEqual(partition_key({"update_id": 8, "business_connection": {}}), "update:8")
+
+
+class ShardForTest(unittest.TestCase):
+    def test_stable_and_in_range(self):
+        for num_workers in (1, 2, 3, 8):
+            shard = shard_for(poll_answer(), num_workers)
+            self.assertIn(shard, range(num_workers))
+            self.assertEqual(shard_for(poll_answer(), num_workers), shard)
+        self.assertEqual(shard_for(message(), 1), 0)
+
+    def test_poll_and_its_answers_go_to_one_worker(self):
+        for poll_id in ("1", "2", POLL_ID, "5432167890123456790"):
+            for num_workers in (2, 3, 8):
+                shard = shard_for_poll(poll_id, num_workers)
+                self.assertEqual(shard_for(poll_answer(poll_id=poll_id), num_workers), shard)
+                self.assertEqual(shard_for(poll(poll_id=poll_id), num_workers), shard)
+
+    def test_polls_spread_over_workers(self):
+        shards = {shard_for_poll(str(poll_id), 4) for poll_id in range(100)}
+        self.assertEqual(shards, set(range(4)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from models.poll import Poll
+from services.vote_pubsub import VotePubSub
+from webapp.api import StoredCountsPoller
+
+TICK = 0.01
+
+
+class StubRepository:
+    def __init__(self):
+        self.queries = 0
+        self.counts = [1, 2]
+        self.closed = False
+        self.deleted = False
+
+    def get_poll_with_counts(self, poll_id):
+        self.queries += 1
+        if self.deleted:
+            return None, []
+        return Poll(id=poll_id, options=["Pizza", "Sushi"], voters_num=sum(self.counts), closed=self.closed), \
+            list(self.counts)
+
+
+class StoredCountsPollerTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.repository = StubRepository()
+        self.pubsub = VotePubSub()
+        poll_service = SimpleNamespace(pubsub=self.pubsub, poll_repository=self.repository)
+        self.poller = StoredCountsPoller(SimpleNamespace(bot_data={"poll_service": poll_service}), tick=TICK)
+
+    def subscribe(self, n):
+        subscriptions = [self.pubsub.subscribe("p1") for _ in range(n)]
+        for _ in subscriptions:
+            self.poller.follow("p1")
+        return subscriptions
+
+    async def test_one_query_per_tick_for_all_streams(self):
+        subscriptions = self.subscribe(1000)
+        await asyncio.sleep(TICK * 5.5)
+        self.assertLessEqual(self.repository.queries, 6)
+        self.assertEqual([s.take()["counts"] for s in (subscriptions[0], subscriptions[-1])], [[1, 2], [1, 2]])
+
+        self.repository.counts = [2, 2]
+        await asyncio.sleep(TICK * 2)
+        self.assertEqual(subscriptions[-1].take()["counts"], [2, 2])
+        # Unchanged counts publish nothing
+        await asyncio.sleep(TICK * 2)
+        self.assertIsNone(subscriptions[-1].take())
+
+    async def test_stops_without_subscribers(self):
+        [subscription] = self.subscribe(1)
+        await asyncio.sleep(TICK * 2)
+        self.pubsub.unsubscribe("p1", subscription)
+        await asyncio.sleep(TICK * 2)
+        queries = self.repository.queries
+        await asyncio.sleep(TICK * 3)
+        self.assertEqual(self.repository.queries, queries)
+        self.assertEqual(self.poller._tasks, {})
+
+    async def test_stops_when_closed(self):
+        [subscription] = self.subscribe(1)
+        self.repository.closed = True
+        await asyncio.sleep(TICK * 2)
+        self.assertTrue(subscription.take()["closed"])
+        self.assertEqual(self.poller._tasks, {})
+        # A new stream of the same poll starts a new poller
+        self.poller.follow("p1")
+        self.assertEqual(list(self.poller._tasks), ["p1"])
+        self.pubsub.unsubscribe("p1", subscription)
+
+    async def test_deleted_poll_ends_streams(self):
+        [subscription] = self.subscribe(1)
+        await asyncio.sleep(TICK * 1.5)
+        subscription.take()
+        self.repository.deleted = True
+        await asyncio.sleep(TICK * 1.5)
+        self.assertEqual(subscription.take(), {"poll_id": "p1", "options": ["Pizza", "Sushi"], "counts": [1, 2],
+                                               "total_voters": 3, "closed": True})
+        self.assertEqual(self.poller._tasks, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import random
+import sqlite3
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import main
+from database.poll_db import setup_database
+from database.timeline_repository import (RESOLUTIONS, TimelinePoint, TimelineRepository, insert_count_snapshot,
+                                          record_vote_activity)
+
+NOW = 1_760_000_000.0
+CHAT = -1001234567890
+HOUR = 3600
+
+
+class TimelineRepositoryTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.db = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.addCleanup(os.remove, self.db)
+        setup_database(self.db)
+        self.repository = TimelineRepository(self.db)
+        clock = mock.patch("database.timeline_repository.time.time", return_value=NOW)
+        self.time = clock.start()
+        self.addCleanup(clock.stop)
+        with sqlite3.connect(self.db) as conn:
+            for poll_id, chat_id in (("p1", CHAT), ("p2", CHAT), ("p3", 42)):
+                conn.execute("INSERT INTO polls (poll_id, user_id, chat_id, message_id, anonimity, forwarding, "
+                             "question, voters_num, closed) VALUES (?, 42, ?, 1, 0, 1, 'Lunch?', 0, 0)",
+                             (poll_id, chat_id))
+
+    def vote(self, poll_id, at):
+        """A vote as PollRepository.record_poll_answer stores it: the raw row and its rollups together."""
+        with sqlite3.connect(self.db) as conn:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO votes (poll_id, user_id, option_id, voted_at) VALUES (?, 1, 1, ?)",
+                           (poll_id, at))
+            record_vote_activity(cursor, poll_id, at, votes=1)
+
+    def raw_series(self, where, params, width):
+        """The series computed from the raw votes instead of the rollups."""
+        with sqlite3.connect(self.db) as conn:
+            rows = conn.execute(f"""
+                SELECT CAST(voted_at / ? AS INTEGER) * ?, COUNT(*) FROM votes JOIN polls USING (poll_id)
+                WHERE {where} GROUP BY 1 ORDER BY 1
+            """, (width, width, *params)).fetchall()
+        return [TimelinePoint(bucket, votes, 0) for bucket, votes in rows]
+
+    def test_series_match_raw_votes(self):
+        rng = random.Random(7)
+        for _ in range(500):
+            self.vote(rng.choice(("p1", "p1", "p2", "p3")), NOW - 3 * HOUR * rng.random())
+        for resolution, width in RESOLUTIONS.items():
+            self.assertEqual(self.repository.poll_series("p1", resolution),
+                             self.raw_series("poll_id = ?", ("p1",), width), resolution)
+            self.assertEqual(self.repository.chat_series(CHAT, resolution),
+                             self.raw_series("chat_id = ?", (CHAT,), width), resolution)
+
+    def test_bucket_edges(self):
+        minute = int(NOW // 60) * 60
+        for at in (minute - 0.001, minute, minute + 59.999):
+            self.vote("p1", at)
+        self.assertEqual(self.repository.poll_series("p1", "minute"),
+                         [TimelinePoint(minute - 60, 1, 0), TimelinePoint(minute, 2, 0)])
+        self.assertEqual(sum(point.votes for point in self.repository.poll_series("p1", "hour")), 3)
+
+    def test_series_window(self):
+        for at in (NOW - 2 * HOUR, NOW - HOUR, NOW - 60):
+            self.vote("p1", at)
+        series = self.repository.poll_series("p1", "minute", start=NOW - HOUR - 60, end=NOW - 120)
+        self.assertEqual([point.bucket for point in series], [int((NOW - HOUR) // 60) * 60])
+
+    def test_retracted_votes(self):
+        minute = int(NOW // 60) * 60
+        with sqlite3.connect(self.db) as conn:
+            record_vote_activity(conn.cursor(), "p1", minute + 1, votes=3)
+            record_vote_activity(conn.cursor(), "p1", minute + 2, retracted=1)
+            record_vote_activity(conn.cursor(), "p1", minute + 3)
+        self.assertEqual(self.repository.poll_series("p1", "minute"), [TimelinePoint(minute, 3, 1)])
+
+    def test_peak_buckets(self):
+        for at in [NOW - 600] * 3 + [NOW - 300] * 5:
+            self.vote("p1", at)
+        self.vote("p3", NOW - 60)
+        self.vote("p3", NOW - 60)
+        peaks = self.repository.peak_buckets(resolution="minute", limit=2)
+        self.assertEqual([(point.bucket, point.votes) for point in peaks],
+                         [(int((NOW - 300) // 60) * 60, 5), (int((NOW - 600) // 60) * 60, 3)])
+        self.assertEqual([point.votes for point in self.repository.peak_buckets(chat_id=42)], [2])
+
+    def test_purge(self):
+        for at in (NOW - 8 * 24 * HOUR, NOW - 6 * 24 * HOUR, NOW - 60):
+            self.vote("p1", at)
+        self.assertEqual(self.repository.purge("minute", 7 * 24 * HOUR), 1)
+        self.assertEqual(len(self.repository.poll_series("p1", "minute")), 2)
+        # Only the resolution purged loses buckets
+        self.assertEqual(len(self.repository.poll_series("p1", "hour")), 3)
+
+    def test_count_snapshots(self):
+        with sqlite3.connect(self.db) as conn:
+            insert_count_snapshot(conn.cursor(), "p1", {1: 2, 0: 1}, 3, at=NOW - 10)
+            insert_count_snapshot(conn.cursor(), "p1", {0: 1, 1: 4}, 5, at=NOW)
+        self.assertEqual(self.repository.count_snapshots("p1"), [(NOW - 10, 3, [1, 2]), (NOW, 5, [1, 4])])
+
+    def test_unknown_resolution(self):
+        with self.assertRaises(ValueError):
+            self.repository.poll_series("p1", "day")
+
+
+class PurgeJobTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.repository = mock.Mock(spec=TimelineRepository)
+        self.repository.purge.return_value = 3
+
+    def context(self, **bot_data):
+        return SimpleNamespace(bot_data=bot_data, job=SimpleNamespace(data=(self.repository, 7 * 24 * HOUR)))
+
+    async def test_purges_minute_rollups(self):
+        await main.purge_vote_rollups(self.context())
+        self.repository.purge.assert_called_once_with("minute", 7 * 24 * HOUR)
+
+    async def test_one_sharded_worker_purges(self):
+        await main.purge_vote_rollups(self.context(worker_index=0, num_workers=2))
+        await main.purge_vote_rollups(self.context(worker_index=1, num_workers=2))
+        self.assertEqual(self.repository.purge.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import hashlib
+import hmac
+import json
+import time
+import unittest
+from urllib.parse import urlencode
+
+from utils.webapp_auth import InitDataError, verify_init_data
+
+TOKEN = "123456:TEST-TOKEN"
+USER = {"id": 42, "first_name": "Ada", "language_code": "en"}
+
+
+def sign(fields: dict, token: str = TOKEN) -> str:
+    """initData as Telegram builds it: the fields plus their HMAC under the bot token."""
+    data_check_string = "\n".join(f"{key}={fields[key]}" for key in sorted(fields))
+    secret_key = hmac.new(b"WebAppData", token.encode(), hashlib.sha256).digest()
+    return urlencode({**fields, "hash": hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()})
+
+
+def init_fields(auth_date: float = None) -> dict:
+    return {
+        "query_id": "AAHdF6IQAAAAAN0XohDhrOrc",
+        "user": json.dumps(USER),
+        "auth_date": str(int(time.time() if auth_date is None else auth_date)),
+    }
+
+
+class VerifyInitDataTest(unittest.TestCase):
+    def test_valid_signature(self):
+        fields = verify_init_data(sign(init_fields()), TOKEN)
+        self.assertEqual(fields["user"], USER)
+        self.assertEqual(fields["query_id"], "AAHdF6IQAAAAAN0XohDhrOrc")
+        self.assertNotIn("hash", fields)
+
+    def test_tampered_field(self):
+        init_data = sign(init_fields())
+        tampered = init_data.replace("%22id%22%3A+42", "%22id%22%3A+43")
+        self.assertNotEqual(tampered, init_data)
+        with self.assertRaisesRegex(InitDataError, "signature"):
+            verify_init_data(tampered, TOKEN)
+
+    def test_added_field(self):
+        with self.assertRaisesRegex(InitDataError, "signature"):
+            verify_init_data(sign(init_fields()) + "&start_param=admin", TOKEN)
+
+    def test_wrong_token(self):
+        with self.assertRaisesRegex(InitDataError, "signature"):
+            verify_init_data(sign(init_fields(), token="654321:OTHER-TOKEN"), TOKEN)
+
+    def test_stale_auth_date(self):
+        init_data = sign(init_fields(auth_date=time.time() - 2 * 3600))
+        with self.assertRaisesRegex(InitDataError, "expired"):
+            verify_init_data(init_data, TOKEN, max_age=3600)
+        # Within the allowed age it passes
+        self.assertEqual(verify_init_data(init_data, TOKEN, max_age=3 * 3600)["user"], USER)
+
+    def test_missing_hash(self):
+        with self.assertRaisesRegex(InitDataError, "no hash"):
+            verify_init_data(urlencode(init_fields()), TOKEN)
+
+    def test_missing_init_data(self):
+        with self.assertRaisesRegex(InitDataError, "missing"):
+            verify_init_data("", TOKEN)
+
+    def test_invalid_user_json(self):
+        fields = {**init_fields(), "user": "{not json"}
+        with self.assertRaisesRegex(InitDataError, "JSON"):
+            verify_init_data(sign(fields), TOKEN)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+"""
+HTTP transport for Bot API calls.
+
+getUpdates long-polls on its own connection pool so it never competes with
+send_poll / stop_poll fan-out for connections. Both pools are configured from
+the environment (a .env file works too, it is loaded by main.py):
+
+    BOT_API_BASE_URL                  API endpoint the token is appended to, e.g. a
+                                      local Bot API server (https://api.telegram.org/bot)
+    BOT_API_POOL_SIZE                 connections for normal API calls (256)
+    BOT_API_KEEPALIVE_CONNECTIONS     idle connections kept open (= pool size)
+    BOT_API_KEEPALIVE_EXPIRY          seconds an idle connection is kept (30)
+    BOT_API_HTTP2                     "true" to use HTTP/2 (needs httpx[http2], else 1.1)
+    BOT_API_CONNECT_TIMEOUT           seconds (5)
+    BOT_API_READ_TIMEOUT              seconds (5)
+    BOT_API_WRITE_TIMEOUT             seconds (5)
+    BOT_API_POOL_TIMEOUT              seconds to wait for a free connection (1)
+    BOT_API_GET_UPDATES_POOL_SIZE     connections for getUpdates (1)
+    BOT_API_GET_UPDATES_READ_TIMEOUT  seconds, on top of the long-poll timeout (5)
+    BOT_API_LATENCY_REPORT_INTERVAL   seconds between latency reports, 0 disables (300)
+"""
+import dataclasses
+import importlib.util
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+import httpx
+from telegram.request import HTTPXRequest
+
+from utils.metrics import registry
+from utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Shared by every request object so one report covers all endpoints
+bot_api_latency = registry.latency("telegram_bot_api_request", "Bot API request latency by method", "method")
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass
+class TransportConfig:
+    base_url: str = None
+    pool_size: int = 256
+    keepalive_connections: int = None
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+    connect_timeout: float = 5.0
+    read_timeout: float = 5.0
+    write_timeout: float = 5.0
+    pool_timeout: float = 1.0
+    get_updates_pool_size: int = 1
+    get_updates_read_timeout: float = 5.0
+    latency_report_interval: float = 300.0
+
+    @classmethod
+    def from_env(cls) -> "TransportConfig":
+        pool_size = int(os.getenv("BOT_API_POOL_SIZE", cls.pool_size))
+        return cls(
+            base_url=os.getenv("BOT_API_BASE_URL") or None,
+            pool_size=pool_size,
+            keepalive_connections=int(os.getenv("BOT_API_KEEPALIVE_CONNECTIONS", pool_size)),
+            keepalive_expiry=float(os.getenv("BOT_API_KEEPALIVE_EXPIRY", cls.keepalive_expiry)),
+            http2=_env_bool("BOT_API_HTTP2"),
+            connect_timeout=float(os.getenv("BOT_API_CONNECT_TIMEOUT", cls.connect_timeout)),
+            read_timeout=float(os.getenv("BOT_API_READ_TIMEOUT", cls.read_timeout)),
+            write_timeout=float(os.getenv("BOT_API_WRITE_TIMEOUT", cls.write_timeout)),
+            pool_timeout=float(os.getenv("BOT_API_POOL_TIMEOUT", cls.pool_timeout)),
+            get_updates_pool_size=int(os.getenv("BOT_API_GET_UPDATES_POOL_SIZE", cls.get_updates_pool_size)),
+            get_updates_read_timeout=float(
+                os.getenv("BOT_API_GET_UPDATES_READ_TIMEOUT", cls.get_updates_read_timeout)),
+            latency_report_interval=float(
+                os.getenv("BOT_API_LATENCY_REPORT_INTERVAL", cls.latency_report_interval)),
+        )
+
+
+class InstrumentedHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest that records per-endpoint latency into bot_api_latency."""
+
+    async def do_request(self, url: str, method: str, request_data=None, *args, **kwargs) -> tuple[int, bytes]:
+        # The Bot API method is the last path segment: .../bot<token>/sendPoll
+        endpoint = url.rsplit("/", 1)[-1]
+        started = time.perf_counter()
+        status = None
+        try:
+            with span("bot_api:" + endpoint):
+                status, content = await super().do_request(url, method, request_data, *args, **kwargs)
+            return status, content
+        finally:
+            bot_api_latency.observe(
+                endpoint, time.perf_counter() - started, error=status is None or status >= 400)
+
+
+def _build_request(config: TransportConfig, pool_size: int, keepalive: int,
+                   read_timeout: float, ssl_context) -> InstrumentedHTTPXRequest:
+    return InstrumentedHTTPXRequest(
+        connection_pool_size=pool_size,
+        connect_timeout=config.connect_timeout,
+        read_timeout=read_timeout,
+        write_timeout=config.write_timeout,
+        pool_timeout=config.pool_timeout,
+        http_version="2" if config.http2 else "1.1",
+        httpx_kwargs={
+            "verify": ssl_context,
+            "limits": httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=keepalive,
+                keepalive_expiry=config.keepalive_expiry,
+            )
+        },
+    )
+
+
+def build_requests(config: TransportConfig) -> tuple[InstrumentedHTTPXRequest, InstrumentedHTTPXRequest]:
+    """Return (request for API calls, request for getUpdates)."""
+    if config.http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("BOT_API_HTTP2 is set but the h2 package is missing (pip install 'httpx[http2]'), "
+                       "using HTTP/1.1")
+        config = dataclasses.replace(config, http2=False)
+    # Loading the CA bundle is the slowest part of creating a client, so
+    # both share one context instead of each loading their own
+    ssl_context = httpx.create_ssl_context()
+    request = _build_request(
+        config, config.pool_size, config.keepalive_connections or config.pool_size, config.read_timeout,
+        ssl_context)
+    get_updates_request = _build_request(
+        config, config.get_updates_pool_size, config.get_updates_pool_size, config.get_updates_read_timeout,
+        ssl_context)
+    logger.info("Bot API transport: pool=%s keepalive=%s/%ss http2=%s getUpdates pool=%s",
+                config.pool_size, config.keepalive_connections, config.keepalive_expiry,
+                config.http2, config.get_updates_pool_size)
+    return request, get_updates_request
+
+
+async def report_bot_api_latency(context) -> None:
+    """Job callback logging the per-endpoint latency histograms."""
+    lines = bot_api_latency.report()
+    if lines:
+        logger.info("Bot API latency since start:\n  %s", "\n  ".join(lines))
@@ -0,0 +1,129 @@
+"""
+Pure-Python PNG bar charts of poll results.
+
+Each option is a numbered horizontal bar with its vote count and share.
+Only digits and a few symbols are drawn (from the 5x7 pixel font below), so
+option texts in any language go into the message caption, keyed by the same
+numbers. Pixels are palette indexes in one bytearray per row, and bars are
+filled with slice assignment, so a chart renders in a few milliseconds.
+"""
+import struct
+import zlib
+
+WIDTH = 640
+PADDING = 16
+ROW_HEIGHT = 36
+ROW_GAP = 12
+SCALE = 3  # glyph pixel size
+GLYPH_WIDTH, GLYPH_HEIGHT = 5, 7
+
+BACKGROUND, TRACK, BAR, LEADER, TEXT = range(5)
+PALETTE = (
+    (0xFF, 0xFF, 0xFF),  # background
+    (0xE8, 0xEE, 0xF3),  # empty bar track
+    (0x8C, 0xC8, 0xEA),  # bar
+    (0x2A, 0xAB, 0xEE),  # bar of the leading option(s)
+    (0x22, 0x22, 0x22),  # text
+)
+
+FONT = {
+    "0": ("01110", "10001", "10011", "10101", "11001", "10001", "01110"),
+    "1": ("00100", "01100", "00100", "00100", "00100", "00100", "01110"),
+    "2": ("01110", "10001", "00001", "00010", "00100", "01000", "11111"),
+    "3": ("11110", "00001", "00001", "01110", "00001", "00001", "11110"),
+    "4": ("00010", "00110", "01010", "10010", "11111", "00010", "00010"),
+    "5": ("11111", "10000", "11110", "00001", "00001", "10001", "01110"),
+    "6": ("00110", "01000", "10000", "11110", "10001", "10001", "01110"),
+    "7": ("11111", "00001", "00010", "00100", "01000", "01000", "01000"),
+    "8": ("01110", "10001", "10001", "01110", "10001", "10001", "01110"),
+    "9": ("01110", "10001", "10001", "01111", "00001", "00010", "01100"),
+    "%": ("11000", "11001", "00010", "00100", "01000", "10011", "00011"),
+    ".": ("00000", "00000", "00000", "00000", "00000", "01100", "01100"),
+    " ": ("00000",) * 7,
+}
+
+
+def _runs(line: str) -> list[tuple[int, int]]:
+    """(start, end) column spans of the set pixels in one glyph row."""
+    runs, start = [], None
+    for x, bit in enumerate(line + "0"):
+        if bit == "1" and start is None:
+            start = x
+        elif bit != "1" and start is not None:
+            runs.append((start, x))
+            start = None
+    return runs
+
+
+GLYPH_RUNS = {char: [_runs(line) for line in glyph] for char, glyph in FONT.items()}
+
+
+def text_width(text: str) -> int:
+    return len(text) * (GLYPH_WIDTH + 1) * SCALE - SCALE if text else 0
+
+
+class Canvas:
+    def __init__(self, width: int, height: int, color: int = BACKGROUND):
+        self.width = width
+        self.height = height
+        self.rows = [bytearray([color]) * width for _ in range(height)]
+
+    def fill(self, x0: int, y0: int, x1: int, y1: int, color: int) -> None:
+        x0, x1 = max(0, x0), min(self.width, x1)
+        if x1 <= x0:
+            return
+        span = bytes([color]) * (x1 - x0)
+        for y in range(max(0, y0), min(self.height, y1)):
+            self.rows[y][x0:x1] = span
+
+    def text(self, x: int, y: int, text: str, color: int = TEXT) -> None:
+        for char in text:
+            for gy, runs in enumerate(GLYPH_RUNS.get(char, GLYPH_RUNS[" "])):
+                py = y + gy * SCALE
+                for start, end in runs:
+                    self.fill(x + start * SCALE, py, x + end * SCALE, py + SCALE, color)
+            x += (GLYPH_WIDTH + 1) * SCALE
+
+    def to_png(self) -> bytes:
+        def chunk(kind: bytes, data: bytes) -> bytes:
+            return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+        header = struct.pack(">IIBBBBB", self.width, self.height, 8, 3, 0, 0, 0)  # 8-bit palette
+        palette = b"".join(bytes(color) for color in PALETTE)
+        # A row equal to the one above is sent with filter 2 (Up) as zeros,
+        # others unfiltered; bars repeat rows, so this compresses well and fast
+        lines = []
+        zeros = bytes(self.width)
+        previous = None
+        for row in self.rows:
+            lines.append(b"\x02" + zeros if row == previous else b"\x00" + bytes(row))
+            previous = row
+        raw = b"".join(lines)
+        return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"PLTE", palette)
+                + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b""))
+
+
+def render_bar_chart(counts: list[int]) -> bytes:
+    """PNG with one numbered bar per count, labelled "count share%"."""
+    rows = max(1, len(counts))
+    height = PADDING * 2 + rows * ROW_HEIGHT + (rows - 1) * ROW_GAP
+    canvas = Canvas(WIDTH, height)
+
+    total = sum(counts)
+    top = max(counts, default=0)
+    labels = ["%d %d%%" % (count, round(100 * count / total) if total else 0) for count in counts]
+    index_width = text_width(str(rows)) + PADDING
+    label_width = max((text_width(label) for label in labels), default=0) + PADDING
+    bar_x0 = PADDING + index_width
+    bar_x1 = WIDTH - PADDING - label_width
+    text_offset = (ROW_HEIGHT - GLYPH_HEIGHT * SCALE) // 2
+
+    for i, count in enumerate(counts):
+        y = PADDING + i * (ROW_HEIGHT + ROW_GAP)
+        canvas.text(PADDING, y + text_offset, str(i + 1))
+        canvas.fill(bar_x0, y, bar_x1, y + ROW_HEIGHT, TRACK)
+        if count:
+            filled = max(SCALE, round((bar_x1 - bar_x0) * count / top))
+            canvas.fill(bar_x0, y, bar_x0 + filled, y + ROW_HEIGHT, LEADER if count == top else BAR)
+        canvas.text(bar_x1 + PADDING, y + text_offset, labels[i])
+    return canvas.to_png()
@@ -0,0 +1,133 @@
+"""
+Process-wide logging setup, called once from main.
+
+Log calls only put the record on a queue (QueueHandler); a QueueListener
+thread formats it and writes it out, so the event loop never formats
+messages or waits on stream I/O. Only the message arguments are merged
+before queueing, so that mutable arguments are logged as they were at the
+call; timestamps, exceptions and the line layout are formatted by the
+listener.
+
+High-volume events are sampled before they are queued. A log call tagged
+with an event, e.g. logger.info("...", extra=VOTE), is kept with the
+rate configured for that event; warnings and errors are always kept.
+
+    LOG_LEVEL          root level (INFO)
+    LOG_FORMAT         "text" or "json" (text)
+    LOG_FILE           write to this file instead of stderr
+    LOG_SAMPLE_RATES   event=rate pairs (vote=0.1,poll_update=0.1)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+DEFAULT_SAMPLE_RATES = "vote=0.1,poll_update=0.1"
+
+# extra= tags of the high-volume events
+VOTE = {"event": "vote"}
+POLL_UPDATE = {"event": "poll_update"}
+
+_listener = None
+
+
+def parse_sample_rates(value: str) -> dict[str, float]:
+    rates = {}
+    for pair in value.replace(" ", "").split(","):
+        if pair:
+            event, rate = pair.split("=", 1)
+            rates[event] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class EventSampler(logging.Filter):
+    """Keeps a `rate` share of the records of each sampled event below WARNING."""
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, "event", None)
+        if event is None or record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(event, 1.0)
+        if rate >= 1.0:
+            return True
+        record.sample_rate = rate
+        return random.random() < rate
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # A dict or Poll passed as an argument may change before the listener
+        # gets to it; the rest of the formatting can wait
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        event = getattr(record, "event", None)
+        if event is not None:
+            entry["event"] = event
+            entry["sample_rate"] = getattr(record, "sample_rate", 1.0)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """Route all logging through one queue and listener thread; safe to call twice."""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    log_file = os.getenv("LOG_FILE")
+    output = logging.FileHandler(log_file, encoding="utf-8") if log_file else logging.StreamHandler()
+    if os.getenv("LOG_FORMAT", "text").strip().lower() == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    records = queue.SimpleQueue()
+    handler = DeferredQueueHandler(records)
+    handler.addFilter(EventSampler(parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", DEFAULT_SAMPLE_RATES))))
+
+    # Neither format uses the thread or process, so records skip collecting them
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").strip().upper())
+    # set higher logging level for httpx to avoid all GET and POST requests being logged
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+    # Flushes what is still queued when the process exits
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """Write out the queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,201 @@
+"""
+Event-loop stall detector.
+
+A ticker task wakes up every `interval` seconds and a monitor thread checks
+that it keeps doing so. When the loop has not ticked for longer than
+`threshold`, the loop is blocked by synchronous code (SQLite, logging,
+rendering...), so the monitor grabs the stack of the event-loop thread at
+that moment. The stall is tagged with the update being processed and the
+innermost frame from handlers/ or services/, and kept in a rolling report.
+
+Cost: one asyncio.sleep wake-up and one thread wake-up per interval, plus a
+stack capture per stall.
+"""
+import asyncio
+import contextlib
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass, field
+
+from utils.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_HANDLER_DIRS = tuple(os.path.join(_PROJECT_ROOT, d) + os.sep for d in ("handlers", "services"))
+_ASYNCIO_DIR = os.path.dirname(asyncio.__file__) + os.sep
+
+# Checked in order, the first one set on the update wins
+UPDATE_TYPES = (
+    "message", "edited_message", "callback_query", "inline_query", "chosen_inline_result",
+    "poll", "poll_answer", "my_chat_member", "chat_member", "channel_post", "edited_channel_post",
+)
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Type of the update being processed in the current context
+_current_update_type = contextvars.ContextVar("current_update_type", default=None)
+
+
+def update_type(update) -> str:
+    for name in UPDATE_TYPES:
+        if getattr(update, name, None) is not None:
+            return name
+    return type(update).__name__
+
+
+@dataclass
+class Stall:
+    detected_at: float
+    update_type: str
+    handler: str
+    stack: list[str] = field(default_factory=list)
+    duration: float = None
+
+
+class LoopWatchdog:
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05, report_size: int = 100):
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls: deque[Stall] = deque(maxlen=report_size)
+        self.lag = Histogram(LAG_BUCKETS)
+        self.current_update_type = None
+        self._tick = (0, time.monotonic())
+        self._pending: tuple[int, Stall] = None
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @contextlib.contextmanager
+    def tracking(self, update):
+        """
+        Tag stalls with `update` while it is processed. The monitor thread
+        cannot read the loop's context, so the type is mirrored into
+        current_update_type, which falls back to the enclosing value (none
+        between updates) when processing ends, however it ends.
+        """
+        token = _current_update_type.set(update_type(update))
+        self.current_update_type = _current_update_type.get()
+        try:
+            yield
+        finally:
+            _current_update_type.reset(token)
+            self.current_update_type = _current_update_type.get()
+
+    def start(self) -> None:
+        """Start watching the running event loop."""
+        self._loop_thread_id = threading.get_ident()
+        self._tick = (0, time.monotonic())
+        self._task = asyncio.get_running_loop().create_task(self._ticker())
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info("Event-loop watchdog started (threshold %.0fms)", self.threshold * 1000)
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _ticker(self) -> None:
+        while True:
+            seq, ticked_at = self._tick
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - ticked_at - self.interval, 0.0)
+            self.lag.observe(lag)
+            self._tick = (seq + 1, now)
+
+            pending = self._pending
+            if pending and pending[0] == seq:
+                self._pending = None
+                stall = pending[1]
+                stall.duration = lag
+                self.stalls.append(stall)
+                logger.warning("Event loop blocked for %.0fms in %s (%s update)\n%s",
+                               lag * 1000, stall.handler, stall.update_type, "".join(stall.stack))
+
+    def _monitor(self) -> None:
+        captured_seq = None
+        while not self._stop.wait(self.interval):
+            seq, ticked_at = self._tick
+            if seq == captured_seq:
+                continue
+            if time.monotonic() - ticked_at - self.interval > self.threshold:
+                captured_seq = seq
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = _strip_event_loop_frames(traceback.extract_stack(frame)) if frame else []
+                self._pending = (seq, Stall(
+                    detected_at=time.time(),
+                    update_type=self.current_update_type or "-",
+                    handler=_innermost_handler(stack),
+                    stack=traceback.format_list(stack),
+                ))
+
+    def report(self) -> dict:
+        """Stalls in the rolling window grouped by handler, plus loop lag percentiles."""
+        by_handler = {}
+        for stall in self.stalls:
+            entry = by_handler.setdefault(stall.handler, {
+                "count": 0, "total_ms": 0.0, "max_ms": 0.0, "update_types": set()})
+            duration_ms = (stall.duration or 0.0) * 1000
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["update_types"].add(stall.update_type)
+        for entry in by_handler.values():
+            entry["update_types"] = sorted(entry["update_types"])
+        return {"lag": self.lag.summary(), "stalls": by_handler}
+
+
+def _strip_event_loop_frames(stack: traceback.StackSummary) -> traceback.StackSummary:
+    """Drop the event loop's own frames, keeping the callback that blocks it."""
+    for i in range(len(stack) - 1, -1, -1):
+        if stack[i].filename.startswith(_ASYNCIO_DIR):
+            return traceback.StackSummary.from_list(stack[i + 1:])
+    return stack
+
+
+def _innermost_handler(stack: traceback.StackSummary) -> str:
+    for frame in reversed(stack):
+        if frame.filename.startswith(_HANDLER_DIRS):
+            module = os.path.relpath(frame.filename, _PROJECT_ROOT)[:-3].replace(os.sep, ".")
+            return "%s.%s" % (module, frame.name)
+    return stack[-1].name if stack else "-"
+
+
+def watchdog_from_env():
+    """Return a LoopWatchdog if LOOP_WATCHDOG is enabled, else None."""
+    if os.getenv("LOOP_WATCHDOG", "").strip().lower() not in ("1", "true", "yes", "on"):
+        return None
+    return LoopWatchdog(
+        threshold=float(os.getenv("LOOP_WATCHDOG_THRESHOLD_MS", "100")) / 1000,
+        interval=float(os.getenv("LOOP_WATCHDOG_INTERVAL_MS", "50")) / 1000,
+        report_size=int(os.getenv("LOOP_WATCHDOG_REPORT_SIZE", "100")),
+    )
+
+
+async def report_loop_stalls(context) -> None:
+    """Job callback logging the rolling stall report."""
+    watchdog = context.bot_data.get("loop_watchdog")
+    if not watchdog:
+        return
+    report = watchdog.report()
+    lag = report["lag"]
+    lines = ["%s: %d stalls, max %.0fms, total %.0fms (%s)" % (
+        handler, entry["count"], entry["max_ms"], entry["total_ms"], ", ".join(entry["update_types"]))
+        for handler, entry in sorted(report["stalls"].items(), key=lambda item: -item[1]["total_ms"])]
+    logger.info("Event loop lag p50<=%.0fms p99<=%.0fms max=%.0fms; stalls:\n  %s",
+                lag["p50"] * 1000, lag["p99"] * 1000, lag["max"] * 1000,
+                "\n  ".join(lines) if lines else "none")
@@ -0,0 +1,287 @@
+import bisect
+import functools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from a fast local call to a slow Bot API request
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram. observe() is O(log buckets) and allocates nothing."""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # One extra slot for observations above the last bucket (+Inf)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> float:
+        """
+        Estimate the q-th percentile (0-100) as the upper bound of the bucket
+        holding it. Observations above the last bucket report the maximum.
+        """
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def cumulative_counts(self) -> list[tuple[float, int]]:
+        """(upper bound, observations <= bound) pairs, ending with +Inf."""
+        pairs = []
+        seen = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += bucket_count
+            pairs.append((bound, seen))
+        return pairs
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": self.sum / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class LatencyTracker:
+    """Latency histograms and error counts keyed by a name such as an API method."""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.histograms: dict[str, Histogram] = {}
+        self.errors: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _histogram(self, name: str) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, name: str, seconds: float, error: bool = False) -> None:
+        self._histogram(name).observe(seconds)
+        if error:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self) -> list[str]:
+        """One human-readable line per name, slowest p95 first."""
+        lines = []
+        for name, histogram in sorted(self.histograms.items(), key=lambda item: -item[1].percentile(95)):
+            s = histogram.summary()
+            lines.append("%s: n=%d err=%d avg=%.1fms p50<=%.0fms p95<=%.0fms p99<=%.0fms max=%.1fms" % (
+                name, s["count"], self.errors.get(name, 0), s["avg"] * 1000,
+                s["p50"] * 1000, s["p95"] * 1000, s["p99"] * 1000, s["max"] * 1000))
+        return lines
+
+    def timed(self, func):
+        """Decorator observing every call of a function under its name."""
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            error = True
+            try:
+                result = func(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                self.observe(name, time.perf_counter() - started, error)
+        return wrapper
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+               for value in labels.values())
+    return "{%s}" % ",".join('%s="%s"' % (name, value) for name, value in zip(labels, escaped))
+
+
+class Metric:
+    """
+    A metric family. Values are either kept by the metric or, with
+    `callback`, read at scrape time, so nothing is paid on the hot path for
+    sizes that already exist elsewhere (cache lengths, queue depths).
+    A callback returns a number, or {label value(s): number} when the
+    metric has labels.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), callback=None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.callback = callback
+        self.values: dict[tuple, float] = {}
+
+    def _current(self) -> dict[tuple, float]:
+        if self.callback is None:
+            return dict(self.values)
+        value = self.callback()
+        if not self.labels:
+            return {(): value}
+        return {key if isinstance(key, tuple) else (key,): v for key, v in value.items()}
+
+    def expose(self) -> list[str]:
+        lines = ["# HELP %s %s" % (self.name, self.help), "# TYPE %s %s" % (self.name, self.kind)]
+        for label_values, value in self._current().items():
+            lines.append("%s%s %s" % (
+                self.name, _format_labels(dict(zip(self.labels, label_values))), _format_value(value)))
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, *label_values, value: float) -> None:
+        self.values[label_values] = value
+
+
+class LatencyMetric:
+    """Exposes a LatencyTracker as a histogram family plus an error counter."""
+
+    def __init__(self, name: str, help: str, label: str, tracker: LatencyTracker):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.tracker = tracker
+
+    def expose(self) -> list[str]:
+        seconds = self.name + "_seconds"
+        errors = self.name + "_errors_total"
+        lines = ["# HELP %s %s" % (seconds, self.help), "# TYPE %s histogram" % seconds]
+        for key, histogram in list(self.tracker.histograms.items()):
+            labels = {self.label: key}
+            for bound, count in histogram.cumulative_counts():
+                lines.append("%s_bucket%s %d" % (seconds, _format_labels({**labels, "le": _format_value(bound)}), count))
+            lines.append("%s_sum%s %r" % (seconds, _format_labels(labels), histogram.sum))
+            lines.append("%s_count%s %d" % (seconds, _format_labels(labels), histogram.count))
+        lines.append("# HELP %s Failed calls by %s" % (errors, self.label))
+        lines.append("# TYPE %s counter" % errors)
+        for key, count in list(self.tracker.errors.items()):
+            lines.append("%s%s %d" % (errors, _format_labels({self.label: key}), count))
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: dict[str, object] = {}
+
+    def register(self, metric):
+        """Add a metric, replacing one of the same name (e.g. a rebuilt application's gauges)."""
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple = (), callback=None) -> Counter:
+        existing = self._metrics.get(name)
+        if isinstance(existing, Counter) and callback is None:
+            return existing
+        return self.register(Counter(name, help, labels, callback))
+
+    def gauge(self, name: str, help: str, labels: tuple = (), callback=None) -> Gauge:
+        existing = self._metrics.get(name)
+        if isinstance(existing, Gauge) and callback is None:
+            return existing
+        return self.register(Gauge(name, help, labels, callback))
+
+    def latency(self, name: str, help: str, label: str, buckets: tuple = DEFAULT_BUCKETS) -> LatencyTracker:
+        existing = self._metrics.get(name)
+        if isinstance(existing, LatencyMetric):
+            return existing.tracker
+        return self.register(LatencyMetric(name, help, label, LatencyTracker(buckets))).tracker
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            try:
+                lines.extend(metric.expose())
+            except Exception as e:
+                # A failing gauge callback must not take the whole scrape down
+                logger.warning("Metric %s could not be collected: %s", metric.name, e)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+handler_latency = registry.latency(
+    "bot_handler", "Update handler latency by callback", "handler",
+    buckets=(0.001, 0.0025) + DEFAULT_BUCKETS)
+
+
+def _timed_callback(callback, span):
+    name = getattr(callback, "__name__", type(callback).__name__)
+    span_name = "handler:" + name
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        error = True
+        try:
+            with span(span_name):
+                result = await callback(update, context)
+            error = False
+            return result
+        finally:
+            handler_latency.observe(name, time.perf_counter() - started, error)
+    return wrapper
+
+
+def instrument_handlers(application) -> int:
+    """
+    Time the callback of every handler registered on the application,
+    including the states of conversation handlers, and open a tracing span
+    around it. Returns the number of callbacks wrapped.
+    """
+    from telegram.ext import ConversationHandler
+
+    from utils.tracing import span
+
+    def wrap(handler) -> int:
+        if isinstance(handler, ConversationHandler):
+            nested = list(handler.entry_points) + list(handler.fallbacks)
+            for state_handlers in handler.states.values():
+                nested.extend(state_handlers)
+            return sum(wrap(h) for h in nested)
+        if getattr(handler.callback, "__wrapped__", None) is not None:
+            return 0  # shared handler instance, already wrapped
+        handler.callback = _timed_callback(handler.callback, span)
+        return 1
+
+    return sum(wrap(handler) for handlers in application.handlers.values() for handler in handlers)
@@ -0,0 +1,54 @@
+"""
+Timings of the startup sequence, logged as the bot comes up.
+
+main.py marks the end of each phase (imports, configuration, building the
+application, Bot API initialization, post_init) and logs them once the bot is started,
+then again with the first update the bot finishes handling. Times count
+from when main.py started executing; interpreter startup comes before that
+and is not included. benchmarks/startup_benchmark.py measures the whole
+cold start, process launch included, and profiles the imports.
+"""
+import logging
+import time
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+logger = logging.getLogger(__name__)
+
+# After every handler group of the bot, so the update has been handled
+FIRST_UPDATE_GROUP = 100
+
+
+class StartupTimer:
+    def __init__(self, started: float = None):
+        self.started = time.perf_counter() if started is None else started
+        self.phases: list[tuple[str, float]] = []
+        self._last = self.started
+        self._handler = None
+
+    def mark(self, phase: str, at: float = None) -> None:
+        """End `phase` now (or `at`, a perf_counter time); it lasted since the previous mark or the start."""
+        now = time.perf_counter() if at is None else at
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    @property
+    def elapsed(self) -> float:
+        return self._last - self.started
+
+    def summary(self) -> str:
+        return ", ".join("%s %.0fms" % (phase, seconds * 1000) for phase, seconds in self.phases)
+
+    def log(self, event: str) -> None:
+        logger.info("%s %.0fms after start (%s)", event, self.elapsed * 1000, self.summary())
+
+    def watch_first_update(self, application) -> None:
+        """Log the timings once the first update has been handled."""
+        self._handler = TypeHandler(Update, self._first_update)
+        application.add_handler(self._handler, group=FIRST_UPDATE_GROUP)
+
+    async def _first_update(self, update, context) -> None:
+        context.application.remove_handler(self._handler, group=FIRST_UPDATE_GROUP)
+        self.mark("first_update")
+        self.log("First update handled")
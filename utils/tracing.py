@@ -0,0 +1,241 @@
+"""
+Per-update tracing.
+
+TracingApplication opens a trace around every update; inside it, spans are
+opened by @traced functions (PollService, PollRepository), handler callbacks
+(see utils.metrics.instrument_handlers) and Bot API requests. The current
+span lives in a context variable, so spans nest across awaits and follow
+asyncio.to_thread into worker threads. Outside a trace, span() and @traced
+cost one context variable lookup.
+
+A finished trace is written as one JSON line when it is sampled
+(TRACE_SAMPLE_RATE) or slower than TRACE_SLOW_MS, which are always kept.
+Serializing and writing happen on a background thread.
+
+    TRACE_FILE           JSON lines output; tracing is off when unset
+    TRACE_SAMPLE_RATE    share of traces written, 0..1 (0.01)
+    TRACE_SLOW_MS        traces at least this slow are always written (500)
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+
+from telegram.ext import Application
+
+from utils.loop_watchdog import update_type
+
+logger = logging.getLogger(__name__)
+
+MAX_SPANS = 1000
+
+_current = contextvars.ContextVar("trace_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace", "index", "parent", "name", "start", "duration", "error")
+
+    def __init__(self, trace, index: int, parent: int, name: str):
+        self.trace = trace
+        self.index = index
+        self.parent = parent
+        self.name = name
+        self.start = time.perf_counter()
+        self.duration = None
+        self.error = None
+
+
+class Trace:
+    def __init__(self, name: str, attrs: dict):
+        self.trace_id = uuid.uuid4().hex
+        self.started_at = time.time()
+        self.attrs = attrs
+        self.spans = []
+        self.dropped = 0
+        self.finished = False
+        self.root = self.add(name, None)
+
+    def add(self, name: str, parent: int) -> Span:
+        if self.finished or len(self.spans) >= MAX_SPANS:
+            # Tasks spawned by the update can outlive it; their spans are dropped
+            self.dropped += 1
+            return None
+        span = Span(self, len(self.spans), parent, name)
+        self.spans.append(span)
+        return span
+
+    def to_dict(self) -> dict:
+        origin = self.root.start
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.root.duration * 1000, 3),
+            **self.attrs,
+            "dropped_spans": self.dropped,
+            "spans": [{
+                "id": span.index,
+                "parent": span.parent,
+                "name": span.name,
+                "offset_ms": round((span.start - origin) * 1000, 3),
+                "duration_ms": round(span.duration * 1000, 3) if span.duration is not None else None,
+                "error": span.error,
+            } for span in self.spans[1:]],
+        }
+
+
+class span:
+    """Context manager timing a child of the current span; a no-op outside a trace."""
+    __slots__ = ("name", "_span", "_token")
+
+    def __init__(self, name: str):
+        self.name = name
+        self._span = None
+
+    def __enter__(self):
+        parent = _current.get()
+        if parent is not None:
+            self._span = parent.trace.add(self.name, parent.index)
+            if self._span is not None:
+                self._token = _current.set(self._span)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        current = self._span
+        if current is not None:
+            current.duration = time.perf_counter() - current.start
+            if exc_type is not None:
+                current.error = exc_type.__name__
+            _current.reset(self._token)
+        return False
+
+
+def traced(prefix: str):
+    """Decorator opening a "<prefix>:<function name>" span around each call."""
+    def decorate(func):
+        name = "%s:%s" % (prefix, func.__name__)
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if _current.get() is None:
+                    return await func(*args, **kwargs)
+                with span(name):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if _current.get() is None:
+                    return func(*args, **kwargs)
+                with span(name):
+                    return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class Tracer:
+    def __init__(self, path: str, sample_rate: float = 0.01, slow_ms: float = 500, max_queued: int = 10000):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.slow = slow_ms / 1000
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._thread = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._write, name="trace-writer", daemon=True)
+        self._thread.start()
+        logger.info("Tracing to %s (sample rate %s, slow >= %.0fms)", self.path, self.sample_rate, self.slow * 1000)
+
+    def stop(self) -> None:
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def begin(self, name: str, **attrs) -> tuple[Trace, contextvars.Token]:
+        trace = Trace(name, attrs)
+        return trace, _current.set(trace.root)
+
+    def end(self, trace: Trace, token: contextvars.Token, error: BaseException = None) -> None:
+        _current.reset(token)
+        root = trace.root
+        root.duration = time.perf_counter() - root.start
+        if error is not None:
+            root.error = type(error).__name__
+        trace.finished = True
+        if root.duration >= self.slow:
+            trace.attrs["sampled"] = "slow"
+        elif random.random() < self.sample_rate:
+            trace.attrs["sampled"] = "random"
+        else:
+            return
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as output:
+            while True:
+                trace = self._queue.get()
+                batch = [trace]
+                while trace is not None and not self._queue.empty():
+                    trace = self._queue.get_nowait()
+                    batch.append(trace)
+                output.writelines(json.dumps(t.to_dict(), ensure_ascii=False) + "\n" for t in batch if t is not None)
+                output.flush()
+                self.written += sum(1 for t in batch if t is not None)
+                if batch[-1] is None:
+                    return
+
+
+class TracingApplication(Application):
+    """
+    Application that runs every update inside a trace when a tracer is set,
+    and tags event-loop stalls with the update when a watchdog is set.
+    """
+
+    def __init__(self, *args, tracer: Tracer = None, watchdog=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tracer = tracer
+        self.watchdog = watchdog
+
+    async def process_update(self, update: object) -> None:
+        if self.watchdog is None:
+            return await self._process_traced(update)
+        with self.watchdog.tracking(update):
+            return await self._process_traced(update)
+
+    async def _process_traced(self, update: object) -> None:
+        if self.tracer is None:
+            return await super().process_update(update)
+        trace, token = self.tracer.begin(
+            "update", update_type=update_type(update), update_id=getattr(update, "update_id", None))
+        error = None
+        try:
+            await super().process_update(update)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.tracer.end(trace, token, error)
+
+
+def tracer_from_env():
+    """Return a Tracer if TRACE_FILE is set, else None."""
+    path = os.getenv("TRACE_FILE")
+    if not path:
+        return None
+    return Tracer(
+        path,
+        sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0.01")),
+        slow_ms=float(os.getenv("TRACE_SLOW_MS", "500")),
+    )
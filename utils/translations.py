@@ -7,13 +7,26 @@ logger = logging.getLogger(__name__)
 
 
 class Translator:
-    def __init__(self, translations_dir: str = "translations"):
-        self.translations_dir = translations_dir
-        self.translations: Dict[str, Dict[str, str]] = {}
-        self.load_translations()
+    """
+    Translations are read from disk on first use, not at import; main loads
+    them explicitly as a startup phase.
+    """
+
+    def __init__(self, translations_dir: str = None):
+        # The translations directory of the project, whatever the working directory
+        self.translations_dir = translations_dir or os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "translations")
+        self._translations: Optional[Dict[str, Dict[str, str]]] = None
+
+    @property
+    def translations(self) -> Dict[str, Dict[str, str]]:
+        if self._translations is None:
+            self.load_translations()
+        return self._translations
 
     def load_translations(self):
         """Load all translation files from the translations directory."""
+        translations = {}
         try:
             for filename in os.listdir(self.translations_dir):
                 if filename.endswith('.json'):
@@ -21,12 +34,12 @@ class Translator:
                     file_path = os.path.join(self.translations_dir, filename)
 
                     with open(file_path, 'r', encoding='utf-8') as f:
-                        self.translations[lang_code] = json.load(f)
+                        translations[lang_code] = json.load(f)
 
-                    logger.info(
-                        f"Loaded translations for language: {lang_code}")
+                    logger.info("Loaded translations for language: %s", lang_code)
         except Exception as e:
-            logger.error(f"Error loading translations: {e}")
+            logger.error("Error loading translations: %s", e)
+        self._translations = translations
 
     def get_user_language(self, user) -> str:
         """
@@ -68,7 +81,7 @@ class Translator:
             return translation
         except KeyError as e:
             logger.warning(
-                f"Missing format parameter {e} for key '{key}' in language '{lang_code}'")
+                "Missing format parameter %s for key '%s' in language '%s'", e, key, lang_code)
             return translation
 
     def get_available_languages(self) -> list[str]:
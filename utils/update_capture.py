@@ -0,0 +1,93 @@
+"""
+Opt-in capture of incoming updates, replayed by benchmarks.replay_updates.
+
+    UPDATE_CAPTURE_FILE   gzip-compressed NDJSON file updates are appended to
+
+Each update is written as received, one {"t": <unix time>, "update": {...}}
+line per update, by a background thread; the handler only queues it.
+Captures hold message texts, user ids and names: keep them as private as
+the database.
+"""
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateRecorder:
+    def __init__(self, path: str, max_queued: int = 10000):
+        self.path = path
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._thread = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._write, name="update-capture", daemon=True)
+        self._thread.start()
+        logger.info("Capturing updates to %s", self.path)
+
+    def stop(self) -> None:
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+            logger.info("Captured %s updates to %s (%s dropped)", self.written, self.path, self.dropped)
+
+    def record(self, update) -> None:
+        # Updates are immutable, so the writer thread can serialize them later
+        try:
+            self._queue.put_nowait((time.time(), update))
+        except queue.Full:
+            self.dropped += 1
+
+    async def capture(self, update, context) -> None:
+        """TypeHandler callback; registered in the first handler group."""
+        self.record(update)
+
+    def _write(self) -> None:
+        # Appending adds a gzip member per run, which gzip readers concatenate
+        with gzip.open(self.path, "at", encoding="utf-8") as output:
+            while True:
+                item = self._queue.get()
+                batch = [item]
+                while item is not None and not self._queue.empty():
+                    item = self._queue.get_nowait()
+                    batch.append(item)
+                output.writelines(
+                    json.dumps({"t": round(t, 6), "update": update.to_dict()}, ensure_ascii=False, default=str) + "\n"
+                    for t, update in (entry for entry in batch if entry is not None))
+                # A sync flush per batch keeps what was written readable after a crash
+                output.flush()
+                self.written += sum(1 for entry in batch if entry is not None)
+                if batch[-1] is None:
+                    return
+
+
+def read_capture(path: str):
+    """Yield (unix time, update dict) pairs of a capture, stopping at a truncated tail."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning("Capture %s ends with a partial line", path)
+                    return
+                yield entry["t"], entry["update"]
+        except (EOFError, zlib.error):
+            logger.warning("Capture %s is truncated", path)
+
+
+def recorder_from_env():
+    """Return an UpdateRecorder if UPDATE_CAPTURE_FILE is set, else None."""
+    path = os.getenv("UPDATE_CAPTURE_FILE")
+    if not path:
+        return None
+    return UpdateRecorder(path)
@@ -0,0 +1,45 @@
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import parse_qsl
+
+
+class InitDataError(ValueError):
+    """Raised when Web App initData is missing, forged or expired."""
+
+
+def verify_init_data(init_data: str, bot_token: str, max_age: int = 86400) -> dict:
+    """
+    Validate Telegram Web App initData and return its fields, with `user`
+    decoded from JSON.
+
+    https://core.telegram.org/bots/webapps#validating-data-received-via-the-mini-app
+    """
+    if not init_data:
+        raise InitDataError("initData is missing")
+
+    fields = dict(parse_qsl(init_data, keep_blank_values=True, strict_parsing=False))
+    received_hash = fields.pop("hash", None)
+    if not received_hash:
+        raise InitDataError("initData has no hash")
+
+    data_check_string = "\n".join(f"{key}={fields[key]}" for key in sorted(fields))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    expected_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected_hash, received_hash):
+        raise InitDataError("initData signature mismatch")
+
+    try:
+        auth_date = int(fields.get("auth_date", 0))
+    except ValueError:
+        raise InitDataError("initData auth_date is invalid")
+    if max_age and time.time() - auth_date > max_age:
+        raise InitDataError("initData has expired")
+
+    if "user" in fields:
+        try:
+            fields["user"] = json.loads(fields["user"])
+        except ValueError:
+            raise InitDataError("initData user is not valid JSON")
+    return fields
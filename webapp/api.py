@@ -0,0 +1,350 @@
+"""
+JSON API served next to the Web App by the bot process.
+
+POST /api/polls creates a poll straight from the Web App form. The request
+is authenticated with Telegram initData (header X-Telegram-Init-Data), so it
+works from any Web App button and answers with the new poll id instead of
+going through tg.sendData and a service message.
+
+GET /api/polls/<id>/stream is a Server-Sent Events stream of the poll's
+per-option counts. EventSource cannot set headers, so initData is passed as
+the `init_data` query argument. With BOT_WORKERS, a worker that does not own
+the poll follows its counts in the database, with one query per tick for all
+of its streams of that poll.
+
+GET /metrics (on its own port, see start_metrics_server) exposes the
+process metrics in the Prometheus text format.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+
+import tornado.web
+from tornado.iostream import StreamClosedError
+from telegram import ChatMember, User
+from telegram.error import BadRequest, Forbidden, TelegramError
+from telegram.ext import CallbackContext
+
+from models.poll import Poll
+from services.sharding import shard_for_poll
+from services.vote_pubsub import vote_snapshot
+from utils.metrics import registry
+from utils.webapp_auth import InitDataError, verify_init_data
+from webapp.server import AssetStore, LimitedHandler, make_app
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 16 * 1024
+MEMBER_STATUSES = (ChatMember.OWNER, ChatMember.ADMINISTRATOR, ChatMember.MEMBER)
+
+
+class UserRateLimiter:
+    """
+    Leaky-bucket limit of `max_rate` requests per `time_period` seconds per
+    user. A bucket holds at least one request, so rates below one per period
+    still let a request through once the previous one has leaked out.
+    """
+
+    def __init__(self, max_rate: float, time_period: float = 60, max_users: int = 100000):
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self.max_users = max_users
+        # user_id: (level, time of the user's last request); the level leaks at max_rate per time_period
+        self._buckets: dict[int, tuple[float, float]] = {}
+        self._last_sweep = time.monotonic()
+
+    def allow(self, user_id: int) -> bool:
+        now = time.monotonic()
+        self._sweep(now)
+        level, last = self._buckets.get(user_id, (0.0, now))
+        level = max(0.0, level - (now - last) * self.max_rate / self.time_period)
+        if level + 1 > max(self.max_rate, 1.0):
+            self._buckets[user_id] = (level, now)
+            return False
+        self._buckets[user_id] = (level + 1, now)
+        return True
+
+    def _sweep(self, now: float) -> None:
+        """Forget buckets that have leaked empty, which is the state of an unknown user."""
+        if now - self._last_sweep < self.time_period and len(self._buckets) < self.max_users:
+            return
+        self._last_sweep = now
+        drained = [user_id for user_id, (level, last) in self._buckets.items()
+                   if (now - last) * self.max_rate / self.time_period >= level]
+        for user_id in drained:
+            del self._buckets[user_id]
+
+
+class StoredCountsPoller:
+    """
+    Publishes the counts of polls owned by other sharded workers to this
+    worker's pubsub. One task per followed poll reads the counts from the
+    database once per tick, whatever the number of streams watching it, and
+    ends when the last stream is gone or the poll is closed or deleted.
+    """
+
+    def __init__(self, bot_application, tick: float = 1.0):
+        self.bot_application = bot_application
+        self.tick = tick
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def follow(self, poll_id: str) -> None:
+        task = self._tasks.get(poll_id)
+        if task is None or task.done():
+            task = asyncio.create_task(self._follow(poll_id))
+            self._tasks[poll_id] = task
+            task.add_done_callback(lambda done: self._forget(poll_id, done))
+
+    def _forget(self, poll_id: str, task: asyncio.Task) -> None:
+        if self._tasks.get(poll_id) is task:
+            del self._tasks[poll_id]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Following the counts of poll %s failed", poll_id, exc_info=task.exception())
+
+    async def _follow(self, poll_id: str) -> None:
+        poll_service = self.bot_application.bot_data["poll_service"]
+        pubsub = poll_service.pubsub
+        while True:
+            await asyncio.sleep(self.tick)
+            if not pubsub.has_subscribers(poll_id):
+                return
+            poll, counts = poll_service.poll_repository.get_poll_with_counts(poll_id)
+            if poll is None:
+                # Deleted meanwhile: end the streams as if it had closed
+                latest = pubsub.latest(poll_id)
+                if latest is not None:
+                    pubsub.publish(poll_id, {**latest, "closed": True})
+                return
+            pubsub.publish(poll_id, vote_snapshot(poll.id, poll.options, counts, poll.voters_num, poll.closed))
+            if poll.closed:
+                return
+
+
+class ApiHandler(LimitedHandler):
+    def initialize(self, bot_application, init_data_max_age: int = 86400):
+        self.bot_application = bot_application
+        self.init_data_max_age = init_data_max_age
+
+    def fail(self, status: int, error: str) -> None:
+        self.set_status(status)
+        self.finish({"ok": False, "error": error})
+
+    def write_error(self, status_code, **kwargs):
+        self.finish({"ok": False, "error": self._reason})
+
+    def authenticated_user(self) -> User:
+        """The Telegram user from verified initData, or None after sending a 401."""
+        init_data = self.request.headers.get("X-Telegram-Init-Data") or self.get_argument("init_data", "")
+        try:
+            fields = verify_init_data(init_data, self.bot_application.bot.token, self.init_data_max_age)
+        except InitDataError as e:
+            self.fail(401, str(e))
+            return None
+        user = fields.get("user")
+        if not user or "id" not in user:
+            self.fail(401, "initData has no user")
+            return None
+        return User(
+            id=user["id"],
+            first_name=user.get("first_name", ""),
+            is_bot=False,
+            last_name=user.get("last_name"),
+            username=user.get("username"),
+            language_code=user.get("language_code"),
+        )
+
+
+class CreatePollHandler(ApiHandler):
+    def initialize(self, bot_application, rate_limiter: UserRateLimiter, init_data_max_age: int = 86400):
+        super().initialize(bot_application, init_data_max_age)
+        self.rate_limiter = rate_limiter
+
+    async def post(self):
+        if len(self.request.body) > MAX_BODY_SIZE:
+            return self.fail(413, "Request body is too large")
+
+        user = self.authenticated_user()
+        if user is None:
+            return
+
+        if not self.rate_limiter.allow(user.id):
+            self.set_header("Retry-After", str(int(self.rate_limiter.time_period / self.rate_limiter.max_rate)))
+            return self.fail(429, "Too many polls, please wait a moment")
+
+        try:
+            poll_data = json.loads(self.request.body)
+            poll = Poll.from_form(poll_data)
+            chat_id = int(poll_data.get("chat_id") or user.id)
+        except ValueError as e:
+            return self.fail(400, str(e))
+
+        bot = self.bot_application.bot
+        if chat_id != user.id:
+            # Only members may post polls into a group through the bot
+            try:
+                member = await bot.get_chat_member(chat_id, user.id)
+            except (BadRequest, Forbidden) as e:
+                return self.fail(403, "Cannot post to this chat: %s" % e.message)
+            if member.status not in MEMBER_STATUSES:
+                return self.fail(403, "You are not a member of this chat")
+
+        poll_service = self.bot_application.bot_data["poll_service"]
+        context = CallbackContext(self.bot_application, user_id=user.id)
+        try:
+            poll_id = await poll_service.send_poll(poll, None, context, target_chat_id=chat_id, user=user)
+        except TelegramError as e:
+            logger.error("Failed to send poll from Web App API: %s", e)
+            return self.fail(502, e.message)
+
+        logger.info("Poll %s created in chat %s through the Web App API", poll_id, chat_id)
+        self.write({"ok": True, "poll_id": poll_id, "chat_id": chat_id, "message_id": poll.message_id})
+
+
+class PollStreamHandler(ApiHandler):
+    """
+    SSE stream of vote counts. Publishes wake the subscriber; it then waits
+    one tick and sends only the newest snapshot, and the next one is taken
+    after the previous write has flushed, so slow clients skip frames instead
+    of buffering them. Streams are long-lived, so they are counted against
+    their own limit rather than the request concurrency limit.
+
+    Sharded workers share the port, so a stream often lands on a worker that
+    never sees the poll's votes (they go to the worker owning the poll). There
+    the snapshots are published by the worker's StoredCountsPoller instead.
+    """
+
+    streams = 0
+    max_streams = 10000
+
+    def initialize(self, bot_application, poller: StoredCountsPoller, tick: float = 1.0, keepalive: float = 15.0,
+                   init_data_max_age: int = 86400):
+        super().initialize(bot_application, init_data_max_age)
+        self.poller = poller
+        self.tick = tick
+        self.keepalive = keepalive
+        self.subscription = None
+
+    def prepare(self):
+        if PollStreamHandler.streams >= PollStreamHandler.max_streams:
+            self.set_header("Retry-After", "5")
+            raise tornado.web.HTTPError(503)
+
+    def on_connection_close(self):
+        if self.subscription is not None:
+            # Wake the stream loop so it notices the disconnect
+            self.subscription.notify()
+
+    async def get(self, poll_id: str):
+        user = self.authenticated_user()
+        if user is None:
+            return
+
+        poll_service = self.bot_application.bot_data["poll_service"]
+        poll, counts = poll_service.poll_repository.get_poll_with_counts(poll_id)
+        if poll is None:
+            return self.fail(404, "Poll not found")
+        if poll.chat_id != user.id:
+            try:
+                member = await self.bot_application.bot.get_chat_member(poll.chat_id, user.id)
+            except TelegramError:
+                return self.fail(403, "Cannot read this chat")
+            if member.status not in MEMBER_STATUSES:
+                return self.fail(403, "You are not a member of this chat")
+
+        pubsub = poll_service.pubsub
+        self.subscription = pubsub.subscribe(poll_id)
+        if not self._owns_poll(poll_id):
+            self.poller.follow(poll_id)
+        PollStreamHandler.streams += 1
+        try:
+            self.set_header("Content-Type", "text/event-stream")
+            self.set_header("Cache-Control", "no-cache")
+            # Stop reverse proxies from buffering the stream
+            self.set_header("X-Accel-Buffering", "no")
+            snapshot = pubsub.latest(poll_id) or vote_snapshot(
+                poll.id, poll.options, counts, poll.voters_num, poll.closed)
+            await self._send(snapshot)
+            await self._stream(snapshot)
+            self.finish()
+        except StreamClosedError:
+            pass
+        finally:
+            pubsub.unsubscribe(poll_id, self.subscription)
+            PollStreamHandler.streams -= 1
+
+    def _owns_poll(self, poll_id: str) -> bool:
+        """Whether this process handles the poll's votes (always, unless sharded)."""
+        bot_data = self.bot_application.bot_data
+        if "num_workers" not in bot_data:
+            return True
+        return shard_for_poll(poll_id, bot_data["num_workers"]) == bot_data["worker_index"]
+
+    async def _stream(self, snapshot: dict) -> None:
+        while not snapshot["closed"] and not self.request.connection.stream.closed():
+            if not await self.subscription.wait(self.keepalive):
+                await self._keepalive()
+                continue
+            # Coalesce everything published during one tick into one frame
+            await asyncio.sleep(self.tick)
+            latest = self.subscription.take()
+            if latest is not None and latest != snapshot:
+                snapshot = latest
+                await self._send(snapshot)
+
+    async def _keepalive(self) -> None:
+        self.write(": keepalive\n\n")
+        await self.flush()
+
+    async def _send(self, snapshot: dict) -> None:
+        event = "closed" if snapshot["closed"] else "counts"
+        self.write("event: %s\ndata: %s\n\n" % (event, json.dumps(snapshot, ensure_ascii=False)))
+        await self.flush()
+
+
+def make_api_handlers(bot_application) -> list:
+    init_data_max_age = int(os.getenv("WEBAPP_INIT_DATA_MAX_AGE", "86400"))
+    # Buckets are per process: sharded workers each allow their share of the rate
+    num_workers = bot_application.bot_data.get("num_workers", 1)
+    rate_limiter = UserRateLimiter(float(os.getenv("WEBAPP_API_POLLS_PER_MINUTE", "5")) / num_workers, 60)
+    PollStreamHandler.max_streams = int(os.getenv("WEBAPP_MAX_STREAMS", "10000"))
+    tick = float(os.getenv("WEBAPP_STREAM_TICK", "1"))
+    return [
+        (r"/api/polls", CreatePollHandler, {
+            "bot_application": bot_application,
+            "rate_limiter": rate_limiter,
+            "init_data_max_age": init_data_max_age,
+        }),
+        (r"/api/polls/([^/]+)/stream", PollStreamHandler, {
+            "bot_application": bot_application,
+            "poller": StoredCountsPoller(bot_application, tick),
+            "tick": tick,
+            "init_data_max_age": init_data_max_age,
+        }),
+    ]
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.finish(registry.render())
+
+
+def start_metrics_server(port: int, address: str = ""):
+    """Serve /metrics from the bot's event loop, apart from the public Web App port."""
+    server = tornado.web.Application([(r"/metrics", MetricsHandler)]).listen(port, address)
+    logger.info("Metrics endpoint listening on port %s", port)
+    return server
+
+
+def start_webapp_server(bot_application, port: int, address: str = ""):
+    """Serve the Web App and its API from the bot's event loop."""
+    registry.gauge("webapp_sse_streams", "Open live vote count streams",
+                   callback=lambda: PollStreamHandler.streams)
+    app = make_app(AssetStore().load(), extra_handlers=make_api_handlers(bot_application))
+    # Sharded workers share the port; the kernel balances connections between them
+    server = app.listen(port, address, xheaders=True, reuse_port=hasattr(socket, "SO_REUSEPORT"))
+    logger.info("Web App server with API listening on port %s", port)
+    return server
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Build the Web App bundle.
+
+Minifies index.html and moves its inline <style> and <script> into
+content-hashed files (app.<hash>.css, app.<hash>.js) that browsers may cache
+forever; index.html itself stays small and is revalidated on every open.
+Writes the result and a manifest.json to webapp/dist/, which server.py
+serves in preference to the sources, and prints sizes before and after.
+
+    python3 build.py [--out dist]
+
+The minifiers are deliberately conservative: they drop comments and
+whitespace that cannot change rendering or program meaning, and never
+rename or reorder anything.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import shutil
+from pathlib import Path
+
+DIR = Path(__file__).parent
+ENTRY = "index.html"
+
+# Whitespace next to these tags is never rendered
+BLOCK_TAGS = {
+    "html", "head", "body", "meta", "title", "link", "script", "style", "div", "form", "p",
+    "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "li", "section", "header", "footer", "main",
+    "nav", "table", "thead", "tbody", "tr", "td", "th", "br", "hr", "!doctype",
+}
+# Whitespace inside these must be kept as is
+RAW_TAGS = ("pre", "textarea")
+
+INLINE_STYLE = re.compile(r"<style>(.*?)</style>", re.S)
+INLINE_SCRIPT = re.compile(r"<script>(.*?)</script>", re.S)
+HTML_TOKEN = re.compile(r"<!--.*?-->|<[^>]+>|[^<]+", re.S)
+TAG_NAME = re.compile(r"</?\s*([!a-zA-Z0-9-]+)")
+
+# A "/" after one of these starts a regex literal rather than a division
+REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^")
+REGEX_KEYWORD_END = re.compile(r"(?<![\w$.])(return|typeof|case|do|else|in|of|new|delete|void|throw)\s*$")
+# Spaces around these JS punctuators are never significant
+JS_TIGHT = set("{}()[];,=:<>!&|?")
+# A line break after these (or before a closing bracket) cannot trigger ASI
+JS_JOIN_AFTER = set("{(,;[")
+JS_JOIN_BEFORE = set("})]")
+
+
+def minify_css(css: str) -> str:
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    # Only after ":" - a space before it is a descendant selector (div :hover)
+    css = re.sub(r":\s+", ":", css)
+    css = css.replace(";}", "}")
+    return css.strip()
+
+
+def _js_tokens(js: str) -> list[tuple[str, str]]:
+    """Split JS into ("code", text) and ("literal", text) pieces, dropping comments."""
+    tokens = []
+    code = []
+    last_significant = ""
+    i, n = 0, len(js)
+    while i < n:
+        ch = js[i]
+        nxt = js[i + 1] if i + 1 < n else ""
+        if ch == "/" and nxt == "/":
+            end = js.find("\n", i)
+            i = n if end == -1 else end
+            continue
+        if ch == "/" and nxt == "*":
+            end = js.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            code.append(" ")
+            continue
+        if ch in "'\"`" or (ch == "/" and _starts_regex(last_significant, "".join(code))):
+            if code:
+                tokens.append(("code", "".join(code)))
+                code = []
+            end = _literal_end(js, i)
+            tokens.append(("literal", js[i:end]))
+            last_significant = "a"  # a literal is an operand
+            i = end
+            continue
+        code.append(ch)
+        if not ch.isspace():
+            last_significant = ch
+        i += 1
+    if code:
+        tokens.append(("code", "".join(code)))
+    return tokens
+
+
+def _starts_regex(last_significant: str, pending_code: str) -> bool:
+    if not last_significant or last_significant in REGEX_PRECEDERS:
+        return True
+    return bool(REGEX_KEYWORD_END.search(pending_code))
+
+
+def _literal_end(js: str, start: int) -> int:
+    """Index just past the string, template or regex literal starting at `start`."""
+    quote = js[start]
+    i = start + 1
+    in_class = False
+    while i < len(js):
+        ch = js[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if quote == "/":
+            if ch == "[":
+                in_class = True
+            elif ch == "]":
+                in_class = False
+            elif ch == "/" and not in_class:
+                i += 1
+                while i < len(js) and js[i].isalpha():  # flags
+                    i += 1
+                return i
+        elif ch == quote:
+            return i + 1
+        i += 1
+    return i
+
+
+def minify_js(js: str) -> str:
+    out = []
+    for kind, text in _js_tokens(js):
+        if kind == "literal":
+            out.append(text)
+            continue
+        lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.split("\n")]
+        code = "\n".join(lines)
+        code = re.sub(r"\n\s*\n+", "\n", code)
+        code = re.sub(r" ?([%s]) ?" % re.escape("".join(JS_TIGHT)), r"\1", code)
+        # Join lines where the break cannot be significant
+        code = re.sub(r"([%s])\n" % re.escape("".join(JS_JOIN_AFTER)), r"\1", code)
+        code = re.sub(r"\n([%s])" % re.escape("".join(JS_JOIN_BEFORE)), r"\1", code)
+        out.append(code)
+    return "".join(out).strip()
+
+
+def minify_html(html: str) -> str:
+    tokens = [t for t in HTML_TOKEN.findall(html) if not (t.startswith("<!--") and not t.startswith("<!--["))]
+    out = []
+    raw_depth = 0
+    for i, token in enumerate(tokens):
+        if token.startswith("<"):
+            name = _tag_name(token)
+            if name in RAW_TAGS:
+                raw_depth += -1 if token.startswith("</") else 1
+            out.append(token)
+            continue
+        if raw_depth:
+            out.append(token)
+            continue
+        if token.strip():
+            out.append(re.sub(r"\s+", " ", token))
+            continue
+        prev_name = _tag_name(tokens[i - 1]) if i > 0 else "html"
+        next_name = _tag_name(tokens[i + 1]) if i + 1 < len(tokens) else "html"
+        if prev_name not in BLOCK_TAGS and next_name not in BLOCK_TAGS:
+            out.append(" ")
+    return "".join(out).strip()
+
+
+def _tag_name(token: str) -> str:
+    match = TAG_NAME.match(token)
+    return match.group(1).lower() if match else ""
+
+
+def hashed_name(stem: str, suffix: str, body: bytes) -> str:
+    return "%s.%s%s" % (stem, hashlib.sha256(body).hexdigest()[:10], suffix)
+
+
+def sizes(body: bytes) -> dict:
+    return {"raw": len(body), "gzip": len(gzip.compress(body, compresslevel=9, mtime=0))}
+
+
+def build(source: Path = DIR, out: Path = DIR / "dist") -> dict:
+    html = (source / ENTRY).read_text(encoding="utf-8")
+    files: dict[str, bytes] = {}
+    assets: dict[str, str] = {}
+
+    def extract(pattern, logical_name, minify, tag):
+        nonlocal html
+        match = pattern.search(html)
+        if not match:
+            return
+        body = minify(match.group(1)).encode()
+        stem, suffix = logical_name.rsplit(".", 1)
+        name = hashed_name(stem, "." + suffix, body)
+        files[name] = body
+        assets[logical_name] = name
+        html = html[:match.start()] + tag % name + html[match.end():]
+
+    extract(INLINE_STYLE, "app.css", minify_css, '<link rel="stylesheet" href="%s">')
+    extract(INLINE_SCRIPT, "app.js", minify_js, '<script src="%s"></script>')
+    files[ENTRY] = minify_html(html).encode()
+
+    if out.exists():
+        shutil.rmtree(out)
+    out.mkdir(parents=True)
+    for name, body in files.items():
+        (out / name).write_bytes(body)
+
+    before = sizes((source / ENTRY).read_bytes())
+    after = {name: sizes(body) for name, body in files.items()}
+    manifest = {
+        "entry": ENTRY,
+        "assets": assets,
+        # Content-hashed, so they can be cached forever
+        "immutable": sorted(assets.values()),
+        "sizes": {
+            "before": before,
+            "after": {
+                "raw": sum(s["raw"] for s in after.values()),
+                "gzip": sum(s["gzip"] for s in after.values()),
+            },
+            "files": after,
+        },
+    }
+    (out / "manifest.json").write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+    return manifest
+
+
+def print_report(manifest: dict) -> None:
+    report = manifest["sizes"]
+    print("%-28s %10s %10s" % ("file", "raw", "gzip"))
+    print("%-28s %10d %10d" % ("before: " + manifest["entry"], report["before"]["raw"], report["before"]["gzip"]))
+    for name, size in report["files"].items():
+        print("%-28s %10d %10d" % (name, size["raw"], size["gzip"]))
+    after = report["after"]
+    print("%-28s %10d %10d" % ("after: total", after["raw"], after["gzip"]))
+    print("%-28s %9.1f%% %9.1f%%" % (
+        "saved",
+        100 * (1 - after["raw"] / report["before"]["raw"]),
+        100 * (1 - after["gzip"] / report["before"]["gzip"]),
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the Web App bundle")
+    parser.add_argument("--source", type=Path, default=DIR)
+    parser.add_argument("--out", type=Path, default=DIR / "dist")
+    args = parser.parse_args()
+    print_report(build(args.source, args.out))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,239 @@
 #!/usr/bin/env python3
-import http.server
-import socketserver
+"""
+Web App server.
+
+Assets are read into memory at startup together with gzip (and brotli, when
+the `brotli` package is installed) variants. Responses carry an ETag so
+repeat opens revalidate with a 304, and content-hashed file names
+(app.3f2a9c1b.js) are cached as immutable. When build.py has produced
+dist/, it is served instead of the sources and its manifest.json lists the
+immutable files. Tornado serves many slow clients concurrently from one
+thread.
+
+    python3 server.py --port 8000 --max-concurrency 1000
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
 import os
+import re
+from dataclasses import dataclass, field
 from pathlib import Path
 
-PORT = 8000
+import tornado.ioloop
+import tornado.web
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+PORT = int(os.getenv("WEBAPP_PORT", "8000"))
 DIR = Path(__file__).parent
+DIST = DIR / "dist"
+MANIFEST = "manifest.json"
+
+SERVED_EXTENSIONS = {".html", ".js", ".css", ".json", ".svg", ".png", ".jpg", ".ico", ".webp", ".woff2", ".txt"}
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# name.<8+ hex chars>.ext; only consulted when there is no manifest
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.[a-z0-9]+$")
+
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+# Unhashed files (index.html) are cached but revalidated with the ETag on every open
+CACHE_REVALIDATE = "no-cache"
+
+
+@dataclass
+class Asset:
+    content_type: str
+    etag: str
+    cache_control: str
+    # Content-Encoding ("identity", "gzip", "br") -> body
+    bodies: dict[str, bytes] = field(default_factory=dict)
+
+
+def default_root() -> Path:
+    """The built bundle when there is one, otherwise the sources."""
+    return DIST if (DIST / MANIFEST).is_file() else DIR
+
+
+class AssetStore:
+    """In-memory copy of the Web App files with precompressed variants."""
+
+    def __init__(self, root: Path = None):
+        self.root = Path(root) if root else default_root()
+        self.assets: dict[str, Asset] = {}
+        self.immutable: set[str] = None
+
+    def load(self) -> "AssetStore":
+        manifest_path = self.root / MANIFEST
+        if manifest_path.is_file():
+            self.immutable = set(json.loads(manifest_path.read_text(encoding="utf-8")).get("immutable", ()))
+        for path in sorted(self.root.rglob("*")):
+            if path.is_file() and path.suffix in SERVED_EXTENSIONS and path != manifest_path:
+                name = path.relative_to(self.root).as_posix()
+                self.assets[name] = self._build_asset(name, path.read_bytes())
+        logger.info("Loaded %s Web App assets from %s", len(self.assets), self.root)
+        return self
+
+    def get(self, name: str) -> Asset:
+        return self.assets.get(name)
+
+    def is_immutable(self, name: str) -> bool:
+        if self.immutable is not None:
+            return name in self.immutable
+        return bool(HASHED_NAME.search(name))
+
+    def _build_asset(self, name: str, body: bytes) -> Asset:
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type == "application/javascript":
+            content_type += "; charset=utf-8"
+
+        asset = Asset(
+            content_type=content_type,
+            etag=hashlib.sha256(body).hexdigest()[:16],
+            cache_control=CACHE_IMMUTABLE if self.is_immutable(name) else CACHE_REVALIDATE,
+            bodies={"identity": body},
+        )
+        if content_type.startswith(COMPRESSIBLE_TYPES) and len(body) > 256:
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                asset.bodies["gzip"] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    asset.bodies["br"] = compressed
+        return asset
+
+
+class LimitedHandler(tornado.web.RequestHandler):
+    """Rejects requests with 503 while `max_concurrency` requests are in flight."""
+
+    in_flight = 0
+    max_concurrency = 1000
+
+    def prepare(self):
+        if LimitedHandler.in_flight >= LimitedHandler.max_concurrency:
+            self.set_header("Retry-After", "1")
+            raise tornado.web.HTTPError(503)
+        LimitedHandler.in_flight += 1
+        self._counted = True
+
+    def on_finish(self):
+        if getattr(self, "_counted", False):
+            LimitedHandler.in_flight -= 1
+            self._counted = False
+
+    def on_connection_close(self):
+        self.on_finish()
+
+
+class AssetHandler(LimitedHandler):
+    def initialize(self, store: AssetStore):
+        self.store = store
+
+    def compute_etag(self):
+        # Set explicitly in get(); stops tornado from hashing every response
+        return None
+
+    async def get(self, name: str):
+        asset = self.store.get(name or "index.html")
+        if asset is None:
+            raise tornado.web.HTTPError(404)
+
+        encoding = self._pick_encoding(asset)
+        tag = asset.etag if encoding == "identity" else "%s-%s" % (asset.etag, encoding)
+        self.set_header("Content-Type", asset.content_type)
+        self.set_header("Cache-Control", asset.cache_control)
+        self.set_header("ETag", '"%s"' % tag)
+        self.set_header("Vary", "Accept-Encoding")
+
+        if self._etag_matches(asset.etag):
+            self.set_status(304)
+            return
+
+        if encoding != "identity":
+            self.set_header("Content-Encoding", encoding)
+        body = asset.bodies[encoding]
+        self.set_header("Content-Length", len(body))
+        if self.request.method != "HEAD":
+            self.write(body)
+            await self.flush()
+
+    head = get
+
+    def _pick_encoding(self, asset: Asset) -> str:
+        accepted = parse_accept_encoding(self.request.headers.get("Accept-Encoding", ""))
+        best, best_q = "identity", 0.0
+        # On equal q-values the smaller body wins, so br is tried first
+        for encoding in ("br", "gzip"):
+            q = accepted.get(encoding, accepted.get("*", 0.0))
+            if encoding in asset.bodies and q > best_q:
+                best, best_q = encoding, q
+        return best
+
+    def _etag_matches(self, etag: str) -> bool:
+        header = self.request.headers.get("If-None-Match")
+        if not header:
+            return False
+        for tag in header.split(","):
+            tag = tag.strip().removeprefix("W/").strip('"')
+            # Any encoding of the same content is still fresh
+            if tag == "*" or tag.split("-", 1)[0] == etag:
+                return True
+        return False
+
+
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    """{coding: q} of an Accept-Encoding header; q=0 means refused, malformed q-values count as 0."""
+    codings = {}
+    for item in header.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def make_app(store: AssetStore = None, extra_handlers: list = ()) -> tornado.web.Application:
+    """Build the Web App; extra_handlers are matched before the static assets."""
+    store = store or AssetStore().load()
+    return tornado.web.Application(
+        list(extra_handlers) + [(r"/(.*)", AssetHandler, {"store": store})],
+        compress_response=False,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Web App")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--address", default="")
+    parser.add_argument("--root", type=Path, default=None, help="default: dist/ if built, else the sources")
+    parser.add_argument("--max-concurrency", type=int,
+                        default=int(os.getenv("WEBAPP_MAX_CONCURRENCY", "1000")))
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    LimitedHandler.max_concurrency = args.max_concurrency
+    app = make_app(AssetStore(args.root).load())
+    app.listen(args.port, args.address, xheaders=True)
+    print(f"Server at http://localhost:{args.port}")
+    tornado.ioloop.IOLoop.current().start()
+
 
-class Handler(http.server.SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, directory=str(DIR), **kwargs)
-    
-    def send_head(self):
-        """Override to fix Content-Type."""
-        path = self.translate_path(self.path)
-        
-        if os.path.isdir(path):
-            parts = self.path.rstrip('/').split('/')
-            if parts[-1] == '' or '.' not in parts[-1]:
-                for index in "index.html", "index.htm":
-                    index = os.path.join(path, index)
-                    if os.path.exists(index):
-                        path = index
-                        break
-        
-        try:
-            f = open(path, 'rb')
-        except OSError:
-            self.send_error(404, "File not found")
-            return None
-        
-        try:
-            self.send_response(200)
-            if path.endswith('.html'):
-                self.send_header("Content-type", "text/html; charset=utf-8")
-            elif path.endswith('.js'):
-                self.send_header("Content-type", "application/javascript")
-            elif path.endswith('.css'):
-                self.send_header("Content-type", "text/css")
-            else:
-                self.send_header("Content-type", "application/octet-stream")
-            
-            fs = os.fstat(f.fileno())
-            self.send_header("Content-Length", str(fs[6]))
-            self.send_header("Last-Modified", self.date_time_string(fs.st_mtime))
-            self.send_header("Cache-Control", "no-cache, no-store, must-revalidate")
-            self.end_headers()
-            return f
-        except:
-            f.close()
-            raise
-
-os.chdir(DIR)
-with socketserver.TCPServer(("", PORT), Handler) as httpd:
-    print(f"Server at http://localhost:{PORT}")
-    httpd.serve_forever()
+if __name__ == "__main__":
+    main()